@@ -5,6 +5,14 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
+
+The report frame endpoints are async views; serve them with an ASGI server, e.g.
+``uvicorn layer.asgi:application --workers 2``, so slow image renders (which run on
+the frame pool, see report/frame_pool.py) never hold an event loop or worker slot.
+
+The live cycle feed (weather/live.py) also needs ASGI: /api/cloud/events/ is an async
+Server-Sent Events view, and WebSocket connections to /ws/cycles/ are handled here,
+next to Django, without a channels layer.
 """
 
 import os
@@ -13,4 +21,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'layer.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from weather.live import WEBSOCKET_PATH, websocket_app  # noqa: E402 (needs the apps loaded above)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        if scope['path'] == WEBSOCKET_PATH:
+            await websocket_app(scope, receive, send)
+        else:
+            await send({'type': 'websocket.close', 'code': 4404})
+        return
+    await django_application(scope, receive, send)
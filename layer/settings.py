@@ -150,3 +150,71 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# --- PDF rendering pool (report/pdf_renderer.py) ---
+REPORT_PDF_WORKERS = 2 # Warm Chromium workers = max PDFs rendered concurrently
+REPORT_PDF_JOB_TIMEOUT = 120 # Seconds
+REPORT_PDF_MAX_JOBS_PER_BROWSER = 50 # Relaunch Chromium after this many jobs
+REPORT_PDF_QUEUE_SIZE = 20
+
+# --- Report jobs (report/jobs.py) ---
+REPORT_JOB_MAX_ATTEMPTS = 3 # A job whose worker times out this many times is failed instead of requeued
+
+# --- Frame image generation pool (report/frame_pool.py) ---
+REPORT_FRAME_POOL = 'process' # 'process' to use every core, 'thread' to share one process's memory
+REPORT_FRAME_WORKERS = min(4, os.cpu_count() or 1)
+
+# --- Capture regions (weather/regions.py) ---
+# Extra regions, or overrides of the built-in 'tamil_nadu', as region key -> Region keyword arguments:
+# 'kerala': dict(name='Kerala', map_view=(10.5, 76.3, 7), crop_box=(...), bounds=(min_lon, min_lat, max_lon, max_lat),
+#                state_names=('Kerala',), api_endpoint_url=None),
+WEATHER_REGIONS = {}
+CAPTURE_REGIONS = ['tamil_nadu'] # Captured every cycle by 'manage.py cloud_analysis'
+CAPTURE_MAX_PARALLEL = None # Browser sessions at once; None = one per region
+
+# --- Capture layers (weather/layers.py) ---
+# Captured from one browser session per region by switching windy's overlay in-page.
+# Built-in: 'radar', 'satellite', 'rain_accumulation'; WEATHER_LAYERS adds or overrides (e.g. legends).
+WEATHER_LAYERS = {}
+CAPTURE_LAYERS = ['radar']
+
+# --- Precipitation cube (weather/cube.py): memory-mapped per-pixel classes, one file set per region and day ---
+PRECIP_CUBE_ROOT = os.path.join(BASE_DIR, 'precip_cube')
+
+# --- Zone sets (weather/zones.py): per-zone precipitation of every radar frame, stored in ZoneStat ---
+# Built-in: 'districts' (the region's districts), 'grid_005' (0.05° cells). WEATHER_ZONE_SETS adds more, e.g.
+# 'taluks': dict(name='Taluks', kind='polygons', path=os.path.join(BASE_DIR, 'zones', 'gadm41_IND_3.json'),
+#                name_field='NAME_3', parent_field='NAME_2', state_field='NAME_1'),
+# 'catchments': dict(name='Catchments', kind='polygons', path=os.path.join(BASE_DIR, 'zones', 'catchments.geojson')),
+WEATHER_ZONE_SETS = {}
+CAPTURE_ZONE_SETS = ['districts', 'grid_005'] # Evaluated every cycle; backfill with 'manage.py build_zone_stats'
+
+# --- Animated timelines (report/animation.py): one cached file per parameter set ---
+REPORT_ANIMATION_ROOT = os.path.join(BASE_DIR, 'animations')
+
+# --- Capture daemon memory watchdog (weather/memwatch.py); each is also a cloud_analysis option ---
+DAEMON_MEMORY_LOG = os.path.join(BASE_DIR, 'logs', 'cloud_analysis_memory.log')
+DAEMON_TRACEMALLOC_FRAMES = 0 # > 0 diffs tracemalloc snapshots between cycles (slower; for leak hunts)
+DAEMON_RESTART_RSS_MB = None # Restart between cycles above this RSS; None = never
+
+# --- Archive retention (weather/retention.py), applied by 'manage.py apply_retention' (e.g. nightly from cron) ---
+IMAGE_RETENTION = {
+    'full_days': 14, # Then only crops, class rasters, results JSON and PDFs are kept
+    'compact_days': 90, # Then crops and class rasters are downsampled
+    'downsample_factor': 4,
+}
+
+# --- Offline replay ('cloud_analysis --replay', weather/replay.py) ---
+# Only a load-test settings module, whose DATABASES, MEDIA_ROOT and PRECIP_CUBE_ROOT are scratch copies, sets this.
+REPLAY_SANDBOX = False
+
+# --- Analysis work queue (weather/work_queue.py): 'cloud_analysis --enqueue' + 'manage.py analysis_worker' ---
+ANALYSIS_LEASE_SECONDS = 120 # Renewed by heartbeat every third; an unrenewed lease is released to another worker
+ANALYSIS_MAX_ATTEMPTS = 3
+ANALYSIS_RETRY_SECONDS = 60 # Backoff before the first retry, doubled for each further one
+
+# --- Live cycle feed (weather/live.py): SSE at /api/cloud/events/, WebSocket at /ws/cycles/ (ASGI only) ---
+LIVE_POLL_SECONDS = 1.0 # How often each ASGI worker checks for new cycle events (one query for all its subscribers)
+LIVE_KEEPALIVE_SECONDS = 15 # Idle connections get a keepalive this often
+LIVE_EVENTS_KEEP_DAYS = 7 # How far back subscribers can resume
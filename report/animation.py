@@ -0,0 +1,325 @@
+# report/animation.py
+
+import hashlib
+import itertools
+import os
+import shutil
+import subprocess
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from PIL import Image, ImageDraw
+
+from weather.cache import params_digest
+from weather.precipitation import load_class_raster
+from weather.regions import get_region
+
+from .singleflight import SingleFlight
+
+# format -> (content type, file extension)
+ANIMATION_FORMATS = {
+    'gif': ('image/gif', 'gif'),
+    'webp': ('image/webp', 'webp'),
+    'mp4': ('video/mp4', 'mp4'),
+}
+ANIMATION_SOURCES = ('image', 'classes') # Cropped screenshots, or class rasters drawn in legend colours
+DEFAULT_FPS = 4
+MAX_FPS = 30
+# Without ffmpeg, WebP falls back to Pillow, which holds every frame in memory at once
+MAX_PIL_WEBP_FRAMES = 96
+
+BOUNDARY_COLOUR = (0, 0, 0, 255)
+HIGHLIGHT_COLOUR = (0, 255, 255, 255)
+DISTRICT_PADDING = 12 # Pixels kept around a selected district's bounding box
+
+_animation_flight = SingleFlight()
+
+
+class AnimationError(Exception):
+    """The animation could not be built (no frames, or the encoder is unavailable)."""
+
+
+def animation_root():
+    return getattr(settings, 'REPORT_ANIMATION_ROOT', os.path.join(settings.BASE_DIR, 'animations'))
+
+
+def ffmpeg_available():
+    return shutil.which('ffmpeg') is not None
+
+
+def mp4_available():
+    return ffmpeg_available() # MP4 is only encoded through ffmpeg
+
+
+# --- Per-frame drawing ---
+@lru_cache(maxsize=32)
+def boundary_overlay(region_key, width, height, district):
+    """
+    The district outlines for a (width x height) crop of the region as an RGBA array,
+    with `district` (unless 'All Districts') outlined in the highlight colour, plus the
+    pixel box (left, upper, right, lower) to crop the animation to (None for all districts).
+    Built once per parameter set and composited onto every frame.
+    """
+    from rasterio.features import rasterize
+
+    region = get_region(region_key)
+    overlay = np.zeros((height, width, 4), dtype=np.uint8)
+    districts_gdf = region.load_districts()
+    if districts_gdf is None:
+        return overlay, None
+
+    transform = region.transform(width, height)
+    outlines = rasterize(
+        list(districts_gdf.geometry.boundary), out_shape=(height, width), transform=transform,
+        fill=0, all_touched=True, dtype=np.uint8
+    ).astype(bool)
+    overlay[outlines] = BOUNDARY_COLOUR
+
+    crop_box = None
+    if district != 'All Districts':
+        selected = districts_gdf[districts_gdf[region.district_field].str.lower() == district.lower()]
+        if not selected.empty:
+            highlight = rasterize(
+                list(selected.geometry.boundary), out_shape=(height, width), transform=transform,
+                fill=0, all_touched=True, dtype=np.uint8
+            ).astype(bool)
+            overlay[highlight] = HIGHLIGHT_COLOUR
+            rows, cols = np.nonzero(highlight)
+            if len(rows):
+                crop_box = (
+                    max(int(cols.min()) - DISTRICT_PADDING, 0), max(int(rows.min()) - DISTRICT_PADDING, 0),
+                    min(int(cols.max()) + DISTRICT_PADDING + 1, width), min(int(rows.max()) + DISTRICT_PADDING + 1, height),
+                )
+    return overlay, crop_box
+
+
+def _class_palette(legend):
+    palette = np.zeros((256, 3), dtype=np.uint8)
+    palette[0] = (255, 255, 255)
+    for precip_class, colour in enumerate(legend, start=1):
+        palette[precip_class] = colour
+    return palette
+
+
+def _frame_base(frame, source, region):
+    """RGB array for one frame: its class raster in legend colours, or the cropped screenshot."""
+    class_path = frame.media_path(frame.class_path)
+    if source == 'classes' and class_path and os.path.exists(class_path):
+        return _class_palette(region.legend)[load_class_raster(class_path)]
+    cropped_path = frame.media_path(frame.cropped_path)
+    if not cropped_path or not os.path.exists(cropped_path):
+        return None
+    with Image.open(cropped_path) as img:
+        return np.array(img.convert('RGB'))
+
+
+def iter_animation_frames(frames, region, district, source, progress=None):
+    """
+    Yields one RGB PIL image per frame that has data, one at a time. Every frame is
+    scaled to the first one's size, since a range can mix full-size and downsampled
+    frames (weather.retention). Calls progress(done, total) after each frame.
+    """
+    size = overlay = crop_box = None
+    for done, frame in enumerate(frames, start=1):
+        if progress:
+            progress(done, len(frames))
+        base = _frame_base(frame, source, region)
+        if base is None:
+            continue
+        if size is None:
+            size = (base.shape[1], base.shape[0])
+            overlay, crop_box = boundary_overlay(region.key, *size, district)
+        elif (base.shape[1], base.shape[0]) != size:
+            # Class rasters hold class numbers: nearest keeps them unblended
+            resample = Image.Resampling.NEAREST if source == 'classes' else Image.Resampling.BILINEAR
+            base = np.array(Image.fromarray(base).resize(size, resample))
+
+        alpha = overlay[..., 3:] / 255.0
+        composed = (base * (1 - alpha) + overlay[..., :3] * alpha).astype(np.uint8)
+        image = Image.fromarray(composed)
+        if crop_box:
+            image = image.crop(crop_box)
+
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((0, 0, 118, 14), fill=(0, 0, 0))
+        draw.text((3, 2), frame.timestamp.strftime('%Y-%m-%d %H:%M'), fill=(255, 255, 255))
+        yield image
+
+
+# --- Encoders: each consumes the frame iterator and writes `path` ---
+def _encode_pil(images, path, image_format, fps):
+    """
+    GIF / WebP via Pillow. GIF frames are palettized as they arrive, so each is held at
+    1 byte per pixel; Pillow's WebP writer needs the frames as a list, so it is only used
+    without ffmpeg and for at most MAX_PIL_WEBP_FRAMES frames (see build_animation).
+    """
+    frames = (image.quantize(colors=255) if image_format == 'GIF' else image for image in images)
+    first = next(frames, None)
+    if image_format == 'WEBP':
+        frames = list(frames)
+    if first is None:
+        raise AnimationError("No frame images are available for this range.")
+    first.save(path, format=image_format, save_all=True, append_images=frames,
+               duration=int(1000 / fps), loop=0)
+
+
+# ffmpeg output options per format
+FFMPEG_OUTPUT_ARGS = {
+    'mp4': ['-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-movflags', '+faststart', '-f', 'mp4'],
+    'webp': ['-c:v', 'libwebp', '-lossless', '0', '-q:v', '80', '-loop', '0', '-f', 'webp'],
+}
+
+
+def _encode_ffmpeg(images, path, image_format, fps):
+    """MP4 (H.264) or WebP via an ffmpeg pipe: frames are streamed to the encoder one at a time."""
+    first = next(images, None)
+    if first is None:
+        raise AnimationError("No frame images are available for this range.")
+    width, height = first.size[0] - first.size[0] % 2, first.size[1] - first.size[1] % 2 # yuv420p needs even sizes
+
+    process = subprocess.Popen(
+        ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}',
+         '-r', str(fps), '-i', '-', *FFMPEG_OUTPUT_ARGS[image_format], path],
+        stdin=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    try:
+        for image in itertools.chain([first], images):
+            process.stdin.write(image.crop((0, 0, width, height)).tobytes())
+    except BrokenPipeError:
+        pass # ffmpeg exited early; its error output says why
+    except BaseException:
+        process.kill() # A frame failed to render: don't leave the encoder waiting for the rest
+        raise
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        stderr = process.stderr.read() # Until ffmpeg exits
+        process.stderr.close()
+        process.wait()
+    if process.returncode != 0:
+        raise AnimationError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()}")
+
+
+# --- Parameters ---
+def animation_params(query_params):
+    """
+    Normalizes animation parameters: the report filters (see report.jobs.report_job_params)
+    plus format, fps and source.
+
+    Raises:
+        ValueError: For an unknown format or source, or an invalid fps.
+    """
+    from .jobs import report_job_params
+    from .views import _parse_report_filters
+
+    params = report_job_params(query_params)
+    params['region'] = _parse_report_filters(query_params)['region']
+
+    params['format'] = query_params.get('format') or 'gif'
+    if params['format'] not in ANIMATION_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(ANIMATION_FORMATS)}.")
+    params['source'] = query_params.get('source') or 'image'
+    if params['source'] not in ANIMATION_SOURCES:
+        raise ValueError(f"source must be one of {', '.join(ANIMATION_SOURCES)}.")
+    fps = str(query_params.get('fps') or DEFAULT_FPS)
+    if not fps.isdigit() or not 1 <= int(fps) <= MAX_FPS:
+        raise ValueError(f"fps must be an integer between 1 and {MAX_FPS}.")
+    params['fps'] = int(fps)
+    return params
+
+
+def animation_frames(params):
+    """The catalogued frames the animation for `params` covers, oldest first."""
+    from .views import _find_frames, _parse_report_filters
+
+    filters = _parse_report_filters(params)
+    return _find_frames(filters['filter_start_datetime'], filters['filter_end_datetime'], params['region'])
+
+
+def animation_filename(params):
+    district = params['district'].replace(' ', '_')
+    start = f"{params['start_time_hour']}-{params['start_time_minute']}"
+    end = f"{params['end_time_hour']}-{params['end_time_minute']}"
+    return f"Weather_Animation_{params['date']}_{district}_{start}-{end}.{ANIMATION_FORMATS[params['format']][1]}"
+
+
+# --- Cached builds ---
+def animation_path(params, frames):
+    """
+    Cache file of the animation: "<parameters digest>-<frames digest>.<ext>". The frames
+    digest covers the identity of every frame, so a re-captured slot invalidates it.
+    """
+    frames_digest = hashlib.sha1(
+        ''.join(f"{frame.pk}:{frame.content_hash};" for frame in frames).encode('utf-8')
+    ).hexdigest()
+    return os.path.join(animation_root(), f"{params_digest(params)}-{frames_digest}.{ANIMATION_FORMATS[params['format']][1]}")
+
+
+def _discard_superseded_animations(path):
+    """Deletes cached animations of the same parameters built from other frames."""
+    name = os.path.basename(path)
+    prefix = name.split('-', 1)[0] + '-'
+    for other in os.listdir(os.path.dirname(path)):
+        if other.startswith(prefix) and other != name and not other.endswith('.tmp'):
+            try:
+                os.remove(os.path.join(os.path.dirname(path), other))
+            except FileNotFoundError:
+                pass # Another process cleaned it up first
+
+
+def check_animation(params, frames):
+    """
+    Raises AnimationError if the animation for `params` over `frames` cannot be built here,
+    so callers can refuse it before queueing a build.
+    """
+    if not frames:
+        raise AnimationError("No frames were captured in this range.")
+    if params['format'] == 'mp4' and not mp4_available():
+        raise AnimationError("MP4 export requires ffmpeg, which is not installed.")
+    if params['format'] == 'webp' and not ffmpeg_available() and len(frames) > MAX_PIL_WEBP_FRAMES:
+        raise AnimationError(f"WebP export of more than {MAX_PIL_WEBP_FRAMES} frames requires ffmpeg, which is "
+                             f"not installed; choose a shorter range or GIF.")
+
+
+def build_animation(params, frames, path, progress=None):
+    """
+    Renders `frames` with the animation `params` (format, fps, district, region, source) to `path`.
+    Calls progress(done, total) after each frame.
+    """
+    check_animation(params, frames)
+    use_ffmpeg = params['format'] == 'mp4' or (params['format'] == 'webp' and ffmpeg_available())
+
+    region = get_region(params['region'])
+    images = iter_animation_frames(frames, region, params['district'], params['source'], progress)
+
+    fd, temp_path = tempfile.mkstemp(suffix=f".{ANIMATION_FORMATS[params['format']][1]}.tmp", dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        if use_ffmpeg:
+            _encode_ffmpeg(images, temp_path, params['format'], params['fps'])
+        else:
+            _encode_pil(images, temp_path, params['format'].upper(), params['fps'])
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    _discard_superseded_animations(path)
+    return path
+
+
+def get_animation(params, frames, progress=None):
+    """
+    Path of the animation for `params` over `frames`, building it on first use (report
+    views queue the build as a ReportJob rather than calling this inline).
+    Concurrent builds of the same animation in this process share one.
+    """
+    check_animation(params, frames)
+    os.makedirs(animation_root(), exist_ok=True)
+    path = animation_path(params, frames)
+    if os.path.exists(path):
+        return path
+    return _animation_flight.do(path, lambda: path if os.path.exists(path) else build_animation(params, frames, path, progress))
@@ -0,0 +1,113 @@
+# report/frame_pool.py
+
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+# --- Defaults (override in settings.py) ---
+# 'process' uses every core; 'thread' avoids the per-process memory of the shapefile and libraries.
+DEFAULT_POOL_KIND = 'process'
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker_process():
+    # Pool processes are spawned, so they start without a configured Django.
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def render_frame_pngs(cropped_path, timestamp_dt, selected_district, image_types, region_key=None):
+    """
+    Generates the requested images for one frame and returns {image_type: PNG bytes or None},
+    or None if the frame could not be processed. Runs inside the pool, so it only takes and
+    returns picklable values; each worker process loads a region's shapefile once.
+    """
+    from weather.regions import get_region
+    from .views import _generate_image_data_for_timestamp
+
+    region = get_region(region_key)
+    gdf_region = region.load_districts()
+    if gdf_region is None:
+        return None
+
+    pil_images = _generate_image_data_for_timestamp(
+        cropped_path, timestamp_dt, selected_district, gdf_region, image_types=image_types, region=region
+    )
+    if not pil_images:
+        return None
+
+    png_images = {}
+    for image_type, pil_img in pil_images.items():
+        if pil_img is None:
+            png_images[image_type] = None
+            continue
+        buffer = io.BytesIO()
+        pil_img.save(buffer, format="PNG")
+        png_images[image_type] = buffer.getvalue()
+    return png_images
+
+
+def get_frame_pool():
+    """The process-wide bounded executor used for frame image generation."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            kind = getattr(settings, 'REPORT_FRAME_POOL', DEFAULT_POOL_KIND)
+            workers = getattr(settings, 'REPORT_FRAME_WORKERS', DEFAULT_WORKERS)
+            if kind == 'process':
+                # 'spawn' rather than fork: the web and worker processes run threads (PDF renderer, ORM).
+                _pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker_process,
+                )
+            else:
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='report-frames')
+        return _pool
+
+
+def _replace_broken_pool(broken_pool):
+    global _pool
+    with _pool_lock:
+        if _pool is broken_pool:
+            print("Frame pool: a worker process died; starting a new pool.")
+            _pool = None
+
+
+def submit_frame(frame, selected_district, image_types):
+    """Queues one frame on the pool and returns its Future."""
+    args = (render_frame_pngs, frame.media_path(frame.cropped_path), frame.timestamp,
+            selected_district, tuple(image_types), frame.region)
+    pool = get_frame_pool()
+    try:
+        return pool.submit(*args)
+    except BrokenProcessPool:
+        # A crashed worker (e.g. out of memory) breaks the whole executor; replace it once.
+        _replace_broken_pool(pool)
+        return get_frame_pool().submit(*args)
+
+
+def render_frames(frames, selected_district, image_types, progress=None):
+    """
+    Renders `frames` concurrently on the pool and returns their results in the same order.
+    `progress(done, total)` is called as results come back, in order.
+    """
+    futures = [submit_frame(frame, selected_district, image_types) for frame in frames]
+    results = []
+    for frame_number, future in enumerate(futures, start=1):
+        results.append(future.result())
+        if progress:
+            progress(frame_number, len(futures))
+    return results
+
@@ -0,0 +1,245 @@
+# report/jobs.py
+
+import os
+import socket
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from weather.cache import data_version, params_digest
+
+from .models import ReportJob
+
+# A running job whose worker has not reported progress for this many seconds is assumed
+# to belong to a dead worker and is queued again. Workers report after every frame, and
+# the final PDF render is bounded by REPORT_PDF_JOB_TIMEOUT.
+STALE_JOB_SECONDS = 5 * 60
+
+
+class LeaseLost(Exception):
+    """The job was requeued as stale and claimed by another worker."""
+
+
+def report_job_params(query_params):
+    """
+    Normalizes report filters (a QueryDict or dict) into the explicit form stored on a job.
+
+    Defaults that depend on the clock (today, the current 15-minute slot) are resolved
+    here, at submission, so the job renders what the user was looking at and identical
+    requests map to the same cache entry.
+    """
+    from weather.regions import DEFAULT_REGION_KEY
+    from .views import _parse_report_filters
+
+    filters = _parse_report_filters(query_params)
+    start_hour, start_minute = filters['selected_start_time'].split(':')
+    end_hour, end_minute = filters['selected_end_time'].split(':')
+    params = {
+        'date': filters['filter_date'].strftime('%Y-%m-%d'),
+        'district': filters['selected_district'],
+        'start_time_hour': start_hour,
+        'start_time_minute': start_minute,
+        'end_time_hour': end_hour,
+        'end_time_minute': end_minute,
+        'image_view_type': filters['selected_image_view'],
+    }
+    # Only stored for other regions, so jobs (and cached PDFs) of the default region keep their digest
+    if filters['region'] != DEFAULT_REGION_KEY:
+        params['region'] = filters['region']
+    return params
+
+
+def _output_exists(job):
+    if job.kind == ReportJob.KIND_ANIMATION:
+        from .animation import animation_frames, animation_path
+
+        return os.path.exists(animation_path(job.params, animation_frames(job.params)))
+    return bool(job.pdf_file) and os.path.exists(job.pdf_file.path)
+
+
+def report_data_version(params):
+    """
+    Data version of a report: that of the CloudAnalysis rows it reads, i.e. its region's
+    rows on its day (the day's summary covers the whole day, the table and frames a window
+    of it). Cycles of other days or regions leave the version, and cached PDFs, alone.
+    """
+    from weather.regions import DEFAULT_REGION_KEY
+
+    day_start = datetime.strptime(params['date'], '%Y-%m-%d')
+    return data_version(
+        region=params.get('region', DEFAULT_REGION_KEY), start=day_start, end=day_start + timedelta(days=1)
+    )
+
+
+def _flight_key(version, digest):
+    return f"{version}:{digest}"
+
+
+def submit_report_job(params, kind=ReportJob.KIND_PDF):
+    """
+    Returns (job, created) for normalized `params` of a job of `kind` (the animation
+    parameters include format, fps and source, so they never share a PDF's digest).
+
+    Single-flight: every submission with the same parameters and data version (see
+    report_data_version) attaches to the one job holding that flight key, whether it is
+    queued, running or already done (the cached PDF). The unique flight_key index settles concurrent submissions,
+    across web processes, in favour of whichever insert lands first.
+    """
+    digest = params_digest(params)
+    version = report_data_version(params)
+    flight_key = _flight_key(version, digest)
+
+    existing = ReportJob.objects.filter(flight_key=flight_key).first()
+    if existing is not None:
+        if existing.status != ReportJob.STATUS_DONE or _output_exists(existing):
+            return existing, False
+        # The cached file was deleted from disk (or, for an animation, its frames changed); release the key and render again.
+        ReportJob.objects.filter(pk=existing.pk).update(flight_key=None)
+
+    try:
+        with transaction.atomic():
+            job = ReportJob.objects.create(
+                kind=kind, params=params, params_digest=digest, data_version=version, flight_key=flight_key
+            )
+    except IntegrityError:
+        # Another request queued the same report between our lookup and insert.
+        return ReportJob.objects.get(flight_key=flight_key), False
+    return job, True
+
+
+def max_attempts():
+    return getattr(settings, 'REPORT_JOB_MAX_ATTEMPTS', 3)
+
+
+def requeue_stale_jobs():
+    """
+    Puts running jobs whose worker stopped reporting progress back on the queue, or fails
+    them once they have used REPORT_JOB_MAX_ATTEMPTS (a job that keeps killing its worker
+    would otherwise block the queue forever). Returns the number requeued.
+    """
+    now = timezone.now()
+    stale = ReportJob.objects.filter(status=ReportJob.STATUS_RUNNING, heartbeat_at__lt=now - timedelta(seconds=STALE_JOB_SECONDS))
+    for job in stale.filter(attempts__gte=max_attempts()):
+        print(f"Report job {job.pk} failed: worker timed out on all {job.attempts} attempts")
+    stale.filter(attempts__gte=max_attempts()).update(
+        status=ReportJob.STATUS_FAILED, error='Worker timed out on every attempt.', message='Failed',
+        finished_at=now, worker='', flight_key=None,
+    )
+    return stale.update(status=ReportJob.STATUS_QUEUED, progress=0, message='Requeued after worker timeout', worker='')
+
+
+def claim_next_job(worker_name):
+    """
+    Atomically takes the oldest queued job for `worker_name`, or returns None.
+    SKIP LOCKED lets several workers poll the same table without blocking each other.
+    """
+    with transaction.atomic():
+        job = (ReportJob.objects.select_for_update(skip_locked=True)
+               .filter(status=ReportJob.STATUS_QUEUED)
+               .order_by('created_at')
+               .first())
+        if job is None:
+            return None
+        job.status = ReportJob.STATUS_RUNNING
+        job.worker = worker_name
+        job.attempts += 1
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.progress = 0
+        job.message = 'Started'
+        job.save(update_fields=['status', 'worker', 'attempts', 'started_at', 'heartbeat_at', 'progress', 'message'])
+    return job
+
+
+def _holds_claim(job):
+    # The attempt number fences off this worker's own earlier claim of a requeued job
+    return ReportJob.objects.filter(pk=job.pk, status=ReportJob.STATUS_RUNNING, worker=job.worker,
+                                    attempts=job.attempts)
+
+
+def _report_progress(job):
+    """Progress callback for build_report_pdf; each report doubles as the job's heartbeat."""
+    def progress(percent, message):
+        if not _holds_claim(job).update(progress=percent, message=message[:255], heartbeat_at=timezone.now()):
+            raise LeaseLost(f"Report job {job.pk} was requeued and claimed by another worker.")
+    return progress
+
+
+def _finish_job(job, update_fields):
+    """Saves the finished `job` if this worker still holds it; raises LeaseLost otherwise."""
+    with transaction.atomic():
+        if not list(_holds_claim(job).select_for_update().values_list('pk', flat=True)):
+            raise LeaseLost(f"Report job {job.pk} is no longer claimed by {job.worker}.")
+        job.save(update_fields=update_fields)
+
+
+def _build_animation(job):
+    """Builds an animation job's file into the animation cache. Returns its download name."""
+    from .animation import animation_filename, animation_frames, get_animation
+
+    progress = _report_progress(job)
+    get_animation(job.params, animation_frames(job.params),
+                  progress=lambda done, total: progress(int(100 * done / total), f"Rendered {done} of {total} frames"))
+    return animation_filename(job.params)
+
+
+def run_report_job(job):
+    """
+    Renders `job` and stores the PDF (or the error) on it; an animation job's file is
+    stored in the animation cache.
+
+    Raises:
+        LeaseLost: If the job was requeued meanwhile (nothing is stored; its new worker renders it).
+    """
+    from .views import build_report_pdf
+
+    try:
+        if job.kind == ReportJob.KIND_ANIMATION:
+            pdf_bytes, filename = None, _build_animation(job)
+        else:
+            pdf_bytes, filename = build_report_pdf(job.params, progress=_report_progress(job))
+    except LeaseLost:
+        raise
+    except Exception as e:
+        print(f"Report job {job.pk} failed: {e}")
+        job.status = ReportJob.STATUS_FAILED
+        job.error = str(e)
+        job.message = 'Failed'
+        job.finished_at = timezone.now()
+        job.flight_key = None # Let the next submission retry
+        _finish_job(job, ['status', 'error', 'message', 'finished_at', 'flight_key'])
+        return job
+
+    if pdf_bytes is not None:
+        # Output is named after the job, so concurrent jobs never share or clean up each other's files.
+        job.pdf_file.save(f"report_{job.pk}.pdf", ContentFile(pdf_bytes), save=False)
+    job.filename = filename
+    job.status = ReportJob.STATUS_DONE
+    job.progress = 100
+    job.message = 'Done'
+    job.finished_at = timezone.now()
+    try:
+        _finish_job(job, ['pdf_file', 'filename', 'status', 'progress', 'message', 'finished_at'])
+    except LeaseLost:
+        if job.pdf_file:
+            job.pdf_file.delete(save=False)
+        raise
+    _discard_superseded_pdfs(job)
+    return job
+
+
+def _discard_superseded_pdfs(job):
+    """Deletes cached PDFs for the same parameters rendered from older data."""
+    superseded = ReportJob.objects.filter(
+        params_digest=job.params_digest, data_version__lt=job.data_version, status=ReportJob.STATUS_DONE
+    )
+    for old_job in superseded:
+        if old_job.pdf_file:
+            old_job.pdf_file.delete(save=False)
+    superseded.delete()
+
+
+def default_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
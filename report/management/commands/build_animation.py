@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from report.animation import ANIMATION_FORMATS, ANIMATION_SOURCES, AnimationError, animation_frames, animation_params, get_animation
+import shutil
+import time
+
+
+class Command(BaseCommand):
+    help = 'Renders the animated timeline of a date, time range and district (cached like /report/animation/).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', required=True, help="Day to animate (YYYY-MM-DD).")
+        parser.add_argument('--start', default='00:00', help="First slot, HH:MM (default 00:00).")
+        parser.add_argument('--end', default='23:59', help="Last slot, HH:MM (default 23:59).")
+        parser.add_argument('--district', default='All Districts')
+        parser.add_argument('--region', help="weather.regions key (default: the default region).")
+        parser.add_argument('--format', default='gif', choices=list(ANIMATION_FORMATS))
+        parser.add_argument('--source', default='image', choices=list(ANIMATION_SOURCES))
+        parser.add_argument('--fps', type=int, default=None)
+        parser.add_argument('--output', '-o', help="Copy the animation to this path.")
+
+    def handle(self, **options):
+        try:
+            start_hour, start_minute = options['start'].split(':')
+            end_hour, end_minute = options['end'].split(':')
+        except ValueError:
+            raise CommandError("--start and --end must be HH:MM.")
+
+        query = {
+            'date': options['date'], 'district': options['district'],
+            'start_time_hour': start_hour, 'start_time_minute': start_minute,
+            'end_time_hour': end_hour, 'end_time_minute': end_minute,
+            'format': options['format'], 'source': options['source'],
+        }
+        if options['region']:
+            query['region'] = options['region']
+        if options['fps']:
+            query['fps'] = options['fps']
+
+        started = time.monotonic()
+        try:
+            params = animation_params(query)
+            frames = animation_frames(params)
+            path = get_animation(params, frames)
+        except (ValueError, AnimationError) as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            shutil.copyfile(path, options['output'])
+            path = options['output']
+        self.stdout.write(self.style.SUCCESS(
+            f"Animation of {len(frames)} frames written to {path} in {time.monotonic() - started:.1f}s."
+        ))
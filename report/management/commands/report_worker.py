@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from report.jobs import LeaseLost, claim_next_job, default_worker_name, requeue_stale_jobs, run_report_job
+import time
+
+
+class Command(BaseCommand):
+    help = 'Runs queued PDF report jobs. Start several processes for more parallel renders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty instead of polling.")
+        parser.add_argument('--name', default=None, help="Worker name recorded on claimed jobs (default: host:pid).")
+
+    def handle(self, **options):
+        worker_name = options['name'] or default_worker_name()
+        self.stdout.write(self.style.SUCCESS(f"Report worker {worker_name} started."))
+
+        try:
+            while True:
+                close_old_connections()
+                requeued = requeue_stale_jobs()
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f"Requeued {requeued} stale report job(s)."))
+
+                job = claim_next_job(worker_name)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f"Rendering report job {job.pk}: {job.params}")
+                try:
+                    job = run_report_job(job)
+                except LeaseLost as e:
+                    self.stderr.write(self.style.WARNING(f"{e} Its result was discarded."))
+                    continue
+                if job.status == job.STATUS_DONE:
+                    self.stdout.write(self.style.SUCCESS(f"Report job {job.pk} done: {job.pdf_file.name or job.filename}"))
+                else:
+                    self.stderr.write(self.style.ERROR(f"Report job {job.pk} failed: {job.error}"))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Report worker stopped."))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='flight_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
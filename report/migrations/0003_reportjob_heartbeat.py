@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:06
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def running_jobs_last_beat_at_start(apps, schema_editor):
+    # So jobs left running by the previous worker version can still be requeued as stale
+    ReportJob = apps.get_model('report', 'ReportJob')
+    ReportJob.objects.filter(status='running').update(heartbeat_at=F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0002_reportjob_flight_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='reportjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(running_jobs_last_beat_at_start, migrations.RunPython.noop),
+    ]
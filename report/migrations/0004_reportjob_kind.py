@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0003_reportjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='kind',
+            field=models.CharField(choices=[('pdf', 'PDF report'), ('animation', 'Animation')], default='pdf', max_length=10),
+        ),
+    ]
@@ -1,3 +1,57 @@
 from django.db import models
 
-# Create your models here.
+
+class ReportJob(models.Model):
+    """
+    One PDF report, or animation (report.animation), rendered in the background by
+    `manage.py report_worker`.
+
+    Finished jobs double as the PDF cache: a job is reused for any later request with
+    the same normalized parameters (`params_digest`) while the data has not changed
+    (`data_version`, see report.jobs.report_data_version).
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    KIND_PDF = 'pdf'
+    KIND_ANIMATION = 'animation' # Built into the animation cache (REPORT_ANIMATION_ROOT), not pdf_file
+    KIND_CHOICES = [
+        (KIND_PDF, 'PDF report'),
+        (KIND_ANIMATION, 'Animation'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=KIND_PDF)
+    params = models.JSONField() # Normalized report filters (report.jobs.report_job_params / report.animation.animation_params)
+    params_digest = models.CharField(max_length=40)
+    data_version = models.PositiveBigIntegerField(default=0)
+    # "<data_version>:<params_digest>" while the job is queued, running or done; cleared when it
+    # fails or its PDF is lost. The unique index makes identical submissions share one job.
+    flight_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0) # Percent
+    message = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    pdf_file = models.FileField(upload_to='report_pdfs/', blank=True) # Relative to MEDIA_ROOT
+    filename = models.CharField(max_length=255, blank=True) # Download name
+    worker = models.CharField(max_length=100, blank=True)
+    attempts = models.PositiveIntegerField(default=0) # Claims so far; fences off a worker whose job was requeued
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True) # Last progress report of the running worker
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['params_digest', 'data_version'], name='reportjob_cache_idx'),
+            models.Index(fields=['status', 'created_at'], name='reportjob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"ReportJob {self.pk} ({self.status})"
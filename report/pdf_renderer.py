@@ -0,0 +1,220 @@
+# report/pdf_renderer.py
+
+import atexit
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+
+# --- Defaults (override in settings.py) ---
+# Number of browser workers, i.e. the maximum number of PDFs rendered at once.
+DEFAULT_WORKERS = 2
+# Seconds a caller waits for its PDF before giving up.
+DEFAULT_JOB_TIMEOUT = 120
+# A worker relaunches its browser after this many jobs to keep Chromium's memory in check.
+DEFAULT_MAX_JOBS_PER_BROWSER = 50
+# Jobs allowed to wait for a free worker before new submissions are rejected.
+DEFAULT_QUEUE_SIZE = 20
+
+# Pseudo-origin for images handed to the renderer in memory. Requests to it are answered
+# by route interception inside Chromium and never reach the network; `.invalid` can't resolve.
+ASSET_ORIGIN = "https://report-assets.invalid/"
+
+PDF_OPTIONS = {
+    'format': "A4",
+    'print_background': True, # Ensures background colors/images from CSS are printed
+    'margin': {
+        "top": "20px",
+        "bottom": "20px",
+        "left": "20px",
+        "right": "20px"
+    },
+}
+
+
+class PdfRenderError(Exception):
+    """Raised when a PDF could not be rendered (queue full, timeout or browser failure)."""
+
+
+def asset_url(name):
+    """URL under which the asset registered as `name` is visible to the rendered HTML."""
+    return ASSET_ORIGIN + name
+
+
+class _RenderJob:
+    def __init__(self, html, assets, timeout):
+        self.html = html
+        self.assets = assets or {}
+        self.timeout = timeout
+        self.future = Future()
+
+
+class _BrowserWorker(threading.Thread):
+    """
+    Owns one Playwright instance and one warm Chromium (Playwright objects must stay on
+    the thread that created them). Each job gets a fresh browser context, so jobs are
+    isolated from each other while the browser process is reused.
+    """
+
+    def __init__(self, service, index):
+        super().__init__(name=f"pdf-render-{index}", daemon=True)
+        self.service = service
+        self.playwright = None
+        self.browser = None
+        self.jobs_on_browser = 0
+
+    def _ensure_browser(self):
+        if self.browser is None or not self.browser.is_connected():
+            self._close_browser()
+            self.browser = self.playwright.chromium.launch()
+            self.jobs_on_browser = 0
+            print(f"{self.name}: Chromium launched.")
+
+    def _close_browser(self):
+        if self.browser is not None:
+            try:
+                self.browser.close()
+            except Exception as e:
+                print(f"{self.name}: Error closing Chromium: {e}")
+            self.browser = None
+
+    def _render(self, job):
+        self._ensure_browser()
+        context = self.browser.new_context()
+        try:
+            context.route("**/*", lambda route: self._serve_asset(route, job.assets))
+            page = context.new_page()
+            page.set_default_timeout(job.timeout * 1000)
+            # set_content() returns after the load event, i.e. once every <img> has been
+            # served from memory, so no network-idle wait is needed.
+            page.set_content(job.html)
+            return page.pdf(**PDF_OPTIONS)
+        finally:
+            context.close()
+
+    def _serve_asset(self, route, assets):
+        url = route.request.url
+        if not url.startswith(ASSET_ORIGIN):
+            # The PDF must be self-contained: nothing is fetched from the network.
+            print(f"{self.name}: Blocked request for {url}")
+            route.abort()
+            return
+
+        asset = assets.get(url[len(ASSET_ORIGIN):])
+        if asset is None:
+            route.fulfill(status=404)
+            return
+        content_type, body = asset
+        route.fulfill(status=200, content_type=content_type, body=body)
+
+    def _serve_jobs(self):
+        while True:
+            job = self.service.jobs.get()
+            if job is None: # Shutdown sentinel
+                return
+            if not job.future.set_running_or_notify_cancel():
+                continue # The caller already gave up on this job
+
+            try:
+                job.future.set_result(self._render(job))
+            except Exception as e:
+                job.future.set_exception(PdfRenderError(f"Failed to render PDF: {e}"))
+                self._close_browser() # Start the next job on a fresh browser
+            finally:
+                self.jobs_on_browser += 1
+                if self.jobs_on_browser >= self.service.max_jobs_per_browser:
+                    print(f"{self.name}: Recycling Chromium after {self.jobs_on_browser} jobs.")
+                    self._close_browser()
+
+    def _fail_jobs(self, error):
+        while True:
+            job = self.service.jobs.get()
+            if job is None:
+                return
+            if job.future.set_running_or_notify_cancel():
+                job.future.set_exception(PdfRenderError(f"PDF renderer unavailable: {error}"))
+
+    def run(self):
+        try:
+            from playwright.sync_api import sync_playwright
+
+            with sync_playwright() as playwright:
+                self.playwright = playwright
+                self._serve_jobs()
+                self._close_browser()
+        except Exception as e:
+            print(f"{self.name}: Playwright could not be started: {e}")
+            self._fail_jobs(e)
+
+
+class PdfRenderService:
+    """
+    Bounded pool of warm Chromium workers that turn HTML into PDF bytes.
+
+    Use `get_pdf_render_service().render(html)` from views instead of launching a
+    browser per request.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, job_timeout=DEFAULT_JOB_TIMEOUT,
+                 max_jobs_per_browser=DEFAULT_MAX_JOBS_PER_BROWSER, queue_size=DEFAULT_QUEUE_SIZE):
+        self.job_timeout = job_timeout
+        self.max_jobs_per_browser = max_jobs_per_browser
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.workers = [_BrowserWorker(self, index) for index in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def render(self, html, assets=None, timeout=None):
+        """
+        Renders `html` to PDF on a pooled browser and returns the PDF bytes.
+
+        Args:
+            html (str): The complete HTML document.
+            assets (dict): Maps asset names to (content_type, bytes). The HTML refers to
+                them by `asset_url(name)`; any other URL is blocked.
+            timeout (int): Seconds to wait; defaults to the service's job timeout.
+
+        Raises:
+            PdfRenderError: If the queue is full, the job times out or rendering fails.
+        """
+        timeout = timeout or self.job_timeout
+        job = _RenderJob(html, assets, timeout)
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            raise PdfRenderError("PDF render queue is full; try again shortly.")
+
+        try:
+            return job.future.result(timeout=timeout)
+        except FutureTimeoutError:
+            job.future.cancel()
+            raise PdfRenderError(f"PDF rendering timed out after {timeout} seconds.")
+
+    def shutdown(self):
+        for _ in self.workers:
+            self.jobs.put(None)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_pdf_render_service():
+    """Returns the process-wide PdfRenderService, starting it on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = PdfRenderService(
+                workers=getattr(settings, 'REPORT_PDF_WORKERS', DEFAULT_WORKERS),
+                job_timeout=getattr(settings, 'REPORT_PDF_JOB_TIMEOUT', DEFAULT_JOB_TIMEOUT),
+                max_jobs_per_browser=getattr(settings, 'REPORT_PDF_MAX_JOBS_PER_BROWSER', DEFAULT_MAX_JOBS_PER_BROWSER),
+                queue_size=getattr(settings, 'REPORT_PDF_QUEUE_SIZE', DEFAULT_QUEUE_SIZE),
+            )
+            atexit.register(_service.shutdown)
+        return _service
+
+
+def render_pdf(html, assets=None, timeout=None):
+    """Shortcut for get_pdf_render_service().render(...)."""
+    return get_pdf_render_service().render(html, assets=assets, timeout=timeout)
@@ -0,0 +1,62 @@
+# report/singleflight.py
+
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key within one process.
+
+    The first caller for a key runs the function; callers arriving while it is still
+    running wait for and share its result (or exception) instead of repeating the work.
+    Nothing is cached once the call finishes.
+
+    `do()` runs the function in the calling thread. `submit()` is for work that already
+    runs on an executor: it shares the executor's Future, which async code can await
+    with asyncio.wrap_future().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = Future()
+
+        if not is_leader:
+            return call.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def submit(self, key, submit_fn):
+        """Returns the in-flight Future for `key`, calling submit_fn() to start one if there is none."""
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = self._calls[key] = submit_fn()
+
+        if is_leader:
+            # Outside the lock: the callback runs immediately if the future is already done.
+            future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
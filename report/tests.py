@@ -1,3 +1,356 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from weather.models import CloudAnalysis, Frame
+from weather.regions import get_region
+
+from . import animation, frame_pool, jobs, pdf_renderer, views
+from .models import ReportJob
+
+PARAMS = {
+    'date': '2030-06-01', 'district': 'All Districts', 'start_time_hour': '10', 'start_time_minute': '00',
+    'end_time_hour': '12', 'end_time_minute': '00', 'image_view_type': 'cropped_tn',
+}
+
+
+def _add_analysis(timestamp, region='tamil_nadu'):
+    return CloudAnalysis.objects.create(city='Salem', values='', timestamp=timestamp, region=region)
+
+
+class PdfRenderServiceTests(TestCase):
+    def test_waiting_jobs_time_out_and_are_bounded(self):
+        service = pdf_renderer.PdfRenderService(workers=0, queue_size=1) # No browser: jobs only wait
+        with self.assertRaisesMessage(pdf_renderer.PdfRenderError, 'timed out'):
+            service.render('<html></html>', timeout=0.01)
+        self.assertTrue(service.jobs.get_nowait().future.cancelled()) # A worker would skip it
+
+        service.jobs.put_nowait(None)
+        with self.assertRaisesMessage(pdf_renderer.PdfRenderError, 'queue is full'):
+            service.render('<html></html>', timeout=0.01)
+
+
+class _Route:
+    def __init__(self, url):
+        self.request = mock.Mock(url=url)
+        self.fulfilled = self.aborted = None
+
+    def fulfill(self, **response):
+        self.fulfilled = response
+
+    def abort(self):
+        self.aborted = True
+
+
+class PdfAssetTests(TestCase):
+    @mock.patch('report.views.render_frames', side_effect=lambda frames, *args, **kwargs: [{'cropped_tn': b'png'} for _ in frames])
+    @mock.patch('report.views.render_pdf', return_value=b'%PDF')
+    @mock.patch('report.views.render_to_string', return_value='<html></html>')
+    def test_frame_images_are_handed_to_the_renderer_in_memory(self, render_to_string, render_pdf, render_frames):
+        Frame.objects.create(timestamp=datetime(2030, 6, 1, 10, 15), folder='f')
+        self.assertEqual(views.build_report_pdf(PARAMS)[0], b'%PDF')
+
+        (_, context), _ = render_to_string.call_args
+        image_set, = context['generated_images_for_display']
+        self.assertEqual(image_set['cropped_tn'], pdf_renderer.asset_url('2030-06-01_10-15-00/cropped_tn.png'))
+        render_pdf.assert_called_once_with('<html></html>', assets={'2030-06-01_10-15-00/cropped_tn.png': ('image/png', b'png')})
+
+    def test_only_registered_assets_are_served(self):
+        worker = pdf_renderer._BrowserWorker(mock.Mock(), 0)
+        assets = {'a.png': ('image/png', b'png')}
+        routes = [_Route(pdf_renderer.asset_url(name)) for name in ('a.png', 'b.png')] + [_Route('http://localhost/a.png')]
+        for route in routes:
+            worker._serve_asset(route, assets)
+        self.assertEqual(routes[0].fulfilled, {'status': 200, 'content_type': 'image/png', 'body': b'png'})
+        self.assertEqual(routes[1].fulfilled, {'status': 404})
+        self.assertTrue(routes[2].aborted) # Nothing is fetched from the network
+
+
+class ReportJobFlightTests(TestCase):
+    def test_identical_submissions_share_one_job(self):
+        job, created = jobs.submit_report_job(dict(PARAMS))
+        again, created_again = jobs.submit_report_job(dict(reversed(list(PARAMS.items()))))
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(again.pk, job.pk)
+
+        other, created_other = jobs.submit_report_job({**PARAMS, 'district': 'Salem'})
+        self.assertTrue(created_other)
+        self.assertNotEqual(other.pk, job.pk)
+
+    def test_failed_job_releases_its_flight_key(self):
+        job, _ = jobs.submit_report_job(PARAMS)
+        job = jobs.claim_next_job('a')
+        with mock.patch('report.views.build_report_pdf', side_effect=RuntimeError('boom')):
+            jobs.run_report_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.flight_key), (ReportJob.STATUS_FAILED, None))
+
+        retry, created = jobs.submit_report_job(PARAMS)
+        self.assertTrue(created)
+        self.assertNotEqual(retry.pk, job.pk)
+
+
+class ReportJobVersionTests(TestCase):
+    def test_new_data_of_the_reports_day_starts_a_new_job(self):
+        job, _ = jobs.submit_report_job(PARAMS)
+        _add_analysis(datetime(2030, 6, 2, 1, 0)) # Another day
+        _add_analysis(datetime(2030, 6, 1, 11, 0), region='other') # Another region
+        self.assertEqual(jobs.submit_report_job(PARAMS)[0].pk, job.pk)
+
+        _add_analysis(datetime(2030, 6, 1, 23, 45))
+        newer, created = jobs.submit_report_job(PARAMS)
+        self.assertTrue(created)
+        self.assertGreater(newer.data_version, job.data_version)
+
+
+class ReportJobHeartbeatTests(TestCase):
+    def setUp(self):
+        jobs.submit_report_job(PARAMS)
+
+    def _silence(self, job):
+        ReportJob.objects.filter(pk=job.pk).update(
+            heartbeat_at=timezone.now() - timedelta(seconds=jobs.STALE_JOB_SECONDS + 1)
+        )
+
+    def test_only_silent_jobs_are_requeued(self):
+        job = jobs.claim_next_job('a')
+        ReportJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        jobs._report_progress(job)(50, 'Still rendering')
+        self.assertEqual(jobs.requeue_stale_jobs(), 0)
+
+        self._silence(job)
+        self.assertEqual(jobs.requeue_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (ReportJob.STATUS_QUEUED, ''))
+
+    def test_requeued_job_is_fenced_from_its_first_worker(self):
+        stale = jobs.claim_next_job('a')
+        self._silence(stale)
+        jobs.requeue_stale_jobs()
+        current = jobs.claim_next_job('a') # Same worker name, next attempt
+
+        with self.assertRaises(jobs.LeaseLost):
+            jobs._report_progress(stale)(10, 'Late')
+        with mock.patch('report.views.build_report_pdf', side_effect=RuntimeError('boom')):
+            with self.assertRaises(jobs.LeaseLost):
+                jobs.run_report_job(stale)
+        current.refresh_from_db()
+        self.assertEqual((current.status, current.attempts), (ReportJob.STATUS_RUNNING, 2))
+
+    @override_settings(REPORT_JOB_MAX_ATTEMPTS=2)
+    def test_job_that_keeps_timing_out_is_failed(self):
+        for attempt in range(2):
+            job = jobs.claim_next_job('a')
+            self._silence(job)
+            jobs.requeue_stale_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.flight_key), (ReportJob.STATUS_FAILED, 2, None))
+        self.assertIsNone(jobs.claim_next_job('a'))
+
+
+class FramesPageTests(TestCase):
+    def setUp(self):
+        self.frames = [
+            Frame.objects.create(timestamp=datetime(2030, 6, 1, 10, 0) + timedelta(minutes=15 * n), folder=str(n), content_hash=str(n))
+            for n in range(8)
+        ]
+
+    def _page(self, **params):
+        return self.client.get(reverse('report:report_frames'), {**PARAMS, **params}).json()
+
+    def test_frames_are_listed_one_page_at_a_time(self):
+        first = self._page(page_size=3)
+        self.assertEqual((first['count'], first['num_pages'], first['next_page']), (8, 3, 2))
+        self.assertEqual([frame['time'] for frame in first['frames']], ['10:00', '10:15', '10:30'])
+
+        last = self._page(page_size=3, page=3)
+        self.assertEqual((len(last['frames']), last['next_page']), (2, None))
+        self.assertEqual(self._page(page_size=3, page=99)['page'], 3)
+
+    def test_only_the_selected_views_images_are_linked(self):
+        combined, = self._page(page_size=1, image_view_type='combined_full_tn')['frames']
+        self.assertEqual(set(combined['images']), {'cropped_tn', 'aligned_overlay_tn'})
+        self.assertEqual(self._page(page_size=1, image_view_type='')['frames'][0]['images'], {})
+
+
+def _slow_render(cropped_path, timestamp, district, image_types, region_key):
+    time.sleep(0.05 if timestamp.minute == 0 else 0) # The first frame finishes last
+    return {image_type: timestamp.strftime('%H:%M').encode() for image_type in image_types}
+
+
+@override_settings(REPORT_FRAME_POOL='thread', REPORT_FRAME_WORKERS=3)
+class FramePoolTests(TestCase):
+    def setUp(self):
+        frame_pool._pool = None
+        self.addCleanup(self._shutdown_pool)
+        self.frames = [Frame(timestamp=datetime(2030, 6, 1, 10, 15 * n), folder=str(n)) for n in range(3)]
+
+    def _shutdown_pool(self):
+        pool, frame_pool._pool = frame_pool._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    @mock.patch('report.frame_pool.render_frame_pngs', _slow_render)
+    def test_results_keep_frame_order(self):
+        progress = mock.Mock()
+        results = frame_pool.render_frames(self.frames, 'All Districts', ('cropped_tn',), progress=progress)
+        self.assertEqual(results, [{'cropped_tn': b'10:00'}, {'cropped_tn': b'10:15'}, {'cropped_tn': b'10:30'}])
+        self.assertEqual(progress.call_args_list, [mock.call(done, 3) for done in (1, 2, 3)])
+
+    @mock.patch('report.frame_pool.render_frame_pngs', _slow_render)
+    def test_broken_pool_is_replaced(self):
+        broken = frame_pool._pool = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool()
+        future = frame_pool.submit_frame(self.frames[1], 'All Districts', ('cropped_tn',))
+        self.assertEqual(future.result(), {'cropped_tn': b'10:15'})
+        self.assertIsNot(frame_pool.get_frame_pool(), broken)
+
+
+class FrameImageTypesTests(TestCase):
+    def test_only_requested_types_are_generated(self):
+        path = os.path.join(tempfile.mkdtemp(), 'cropped.png')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        Image.new('RGB', (8, 6)).save(path)
+
+        images = views._generate_image_data_for_timestamp(path, datetime(2030, 6, 1, 10, 15), 'All Districts', None,
+                                                          image_types=('cropped_tn', 'masked_district'))
+        self.assertEqual(set(images), {'cropped_tn', 'masked_district'})
+        self.assertEqual(images['cropped_tn'].size, (8, 6))
+
+
+def _rendered(png_bytes):
+    future = Future()
+    future.set_result({'cropped_tn': png_bytes})
+    return future
+
+
+class FrameImageCacheTests(TestCase):
+    def setUp(self):
+        self.frame = Frame.objects.create(
+            timestamp=datetime(2030, 6, 1, 10, 15), folder='2030-06-01_10-15', cropped_path='x/cropped.png',
+            content_hash='a' * 64,
+        )
+
+    def _image_url(self):
+        response = self.client.get(reverse('report:report_frames'), {
+            'date': '2030-06-01', 'start_time_hour': '10', 'start_time_minute': '00',
+            'end_time_hour': '11', 'end_time_minute': '00', 'image_view_type': 'cropped_tn',
+        })
+        return response.json()['frames'][0]['images']['cropped_tn']
+
+    @mock.patch('report.views.submit_frame', side_effect=lambda *args: _rendered(b'png'))
+    def test_versioned_url_is_cached_long_and_revalidates(self, submit_frame):
+        url = self._image_url()
+        response = self.client.get(url)
+        self.assertEqual(response.content, b'png')
+        self.assertIn('max-age=86400', response['Cache-Control'])
+
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(submit_frame.call_count, 1)
+
+    @mock.patch('report.views.submit_frame', side_effect=lambda *args: _rendered(b'png'))
+    def test_recapture_changes_url_and_etag(self, submit_frame):
+        old_url = self._image_url()
+        old_etag = self.client.get(old_url)['ETag']
+
+        Frame.objects.filter(pk=self.frame.pk).update(content_hash='b' * 64)
+        new_url = self._image_url()
+        self.assertNotEqual(new_url, old_url)
+
+        stale = self.client.get(old_url, HTTP_IF_NONE_MATCH=old_etag)
+        self.assertEqual(stale.status_code, 200)
+        self.assertNotEqual(stale['ETag'], old_etag)
+        self.assertIn('max-age=60', stale['Cache-Control'])
+
+
+def _failing_frames(first):
+    yield first
+    raise OSError('unreadable frame')
+
+
+class FfmpegEncoderTests(TestCase):
+    @mock.patch('report.animation.subprocess.Popen')
+    def test_encoder_is_killed_and_reaped_when_a_frame_fails(self, popen):
+        process = popen.return_value
+        process.stderr.read.return_value = b''
+        with self.assertRaises(OSError):
+            animation._encode_ffmpeg(_failing_frames(Image.new('RGB', (8, 6))), 'out.mp4', 'mp4', 4)
+        process.kill.assert_called_once()
+        process.stdin.close.assert_called_once()
+        process.wait.assert_called_once()
+
+
+class AnimationFrameSizeTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+    def _frame(self, minute, size):
+        Image.new('RGB', size, (0, 0, 255)).save(os.path.join(self.media_root, f'{minute}.png'))
+        return Frame.objects.create(timestamp=datetime(2030, 6, 1, 10, minute), folder=str(minute),
+                                    cropped_path=f'{minute}.png')
+
+    def test_downsampled_frames_are_scaled_to_the_first_frames_size(self):
+        frames = [self._frame(0, (40, 30)), self._frame(15, (20, 15)), self._frame(30, (40, 30))]
+        overlay = np.zeros((30, 40, 4), dtype=np.uint8)
+        with self.settings(MEDIA_ROOT=self.media_root), \
+                mock.patch('report.animation.boundary_overlay', return_value=(overlay, None)) as boundary_overlay:
+            images = list(animation.iter_animation_frames(frames, get_region('tamil_nadu'), 'All Districts', 'image'))
+
+        self.assertEqual([image.size for image in images], [(40, 30)] * 3)
+        self.assertEqual(images[1].getpixel((39, 29)), (0, 0, 255)) # Scaled, not padded with black
+        boundary_overlay.assert_called_once_with('tamil_nadu', 40, 30, 'All Districts')
+
+
+class AnimationJobTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = self.settings(MEDIA_ROOT=media_root, REPORT_ANIMATION_ROOT=os.path.join(media_root, 'animations'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        patcher = mock.patch('report.animation.boundary_overlay', return_value=(np.zeros((30, 40, 4), dtype=np.uint8), None))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        for minute in (0, 15):
+            Image.new('RGB', (40, 30), (0, 0, 255)).save(os.path.join(media_root, f'{minute}.png'))
+            Frame.objects.create(timestamp=datetime(2030, 6, 1, 10, minute), folder=str(minute), cropped_path=f'{minute}.png')
+
+    def _request(self):
+        return self.client.get(reverse('report:report_animation'), {**PARAMS, 'format': 'gif'})
+
+    def test_cache_miss_is_queued_and_then_streamed(self):
+        response = self._request()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self._request().json()['job_id'], response.json()['job_id']) # Still one build
+
+        job = jobs.claim_next_job('a')
+        self.assertEqual(job.kind, ReportJob.KIND_ANIMATION)
+        job = jobs.run_report_job(job)
+        self.assertEqual(job.status, ReportJob.STATUS_DONE)
+        status = self.client.get(response.json()['status_url']).json()
+        self.assertTrue(status['download_url'].startswith(reverse('report:report_animation')))
+
+        cached = self._request()
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached['Content-Type'], 'image/gif')
+        self.assertTrue(b''.join(cached.streaming_content).startswith(b'GIF'))
+
+    def test_range_without_frames_is_refused_without_a_job(self):
+        response = self.client.get(reverse('report:report_animation'), {**PARAMS, 'date': '2030-06-02', 'format': 'gif'})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(ReportJob.objects.exists())
@@ -6,6 +6,12 @@ app_name = 'report'
 
 urlpatterns = [
     path('report/', views.report_view, name='report'),
+    path('report/frames/', views.report_frames_api, name='report_frames'),
+    path('report/frames/<str:frame_id>/<str:image_type>.png', views.report_frame_image, name='report_frame_image'),
+    path('report/animation/', views.report_animation, name='report_animation'),
+    path('report/jobs/', views.submit_report_job_view, name='submit_report_job'),
+    path('report/jobs/<int:job_id>/', views.report_job_status, name='report_job_status'),
+    path('report/jobs/<int:job_id>/pdf/', views.report_job_download, name='report_job_download'),
     path('download-report/', views.download_report_pdf, name='download_report_pdf'),
  
-]
\ No newline at end of file
+]
@@ -1,101 +1,97 @@
 # report/views.py
 
-from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, JsonResponse, Http404
 from django.template.loader import render_to_string # Used for rendering HTML for Playwright
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_POST
+import asyncio
+import math
+from urllib.parse import urlencode
 import os
 from django.conf import settings
 from datetime import datetime, timedelta, date, time
 import pytz
 
-# --- Playwright Imports for PDF generation ---
-from playwright.sync_api import sync_playwright
+# --- PDF generation (pooled Playwright/Chromium workers) ---
+from .pdf_renderer import asset_url, render_pdf
+from .jobs import report_job_params, submit_report_job
+from .models import ReportJob
+from .singleflight import SingleFlight
+from .frame_pool import render_frames, submit_frame
+from .animation import (ANIMATION_FORMATS, AnimationError, animation_filename, animation_frames,
+                        animation_params, animation_path, check_animation, mp4_available)
 # -------------------------------------------
 
 # --- Import your actual CloudAnalysis model ---
-from weather.models import CloudAnalysis
+from weather.models import CloudAnalysis, Frame
+from weather.catalogue import FRAME_FOLDER_FORMAT, frames_in_range
+from weather.precipitation import LEGEND_LABELS
+from weather.layers import get_layer
+from weather.regions import DEFAULT_REGION_KEY, all_regions, get_region
+from weather.rollups import daily_summary
 
 # --- Image Processing Imports ---
-import geopandas as gpd
-import matplotlib
-matplotlib.use('Agg') # Use 'Agg' backend for non-interactive plotting
-import matplotlib.pyplot as plt
+# geopandas, matplotlib, rasterio and shapely are imported inside the functions that draw
+# frames, so processes that never render one (migrate, admin, API workers) don't load them.
 from PIL import Image
 import numpy as np
-import rasterio
-from rasterio.features import rasterize
-from rasterio.transform import from_bounds
-from sklearn.cluster import KMeans
-from shapely.ops import unary_union
 import warnings
 import io
-import base64
-import shutil # For cleaning up directories
 
 warnings.filterwarnings("ignore")
 
-# --- GLOBAL CONFIGURATION FOR IMAGE GENERATION (MUST MATCH YOUR SETUP) ---
-SHAPEFILE_PATH = os.path.join(settings.BASE_DIR, 'weather', 'management', 'commands', 'gadm41_IND_2.json')
+# --- GLOBAL CONFIGURATION FOR IMAGE GENERATION ---
+# Shapefile, bounds and district field of each region come from weather.regions.
 
-# These are the alignment values for the FULL TN map with overlay.
-FINAL_MIN_LON = 74.80
-FINAL_MAX_LON = 80.37
-FINAL_MIN_LAT = 7.98
-FINAL_MAX_LAT = 13.53
-# -------------------------------------------------------------------------
+# Image types produced by _generate_image_data_for_timestamp for every frame.
+IMAGE_TYPES = ('cropped_tn', 'masked_district', 'aligned_overlay_tn')
 
+# Image types each 'image_view_type' option actually displays. Only these are generated.
+VIEW_TYPE_IMAGE_TYPES = {
+    'cropped_tn': ('cropped_tn',),
+    'masked_district': ('masked_district',),
+    'tn_overlay': ('aligned_overlay_tn',),
+    'combined_full_tn': ('cropped_tn', 'aligned_overlay_tn'),
+}
 
-# --- HELPER FUNCTION: Saves a PIL image and returns its ABSOLUTE web URL ---
-def save_image_and_get_url(request, image_pil, report_base_dir, timestamp_dt, image_type_name):
-    """
-    Saves a PIL image to a specific subfolder structure within the report's directory
-    and returns its ABSOLUTE URL.
+# Frames per page returned by report_frames_api (the report page fetches further pages on scroll).
+FRAMES_PAGE_SIZE = 6
+FRAMES_MAX_PAGE_SIZE = 48
 
-    Args:
-        request (HttpRequest): The Django request object, needed to build absolute URI.
-        image_pil (PIL.Image.Image): The PIL image object to save.
-        report_base_dir (str): The full path to the base directory for this report
-                                (e.g., settings.MEDIA_ROOT/report_images/2025-06-27_Coimbatore_10-00-10-15)
-        timestamp_dt (datetime): The timestamp associated with this image.
-        image_type_name (str): A descriptive name for the image type (e.g., 'cropped_tn').
+# Browser cache lifetime for on-demand frame images requested under their current version
+# (frame_image_version); a recapture or retention downsampling changes the version, and so the URL.
+FRAME_IMAGE_MAX_AGE = 60 * 60 * 24
+# ... and for unversioned or outdated URLs, which are revalidated against the version's ETag.
+FRAME_IMAGE_REVALIDATE_AGE = 60
 
-    Returns:
-        str: The ABSOLUTE URL to access the saved image from the web.
-    """
-    # Create a unique subfolder based on the image's timestamp within the report folder
-    image_timestamp_folder = timestamp_dt.strftime('%H-%M-%S') # Only time for subfolder
-
-    # Construct the full path where the image will be saved on the server
-    save_dir = os.path.join(report_base_dir, image_timestamp_folder)
-    os.makedirs(save_dir, exist_ok=True) # Ensure directory exists
+DEFAULT_DISTRICTS = ('Coimbatore', 'Chennai', 'Madurai', 'Trichy', 'Salem', 'Ariyalur')
+# -------------------------------------------------------------------------
 
-    # Define the filename within that timestamp folder
-    file_name = f"{image_type_name}.png"
-    full_path = os.path.join(save_dir, file_name)
 
-    try:
-        # Save the image
-        image_pil.save(full_path, format="PNG")
-
-        # Construct the ABSOLUTE URL for the browser
-        # This path must be relative to settings.MEDIA_URL first, then converted to absolute
-        relative_path_from_media_root = os.path.relpath(full_path, settings.MEDIA_ROOT)
-        # Use request.build_absolute_uri to get the full http://... URL
-        # IMPORTANT: Replace os.sep with '/' for URL paths
-        image_url = request.build_absolute_uri(os.path.join(settings.MEDIA_URL, relative_path_from_media_root).replace(os.sep, '/'))
-        return image_url
-    except Exception as e:
-        print(f"Error saving image {full_path}: {e}")
-        return None
+# --- HELPER FUNCTION: Maps the 'image_view_type' selector value to the images it displays ---
+def _image_types_for_view(selected_image_view, default=IMAGE_TYPES):
+    """
+    Returns the image types (keys of _generate_image_data_for_timestamp's output) needed
+    to display `selected_image_view`, or `default` if no known view is selected.
+    """
+    return VIEW_TYPE_IMAGE_TYPES.get(selected_image_view, default)
 
 
 # --- HELPER FUNCTION: Encapsulates core image generation logic to return PIL images ---
 def _generate_image_data_for_timestamp(
-    base_image_path_for_this_timestamp, timestamp_dt, selected_district, gdf_tn
+    base_image_path_for_this_timestamp, timestamp_dt, selected_district, gdf_tn, image_types=IMAGE_TYPES, region=None
 ):
     """
     Generates PIL Image objects for different views (cropped, masked, overlay).
+    Only the views listed in `image_types` are rendered; the others are left out of the result.
+    `gdf_tn` holds the district geometries of `region` (the default region if None), which
+    also supplies the georeferencing of the cropped image.
     """
+    region = region or get_region()
+    district_field = region.district_field
     try:
         if not os.path.exists(base_image_path_for_this_timestamp):
             print(f"Warning: Base image '{base_image_path_for_this_timestamp}' not found. Skipping image processing for this timestamp.")
@@ -104,68 +100,78 @@ def _generate_image_data_for_timestamp(
         img_pil = Image.open(base_image_path_for_this_timestamp).convert("RGB")
         img_np = np.array(img_pil)
         height, width, _ = img_np.shape
-        transform = from_bounds(FINAL_MIN_LON, FINAL_MAX_LON, FINAL_MIN_LAT, FINAL_MAX_LAT, width, height)
+        transform = region.transform(width, height)
 
-        output_images = {
-            'cropped_tn': img_pil, # Directly return the PIL image
-            'masked_district': None,
-            'aligned_overlay_tn': None,
-        }
+        output_images = {}
+
+        if 'cropped_tn' in image_types:
+            output_images['cropped_tn'] = img_pil # Directly return the PIL image
 
         # 1. Masked District Image
-        if selected_district == 'All Districts' or gdf_tn.empty:
-            output_images['masked_district'] = img_pil # If no specific district, use full cropped
-        else:
-            district_rows_for_name = gdf_tn[gdf_tn['NAME_2'].str.lower() == selected_district.lower()]
-            if not district_rows_for_name.empty:
-                all_district_geometries = district_rows_for_name.geometry.to_list()
-                district_polygon_for_mask = unary_union(all_district_geometries)
-                
-                mask = rasterize(
-                    [district_polygon_for_mask],
-                    out_shape=(height, width),
-                    transform=transform,
-                    fill=0,
-                    all_touched=True,
-                    dtype=np.uint8
-                )
-                mask_boolean = mask.astype(bool)
-                cropped_district_img_np = np.zeros_like(img_np)
-                cropped_district_img_np[mask_boolean] = img_np[mask_boolean]
-                output_images['masked_district'] = Image.fromarray(cropped_district_img_np)
+        if 'masked_district' in image_types:
+            if selected_district == 'All Districts' or gdf_tn.empty:
+                output_images['masked_district'] = img_pil # If no specific district, use full cropped
             else:
-                print(f"Warning: District '{selected_district}' not found in shapefile for masked image generation at {timestamp_dt}.")
-                output_images['masked_district'] = None 
+                district_rows_for_name = gdf_tn[gdf_tn[district_field].str.lower() == selected_district.lower()]
+                if not district_rows_for_name.empty:
+                    from rasterio.features import rasterize
+                    from shapely.ops import unary_union
+
+                    all_district_geometries = district_rows_for_name.geometry.to_list()
+                    district_polygon_for_mask = unary_union(all_district_geometries)
+                    
+                    mask = rasterize(
+                        [district_polygon_for_mask],
+                        out_shape=(height, width),
+                        transform=transform,
+                        fill=0,
+                        all_touched=True,
+                        dtype=np.uint8
+                    )
+                    mask_boolean = mask.astype(bool)
+                    cropped_district_img_np = np.zeros_like(img_np)
+                    cropped_district_img_np[mask_boolean] = img_np[mask_boolean]
+                    output_images['masked_district'] = Image.fromarray(cropped_district_img_np)
+                else:
+                    print(f"Warning: District '{selected_district}' not found in shapefile for masked image generation at {timestamp_dt}.")
+                    output_images['masked_district'] = None 
 
         # 2. Overall TN Map with District Outlines (and highlighted district)
-        fig, ax = plt.subplots(figsize=(10, 10))
-        ax.imshow(img_np, extent=[FINAL_MIN_LON, FINAL_MAX_LON, FINAL_MIN_LAT, FINAL_MAX_LAT])
-        gdf_tn.boundary.plot(ax=ax, edgecolor='black', linewidth=0.5)
-
-        if selected_district != 'All Districts':
-            district_rows_for_name_for_highlight = gdf_tn[gdf_tn['NAME_2'].str.lower() == selected_district.lower()]
-            if not district_rows_for_name_for_highlight.empty:
-                district_rows_for_name_for_highlight.boundary.plot(ax=ax, edgecolor='cyan', linewidth=2, linestyle='--', label=selected_district)
-                ax.set_title(f"Aligned Screenshot with {selected_district} Highlighted ({timestamp_dt.strftime('%H:%M')})")
-                ax.legend()
+        if 'aligned_overlay_tn' in image_types:
+            # Object-oriented Figure + Agg canvas rather than pyplot: pyplot's global figure
+            # state is not thread-safe, and frames are rendered concurrently (report/frame_pool.py).
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            from matplotlib.figure import Figure
+
+            fig = Figure(figsize=(10, 10))
+            FigureCanvasAgg(fig)
+            ax = fig.add_subplot()
+            ax.imshow(img_np, extent=region.extent)
+            gdf_tn.boundary.plot(ax=ax, edgecolor='black', linewidth=0.5)
+
+            if selected_district != 'All Districts':
+                district_rows_for_name_for_highlight = gdf_tn[gdf_tn[district_field].str.lower() == selected_district.lower()]
+                if not district_rows_for_name_for_highlight.empty:
+                    district_rows_for_name_for_highlight.boundary.plot(ax=ax, edgecolor='cyan', linewidth=2, linestyle='--', label=selected_district)
+                    ax.set_title(f"Aligned Screenshot with {selected_district} Highlighted ({timestamp_dt.strftime('%H:%M')})")
+                    ax.legend()
+                else:
+                    ax.set_title(f"Aligned Screenshot (District '{selected_district}' not found for highlight) ({timestamp_dt.strftime('%H:%M')})")
             else:
-                ax.set_title(f"Aligned Screenshot (District '{selected_district}' not found for highlight) ({timestamp_dt.strftime('%H:%M')})")
-        else:
-            ax.set_title(f"Aligned Screenshot with All TN District Outlines ({timestamp_dt.strftime('%H:%M')})")
-
-        ax.set_xlabel("Longitude")
-        ax.set_ylabel("Latitude")
-        ax.set_aspect('equal')
-        plt.tight_layout()
-
-        # Save matplotlib figure to a BytesIO object, then open with PIL
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format="PNG", bbox_inches='tight', pad_inches=0.1)
-        buffer.seek(0)
-        output_images['aligned_overlay_tn'] = Image.open(buffer).convert("RGB")
-        
-        buffer.close()
-        plt.close(fig) # Always close the figure!
+                ax.set_title(f"Aligned Screenshot with All {region.name} District Outlines ({timestamp_dt.strftime('%H:%M')})")
+
+            ax.set_xlabel("Longitude")
+            ax.set_ylabel("Latitude")
+            ax.set_aspect('equal')
+            fig.tight_layout()
+
+            # Save matplotlib figure to a BytesIO object, then open with PIL
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format="PNG", bbox_inches='tight', pad_inches=0.1)
+            buffer.seek(0)
+            output_images['aligned_overlay_tn'] = Image.open(buffer).convert("RGB")
+            
+            buffer.close()
 
         return output_images
 
@@ -175,24 +181,34 @@ def _generate_image_data_for_timestamp(
     except Exception as e:
         print(f"An unexpected error occurred during image generation for {timestamp_dt}: {e}")
         return None
-    finally:
-        # Ensure the figure is always closed if created, even if an error occurs
-        if 'fig' in locals() and fig:
-            plt.close(fig)
 
-# --- Main view for displaying the report in the browser ---
-def report_view(request):
-    selected_date_str = request.GET.get('date')
-    selected_district = request.GET.get('district', 'All Districts')
+# --- HELPER FUNCTION: Parses the date / district / time-range filters shared by all report views ---
+def _parse_report_filters(query_params):
+    """
+    Reads the report filter parameters from a QueryDict (request.GET) or a plain dict.
+
+    Returns:
+        dict: filter_date, selected_district, selected_image_view, filter_start_datetime,
+              filter_end_datetime, region (a weather.regions key) and the HH:MM strings
+              used to re-populate the form.
+    """
+    selected_date_str = query_params.get('date')
+    selected_region = query_params.get('region') or DEFAULT_REGION_KEY
+    try:
+        get_region(selected_region)
+    except KeyError:
+        print(f"Warning: Unknown region '{selected_region}'. Defaulting to '{DEFAULT_REGION_KEY}'.")
+        selected_region = DEFAULT_REGION_KEY
+    selected_district = query_params.get('district', 'All Districts')
     if selected_district == "" or selected_district is None:
         selected_district = "All Districts"
 
-    start_time_hour_str = request.GET.get('start_time_hour')
-    start_time_minute_str = request.GET.get('start_time_minute')
-    end_time_hour_str = request.GET.get('end_time_hour')
-    end_time_minute_str = request.GET.get('end_time_minute')
+    start_time_hour_str = query_params.get('start_time_hour')
+    start_time_minute_str = query_params.get('start_time_minute')
+    end_time_hour_str = query_params.get('end_time_hour')
+    end_time_minute_str = query_params.get('end_time_minute')
 
-    selected_image_view = request.GET.get('image_view_type', '')
+    selected_image_view = query_params.get('image_view_type', '')
 
     filter_date = None
     if selected_date_str:
@@ -203,8 +219,6 @@ def report_view(request):
             filter_date = date.today()
     else:
         filter_date = date.today()
-    
-    target_date_display_str = filter_date.strftime('%Y-%m-%d')
 
     selected_start_time_for_template = ''
     selected_end_time_for_template = ''
@@ -258,7 +272,7 @@ def report_view(request):
             filter_start_datetime = datetime.combine(filter_date, start_time_obj)
             filter_end_datetime = datetime.combine(filter_date, end_time_obj)
 
-        except ValueError as e:
+        except (TypeError, ValueError) as e:
             print(f"Error parsing time parameters: {e}. Defaulting to full day.")
             filter_start_datetime = datetime.combine(filter_date, time(0, 0, 0))
             filter_end_datetime = datetime.combine(filter_date, time(23, 59, 59, 999999))
@@ -272,514 +286,444 @@ def report_view(request):
         if filter_end_datetime:
             filter_end_datetime = current_timezone.localize(filter_end_datetime)
 
+    return {
+        'selected_date_str': selected_date_str,
+        'filter_date': filter_date,
+        'selected_district': selected_district,
+        'selected_image_view': selected_image_view,
+        'region': selected_region,
+        'filter_start_datetime': filter_start_datetime,
+        'filter_end_datetime': filter_end_datetime,
+        'selected_start_time': selected_start_time_for_template,
+        'selected_end_time': selected_end_time_for_template,
+    }
 
-    print(f"\n--- Generating Images for Date: {target_date_display_str}, District: {selected_district}, Image View: {selected_image_view} ---")
-    print(f"Time Range Filter (Backend): {filter_start_datetime} - {filter_end_datetime}")
-    print(f"SHAPEFILE_PATH configured as: {SHAPEFILE_PATH}")
 
-    generated_images_for_display = [] 
+def _get_available_districts(region_key=DEFAULT_REGION_KEY):
+    """Returns the sorted district names of the region for the filter dropdown."""
+    region = get_region(region_key)
+    districts = region.district_names()
+    if not districts:
+        print(f"ERROR: No districts for {region.name} in the shapefile at {region.shapefile_path}. Falling back to default list.")
+        if region.is_default:
+            return list(DEFAULT_DISTRICTS)
+    return districts
 
-    gdf = None
-    gdf_tn = None
 
-    try:
-        if not os.path.exists(SHAPEFILE_PATH):
-            raise FileNotFoundError(f"Shapefile not found at {SHAPEFILE_PATH}.")
-        gdf = gpd.read_file(SHAPEFILE_PATH)
-        gdf_tn = gdf[
-            (gdf['NAME_1'].str.strip().str.lower() == 'tamilnadu') |
-            (gdf['NAME_1'].str.strip().str.lower() == 'tamil nadu')
-        ].to_crs("EPSG:4326")
-        print(f"Shapefile loaded successfully.")
-    except FileNotFoundError as fnfe:
-        print(f"CRITICAL ERROR: Shapefile (for generation) not found: {fnfe}")
-    except Exception as e:
-        print(f"ERROR loading shapefile: {e}")
+# --- HELPER FUNCTION: Lists the catalogued frames that fall inside the selected time range ---
+def _find_frames(filter_start_datetime, filter_end_datetime, region_key=DEFAULT_REGION_KEY):
+    """
+    Returns the region's Frame catalogue entries within [filter_start_datetime, filter_end_datetime),
+    oldest first. This is one indexed range query, independent of the archive size.
+    """
+    return list(frames_in_range(filter_start_datetime, filter_end_datetime, region=region_key))
 
 
-    if os.path.exists(settings.MEDIA_ROOT) and os.path.isdir(settings.MEDIA_ROOT) and gdf_tn is not None:
-        available_image_timestamps_and_folders = []
-        for d in os.listdir(settings.MEDIA_ROOT): 
-            full_path_to_folder = os.path.join(settings.MEDIA_ROOT, d)
-            if os.path.isdir(full_path_to_folder):
-                try:
-                    folder_timestamp_str = d 
-                    folder_datetime_obj = datetime.strptime(folder_timestamp_str, '%Y-%m-%d_%H-%M-%S')
-                    
-                    if current_timezone:
-                        folder_datetime_obj = current_timezone.localize(folder_datetime_obj)
-
-                    if folder_datetime_obj.date() == filter_date and \
-                       filter_start_datetime <= folder_datetime_obj < filter_end_datetime:
-                        available_image_timestamps_and_folders.append((folder_datetime_obj, full_path_to_folder))
-                except (ValueError, IndexError):
-                    pass 
-        
-        available_image_timestamps_and_folders.sort(key=lambda x: x[0])
+def _canonical_district_name(selected_district, region_key=DEFAULT_REGION_KEY):
+    """
+    Returns the district name as stored by the capture daemon (shapefile spelling), so
+    queries can use an exact, index-friendly match instead of `city__iexact`.
+    """
+    for district in _get_available_districts(region_key):
+        if district.lower() == selected_district.lower():
+            return district
+    return selected_district
 
-        print(f"Found {len(available_image_timestamps_and_folders)} image folders within the selected time range for {target_date_display_str}.")
 
-        for timestamp_dt, folder_path in available_image_timestamps_and_folders:
-            base_image_path_for_this_timestamp = os.path.join(folder_path, 'cropped', 'tamil_nadu_cropped.png')
-            
-            # Call the helper to get PIL image data
-            pil_images = _generate_image_data_for_timestamp(
-                base_image_path_for_this_timestamp, timestamp_dt, selected_district, gdf_tn
-            )
-
-            if pil_images: 
-                current_image_set = {
-                    'timestamp': timestamp_dt,
-                    'cropped_tn': None,
-                    'masked_district': None,
-                    'aligned_overlay_tn': None,
-                }
-
-                # Convert PIL images to Base64 for browser display (This view uses Base64)
-                for img_type, pil_img in pil_images.items():
-                    if pil_img:
-                        buffer = io.BytesIO()
-                        pil_img.save(buffer, format="PNG")
-                        current_image_set[img_type] = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode('utf-8')
-                        buffer.close()
-                    elif img_type == 'masked_district' and selected_district == 'All Districts':
-                        current_image_set['masked_district'] = current_image_set['cropped_tn']
-                    else:
-                        current_image_set[img_type] = None 
-
-                generated_images_for_display.append(current_image_set)
-    else:
-        print(f"Image generation skipped for browser display: Base media directory or shapefile not loaded successfully.")
+def _filtered_cloud_analysis(filters):
+    """
+    Returns the CloudAnalysis rows with precipitation for the selected filters.
+    Only range / equality predicates are used so the (city, timestamp) and
+    (region, timestamp) indexes apply.
+    """
+    day_start = datetime.combine(filters['filter_date'], time(0, 0))
+    if settings.USE_TZ:
+        day_start = pytz.timezone(settings.TIME_ZONE).localize(day_start)
+    day_end = day_start + timedelta(days=1)
+
+    range_start = max(day_start, filters['filter_start_datetime'] or day_start)
+    range_end = min(day_end, filters['filter_end_datetime'] or day_end)
 
-    # --- Filtering CloudAnalysis data ---
     cloud_analysis_query = CloudAnalysis.objects.filter(
-        timestamp__date=filter_date 
+        timestamp__gte=range_start,
+        timestamp__lt=range_end,
+        region=filters['region'],
+        type=get_layer().name, # Radar rows; other layers have their own legends
+        has_precipitation=True,
     )
 
-    if selected_district != 'All Districts':
-        cloud_analysis_query = cloud_analysis_query.filter(city__iexact=selected_district)
-
-    if filter_start_datetime and filter_end_datetime:
+    if filters['selected_district'] != 'All Districts':
         cloud_analysis_query = cloud_analysis_query.filter(
-            timestamp__gte=filter_start_datetime,
-            timestamp__lt=filter_end_datetime 
+            city=_canonical_district_name(filters['selected_district'], filters['region'])
         )
-    
-    EXCLUDE_NO_PRECIP_MESSAGE = "No significant cloud levels found for precipitation"
-    cloud_analysis_query = cloud_analysis_query.exclude(values__iexact=EXCLUDE_NO_PRECIP_MESSAGE)
 
-    filtered_cloud_analysis_data = list(cloud_analysis_query.order_by('city', 'timestamp'))
-    
-    print(f"Fetched {len(filtered_cloud_analysis_data)} weather data points for {target_date_display_str} and {selected_district} (excluding 'no precipitation' values).")
+    return list(cloud_analysis_query.order_by('city', 'timestamp'))
 
-    full_available_districts = []
-    try:
-        if not os.path.exists(SHAPEFILE_PATH):
-            print(f"ERROR: Shapefile for district list not found at {SHAPEFILE_PATH}. Falling back to default list.")
-            full_available_districts = ['Coimbatore', 'Chennai', 'Madurai', 'Trichy', 'Salem', 'Ariyalur']
-        else:
-            temp_gdf = gpd.read_file(SHAPEFILE_PATH)
-            gdf_tn_districts_for_list = temp_gdf[
-                (temp_gdf['NAME_1'].str.strip().str.lower() == 'tamilnadu') |
-                (temp_gdf['NAME_1'].str.strip().str.lower() == 'tamil nadu')
-            ]
-            
-            if 'NAME_2' in gdf_tn_districts_for_list.columns:
-                unique_districts = gdf_tn_districts_for_list['NAME_2'].dropna().unique().tolist()
-                full_available_districts = sorted(unique_districts)
-                print(f"Dynamically loaded {len(full_available_districts)} districts from shapefile.")
-            else:
-                print("Warning: 'NAME_2' column not found in shapefile for district extraction. Falling back to default list.")
-                full_available_districts = ['Coimbatore', 'Chennai', 'Madurai', 'Trichy', 'Salem', 'Ariyalur']
 
-    except Exception as e:
-        print(f"Error loading districts from shapefile for dropdown: {e}. Falling back to default list.")
-        full_available_districts = ['Coimbatore', 'Chennai', 'Madurai', 'Trichy', 'Salem', 'Ariyalur']
+def _district_daily_summary(filters):
+    """
+    Per-district precipitation summary for the selected day, read from the precomputed
+    daily rollups rather than raw CloudAnalysis history. Only districts with rain are listed.
+    """
+    cities = None
+    if filters['selected_district'] != 'All Districts':
+        cities = [_canonical_district_name(filters['selected_district'], filters['region'])]
+
+    return [
+        {
+            'city': rollup.city,
+            'max_class_label': LEGEND_LABELS[rollup.max_class - 1],
+            'precip_minutes': rollup.precip_minutes,
+            'sample_count': rollup.sample_count,
+        }
+        for rollup in daily_summary(filters['filter_date'], filters['region'], cities)
+        if rollup.max_class
+    ]
+
+
+# --- Main view for displaying the report in the browser ---
+def report_view(request):
+    """
+    Renders the report shell: filters and the Cloud Analysis table. Frame images are
+    not generated here; the page fetches them page by page from `report_frames_api`
+    and each image is rendered on demand by `report_frame_image`.
+    """
+    filters = _parse_report_filters(request.GET)
+    filter_date = filters['filter_date']
+    selected_district = filters['selected_district']
+
+    print(f"\n--- Report shell for Date: {filter_date.strftime('%Y-%m-%d')}, District: {selected_district}, Image View: {filters['selected_image_view']} ---")
+    print(f"Time Range Filter (Backend): {filters['filter_start_datetime']} - {filters['filter_end_datetime']}")
 
+    filtered_cloud_analysis_data = _filtered_cloud_analysis(filters)
+
+    print(f"Fetched {len(filtered_cloud_analysis_data)} weather data points for {filter_date.strftime('%Y-%m-%d')} and {selected_district} (excluding 'no precipitation' values).")
 
     context = {
-        'generated_images_for_display': generated_images_for_display, 
         'selected_date': filter_date.strftime('%Y-%m-%d'),
         'selected_district': selected_district,
-        'available_districts': full_available_districts,
-        'cloud_analysis_data': filtered_cloud_analysis_data, 
-        'selected_image_view': selected_image_view,
-        'selected_start_time': selected_start_time_for_template,
-        'selected_end_time': selected_end_time_for_template,
+        'available_districts': _get_available_districts(filters['region']),
+        'available_regions': all_regions(),
+        'selected_region': filters['region'],
+        'cloud_analysis_data': filtered_cloud_analysis_data,
+        'district_summary': _district_daily_summary(filters),
+        'selected_image_view': filters['selected_image_view'],
+        'selected_start_time': filters['selected_start_time'],
+        'selected_end_time': filters['selected_end_time'],
+        'frames_api_url': reverse('report:report_frames'),
+        'animation_url': reverse('report:report_animation'),
+        'frames_page_size': FRAMES_PAGE_SIZE,
     }
     return render(request, 'report/report.html', context)
 
-def save_report_images_for_timestamp(timestamp_dt, report_specific_media_dir, selected_district=None, radar_data_for_plot=None):
-    image_paths = {}
 
-    timestamp_folder_name = timestamp_dt.strftime('%Y-%m-%d_%H-%M-%S')
-    output_dir = os.path.join(report_specific_media_dir, timestamp_folder_name)
-    os.makedirs(output_dir, exist_ok=True)
+def frame_image_version(frame):
+    """Version of a frame's images: changes when the slot is recaptured or its files are downsampled."""
+    return f"{frame.content_hash[:16]}-{frame.retention_tier}"
 
-    # --- 1. Generate/Save Cropped TN Image (Radar Only) ---
-    # Assuming the source for this is a fixed file or generated separately.
-    # Replace this with your actual generation logic if it's not just loading a file.
-    cropped_tn_source_path = os.path.join(settings.MEDIA_ROOT, 'radar_data_base_folders', timestamp_folder_name, "tamil_nadu_cropped.png") 
-    # ^^^ ADJUST THIS SOURCE PATH to where your raw radar images are stored
-    
-    if os.path.exists(cropped_tn_source_path):
-        try:
-            pil_cropped_tn = Image.open(cropped_tn_source_path).copy()
-            output_file_name = "cropped_tn.png"
-            output_path = os.path.join(output_dir, output_file_name)
-            pil_cropped_tn.save(output_path, format="PNG")
-            image_paths['cropped_tn'] = os.path.relpath(output_path, settings.MEDIA_ROOT)
-            print(f"Saved cropped_tn: {image_paths['cropped_tn']}") # Debug
-        except Exception as e:
-            print(f"Error saving cropped_tn from {cropped_tn_source_path}: {e}")
-    else:
-        print(f"DEBUG: Source cropped_tn.png not found at {cropped_tn_source_path}")
-
-
-    # --- 2. Generate/Save Masked District Image (if needed, not part of combined_full_tn directly) ---
-    # (Leaving this in for completeness, though not strictly for 'combined_full_tn')
-    if selected_district:
-        masked_district_source_path = os.path.join(settings.MEDIA_ROOT, 'radar_data_base_folders', timestamp_folder_name, f"{selected_district.replace(' ', '_')}_masked.png")
-        if os.path.exists(masked_district_source_path):
-            try:
-                pil_masked_district = Image.open(masked_district_source_path).copy()
-                output_file_name = "masked_district.png"
-                output_path = os.path.join(output_dir, output_file_name)
-                pil_masked_district.save(output_path, format="PNG")
-                image_paths['masked_district'] = os.path.relpath(output_path, settings.MEDIA_ROOT)
-                print(f"Saved masked_district: {image_paths['masked_district']}") # Debug
-            except Exception as e:
-                print(f"Error saving masked_district from {masked_district_source_path}: {e}")
-        else:
-            print(f"DEBUG: Source masked_district.png not found at {masked_district_source_path}")
 
-    base_map_path = os.path.join(settings.BASE_DIR, 'static', 'radar_report', 'tamil_nadu_base_map_with_districts.png') 
-    # ^^^ Make sure this path points to your actual base map image file
-    
-    if os.path.exists(base_map_path): # Check if base map exists
-        try:
-            # Load the base map
-            base_map_pil = Image.open(base_map_path).convert("RGBA") # Ensure RGBA for transparency if needed
-
-            # --- Your ACTUAL Matplotlib/PIL overlay logic goes here ---
-            # Example (pseudo-code, replace with your real plotting logic):
-            if radar_data_for_plot: # Only if you have radar data to overlay
-                fig, ax = plt.subplots(figsize=(base_map_pil.width / 100, base_map_pil.height / 100), dpi=100) # Match base map dimensions
-                ax.imshow(base_map_pil)
-
-                ax.axis('off') # Hide axes
-                ax.set_position([0, 0, 1, 1]) # Make plot fill the figure
-                
-                buf = io.BytesIO()
-                plt.savefig(buf, format='PNG', bbox_inches='tight', pad_inches=0)
-                plt.close(fig) # Close the plot to free memory
-                buf.seek(0)
-                pil_tn_overlay = Image.open(buf).convert("RGBA") # Convert to RGBA after plotting
-
-            else: # If no radar data, just use the base map as the "overlay" image
-                pil_tn_overlay = base_map_pil.copy()
-
-            output_file_name = "tn_overlay.png" # You can call it aligned_overlay_tn.png if you prefer
-            output_path = os.path.join(output_dir, output_file_name)
-            pil_tn_overlay.save(output_path, format="PNG")
-            image_paths['aligned_overlay_tn'] = os.path.relpath(output_path, settings.MEDIA_ROOT)
-            print(f"Saved tn_overlay: {image_paths['aligned_overlay_tn']}") # Debug
-
-        except Exception as e:
-            print(f"Error generating or saving tn_overlay: {e}")
-    else:
-        print(f"DEBUG: Base map for overlay not found at {base_map_path}")
-
-    return image_paths
-
-
-# --- RESTORED AND MODIFIED VIEW: For processing, IMAGE SAVING, and PDF GENERATION ---
-def download_report_pdf(request):
-    selected_date_str = request.GET.get('date')
-    selected_district = request.GET.get('district', 'All Districts')
-    if selected_district == "" or selected_district is None:
-        selected_district = "All Districts"
-
-    start_time_hour_str = request.GET.get('start_time_hour')
-    start_time_minute_str = request.GET.get('start_time_minute')
-    end_time_hour_str = request.GET.get('end_time_hour')
-    end_time_minute_str = request.GET.get('end_time_minute')
-
-    selected_image_view = request.GET.get('image_view_type', '') 
-
-    filter_date = None
-    if selected_date_str:
-        try:
-            filter_date = datetime.strptime(selected_date_str, '%Y-%m-%d').date()
-        except ValueError:
-            print(f"Warning: Invalid date format '{selected_date_str}'. Defaulting to today's date.")
-            filter_date = date.today()
-    else:
-        filter_date = date.today()
-    
-    target_date_display_str = filter_date.strftime('%Y-%m-%d')
-
-    selected_start_time_for_template = ''
-    selected_end_time_for_template = ''
-
-    filter_start_datetime = None
-    filter_end_datetime = None
-
-    current_timezone = pytz.timezone(settings.TIME_ZONE) if settings.USE_TZ else None
-
-    if not start_time_hour_str or not start_time_minute_str:
-        now = datetime.now()
-        current_minute = now.minute
-        current_hour = now.hour
+# --- JSON API: one page of frames (timestamps + on-demand image URLs) for the report page ---
+async def report_frames_api(request):
+    """
+    Lists the frames in the selected time range, one page at a time.
 
-        from_minute = (current_minute // 15) * 15
-        if current_minute % 15 != 0:
-            from_minute = ((current_minute // 15) + 1) * 15
-            if from_minute == 60:
-                from_minute = 0
-                current_hour = (current_hour + 1) % 24
+    Query params are the same as `report_view`, plus `page` (1-based) and `page_size`.
+    Images are not generated here; each frame carries the URLs of `report_frame_image`
+    for the image types the selected `image_view_type` displays (none if no view is selected),
+    versioned with frame_image_version so caches never serve a replaced image.
+    Async: the two index queries use the async ORM and never occupy a sync worker thread.
+    """
+    filters = _parse_report_filters(request.GET)
+    image_types = _image_types_for_view(filters['selected_image_view'], default=())
 
-        from_hour = current_hour
-        
-        start_time_obj = time(from_hour, from_minute)
-        selected_start_time_for_template = start_time_obj.strftime("%H:%M")
-        filter_start_datetime = datetime.combine(filter_date, start_time_obj)
+    try:
+        page_size = max(1, min(int(request.GET.get('page_size', FRAMES_PAGE_SIZE)), FRAMES_MAX_PAGE_SIZE))
+    except ValueError:
+        page_size = FRAMES_PAGE_SIZE
 
-        to_minute = from_minute + 15
-        to_hour = from_hour
-        if to_minute == 60:
-            to_minute = 0
-            to_hour = (to_hour + 1) % 24
-        
-        end_time_obj = time(to_hour, to_minute)
-        selected_end_time_for_template = end_time_obj.strftime("%H:%M")
-        filter_end_datetime = datetime.combine(filter_date, end_time_obj)
+    frames_qs = frames_in_range(filters['filter_start_datetime'], filters['filter_end_datetime'], region=filters['region'])
+    count = await frames_qs.acount()
+    num_pages = max(1, math.ceil(count / page_size))
+    try:
+        page_number = min(max(int(request.GET.get('page', 1)), 1), num_pages)
+    except ValueError:
+        page_number = 1
+    offset = (page_number - 1) * page_size
+
+    district_query = urlencode({'district': filters['selected_district'], 'region': filters['region']})
+    frames = []
+    async for frame in frames_qs[offset:offset + page_size]:
+        frame_id = frame.timestamp.strftime(FRAME_FOLDER_FORMAT)
+        image_query = f"{district_query}&{urlencode({'v': frame_image_version(frame)})}"
+        frames.append({
+            'id': frame_id,
+            'timestamp': frame.timestamp.isoformat(),
+            'time': frame.timestamp.strftime('%H:%M'),
+            'date': frame.timestamp.strftime('%Y-%m-%d'),
+            'images': {
+                image_type: f"{reverse('report:report_frame_image', args=[frame_id, image_type])}?{image_query}"
+                for image_type in image_types
+            },
+        })
+
+    return JsonResponse({
+        'count': count,
+        'page': page_number,
+        'page_size': page_size,
+        'num_pages': num_pages,
+        'next_page': page_number + 1 if page_number < num_pages else None,
+        'frames': frames,
+    })
+
+
+# --- On-demand PNG for a single frame / image type ---
+_frame_image_flight = SingleFlight()
+
+
+async def report_frame_image(request, frame_id, image_type):
+    """
+    Generates one image for one capture folder and returns it as a PNG.
+    A capture folder's images change when the slot is recaptured or retention downsamples
+    them, so responses are cached long only under the current version (`v`, see
+    frame_image_version) and are otherwise revalidated by ETag.
 
+    Async: the image is generated on the bounded frame pool (report/frame_pool.py), so
+    the event loop keeps serving other requests and a page's images render in parallel.
+    """
+    if image_type not in IMAGE_TYPES:
+        raise Http404(f"Unknown image type '{image_type}'.")
+    try:
+        timestamp_dt = datetime.strptime(frame_id, FRAME_FOLDER_FORMAT)
+    except ValueError:
+        raise Http404(f"Invalid frame id '{frame_id}'.")
+
+    selected_district = request.GET.get('district') or 'All Districts'
+    region_key = request.GET.get('region') or DEFAULT_REGION_KEY
+
+    frame = await Frame.objects.filter(region=region_key, timestamp=timestamp_dt).afirst()
+    if frame is None or not frame.cropped_path:
+        raise Http404(f"Frame {frame_id} is not in the frame catalogue.")
+
+    version = frame_image_version(frame)
+    etag = quote_etag(f"{version}-{image_type}-{selected_district}")
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    # Viewers of the same storm request the same images at the same time; render each once.
+    future = _frame_image_flight.submit(
+        (frame.pk, version, image_type, selected_district),
+        lambda: submit_frame(frame, selected_district, (image_type,)),
+    )
+    png_images = await asyncio.wrap_future(future)
+    png_bytes = png_images.get(image_type) if png_images else None
+    if png_bytes is None:
+        raise Http404(f"Image '{image_type}' not available for frame {frame_id}.")
+
+    response = HttpResponse(png_bytes, content_type='image/png')
+    response['ETag'] = etag
+    if request.GET.get('v') == version:
+        patch_cache_control(response, public=True, max_age=FRAME_IMAGE_MAX_AGE)
     else:
-        try:
-            start_hour = int(start_time_hour_str)
-            start_minute = int(start_time_minute_str)
-            end_hour = int(end_time_hour_str)
-            end_minute = int(end_time_minute_str)
-
-            start_time_obj = time(start_hour, start_minute)
-            end_time_obj = time(end_hour, end_minute)
-
-            selected_start_time_for_template = start_time_obj.strftime("%H:%M")
-            selected_end_time_for_template = end_time_obj.strftime("%H:%M")
-
-            filter_start_datetime = datetime.combine(filter_date, start_time_obj)
-            filter_end_datetime = datetime.combine(filter_date, end_time_obj)
+        patch_cache_control(response, public=True, max_age=FRAME_IMAGE_REVALIDATE_AGE)
+    return response
 
-        except ValueError as e:
-            print(f"Error parsing time parameters: {e}. Defaulting to full day.")
-            filter_start_datetime = datetime.combine(filter_date, time(0, 0, 0))
-            filter_end_datetime = datetime.combine(filter_date, time(23, 59, 59, 999999))
-            selected_start_time_for_template = "00:00"
-            selected_end_time_for_template = "23:59"
+# --- REPORT BUILDER: Generates the images and renders the PDF (runs in report_worker, not in a web request) ---
+def build_report_pdf(params, progress=None):
+    """
+    Builds the PDF report for the given report filters.
 
+    Args:
+        params (dict): Report filters, normally the normalized form from report.jobs.report_job_params.
+        progress (callable): Optional progress(percent, message) callback.
 
-    if current_timezone:
-        if filter_start_datetime:
-            filter_start_datetime = current_timezone.localize(filter_start_datetime)
-        if filter_end_datetime:
-            filter_end_datetime = current_timezone.localize(filter_end_datetime)
+    Returns:
+        tuple: (pdf_bytes, pdf_filename)
 
-    # --- Define the base folder for this specific report's images ---
+    Raises:
+        PdfRenderError: If Chromium fails to render the PDF.
+    """
+    progress = progress or (lambda percent, message: None)
+    filters = _parse_report_filters(params)
+    selected_date_str = filters['selected_date_str']
+    filter_date = filters['filter_date']
+    selected_district = filters['selected_district']
+    selected_image_view = filters['selected_image_view']
+    filter_start_datetime = filters['filter_start_datetime']
+    filter_end_datetime = filters['filter_end_datetime']
+    selected_start_time_for_template = filters['selected_start_time']
+    selected_end_time_for_template = filters['selected_end_time']
+
+    # --- Name of this report (used for the PDF filename) ---
     filename_date = selected_date_str if selected_date_str else datetime.now().strftime('%Y-%m-%d')
     filename_district = selected_district.replace(' ', '_') if selected_district else 'All_Districts'
     filename_start_time = selected_start_time_for_template.replace(':', '-') if selected_start_time_for_template else '00-00'
     filename_end_time = selected_end_time_for_template.replace(':', '-') if selected_end_time_for_template else '23-59'
 
     report_folder_name = f"{filename_date}_{filename_district}_{filename_start_time}-{filename_end_time}"
-    
-    # Path where images for this report will be saved temporarily for PDF generation
-    report_specific_media_dir = os.path.join(settings.MEDIA_ROOT, 'report_images', report_folder_name)
-
-    # Clean up previous report images for this specific folder if it exists
-    if os.path.exists(report_specific_media_dir):
-        print(f"Cleaning up existing report image directory: {report_specific_media_dir}")
-        try:
-            shutil.rmtree(report_specific_media_dir)
-        except OSError as e:
-            print(f"Error removing directory {report_specific_media_dir}: {e}")
-    
-    os.makedirs(report_specific_media_dir, exist_ok=True) 
-    print(f"PDF Generation Process: Saving images to: {report_specific_media_dir}")
+    if filters['region'] != DEFAULT_REGION_KEY:
+        report_folder_name = f"{filters['region']}_{report_folder_name}"
 
-    # --- List to store URLs of saved images for PDF template ---
+    # --- Images for the PDF template, kept in memory and served to Chromium by pdf_renderer ---
     generated_images_for_pdf_template = [] 
+    pdf_assets = {}
 
-    gdf = None
-    gdf_tn = None
+    # Only render the views the PDF will show (all of them if no view was selected)
+    image_types_for_pdf = _image_types_for_view(selected_image_view)
 
-    # Load shapefile (same logic as in report_view)
-    try:
-        if not os.path.exists(SHAPEFILE_PATH):
-            raise FileNotFoundError(f"Shapefile not found at {SHAPEFILE_PATH}.")
-        gdf = gpd.read_file(SHAPEFILE_PATH)
-        gdf_tn = gdf[
-            (gdf['NAME_1'].str.strip().str.lower() == 'tamilnadu') |
-            (gdf['NAME_1'].str.strip().str.lower() == 'tamil nadu')
-        ].to_crs("EPSG:4326")
-        print(f"PDF Generation Process: Shapefile loaded successfully.")
-    except FileNotFoundError as fnfe:
-        print(f"PDF Generation Process: CRITICAL ERROR: Shapefile not found: {fnfe}")
-    except Exception as e:
-        print(f"PDF Generation Process: ERROR loading shapefile: {e}")
-
-    # --- Block for iterating through available image timestamps and saving them ---
-    if os.path.exists(settings.MEDIA_ROOT) and os.path.isdir(settings.MEDIA_ROOT) and gdf_tn is not None:
-        available_image_timestamps_and_folders = []
-        # Adjusted logic to search for _all_ folders in MEDIA_ROOT
-        for d in os.listdir(settings.MEDIA_ROOT):
-            full_path_to_folder = os.path.join(settings.MEDIA_ROOT, d)
-            if os.path.isdir(full_path_to_folder) and d.startswith(filter_date.strftime('%Y-%m-%d')): # Only consider folders for the selected date
-                try:
-                    # Parse timestamp from folder name, e.g., '2025-06-27_10-00-00'
-                    folder_timestamp_str_raw = d.split('_')[0] + '_' + d.split('_')[1] + '_' + d.split('_')[2] # Extract YYYY-MM-DD_HH-MM-SS
-                    folder_datetime_obj = datetime.strptime(folder_timestamp_str_raw, '%Y-%m-%d_%H-%M-%S')
-                    
-                    if current_timezone:
-                        folder_datetime_obj = current_timezone.localize(folder_datetime_obj)
-
-                    if folder_datetime_obj.date() == filter_date and \
-                       filter_start_datetime <= folder_datetime_obj < filter_end_datetime:
-                        available_image_timestamps_and_folders.append((folder_datetime_obj, full_path_to_folder))
-                except (ValueError, IndexError):
-                    # print(f"Skipping non-standard folder name or format: {d}") # Debugging
-                    pass # Ignore folders not matching the expected timestamp format
-        
-        available_image_timestamps_and_folders.sort(key=lambda x: x[0])
+    # --- Generate every frame's images concurrently on the frame pool ---
+    available_frames = _find_frames(filter_start_datetime, filter_end_datetime, filters['region'])
 
-        print(f"PDF Generation Process: Found {len(available_image_timestamps_and_folders)} image folders for saving within the selected time range.")
+    print(f"PDF Generation Process: Found {len(available_frames)} image folders for saving within the selected time range.")
 
-        for timestamp_dt, folder_path in available_image_timestamps_and_folders:
-            base_image_path_for_this_timestamp = os.path.join(folder_path, 'cropped', 'tamil_nadu_cropped.png')
-            
-            pil_images = _generate_image_data_for_timestamp(
-                base_image_path_for_this_timestamp, timestamp_dt, selected_district, gdf_tn
-            )
-
-            if pil_images: 
-                current_image_set_for_pdf = {
-                    'timestamp': timestamp_dt,
-                    'cropped_tn': None,
-                    'masked_district': None,
-                    'aligned_overlay_tn': None,
-                }
-                # Save PIL images to files and get their ABSOLUTE URLs for the PDF template
-                for img_type, pil_img in pil_images.items():
-                    if pil_img:
-                        url = save_image_and_get_url(
-                            request, pil_img, report_specific_media_dir, timestamp_dt, img_type
-                        )
-                        current_image_set_for_pdf[img_type] = url
-                    elif img_type == 'masked_district' and selected_district == 'All Districts':
-                        # If masked_district is None but 'All Districts' is selected, reuse cropped_tn
-                        current_image_set_for_pdf['masked_district'] = current_image_set_for_pdf['cropped_tn']
-                    else:
-                        current_image_set_for_pdf[img_type] = None 
-                
-                generated_images_for_pdf_template.append(current_image_set_for_pdf)
-
-            else:
-                print(f"PDF Generation Process: Skipping images for {timestamp_dt} due to generation failure.")
-    else:
-        print(f"PDF Generation Process skipped: Base media directory or shapefile not loaded successfully.")
-
-    # --- Filtering CloudAnalysis data (same logic as in report_view) ---
-    cloud_analysis_query = CloudAnalysis.objects.filter(
-        timestamp__date=filter_date
+    # Image generation is the bulk of the work; rendering gets the last 10%.
+    frame_results = render_frames(
+        available_frames, selected_district, image_types_for_pdf,
+        progress=lambda done, total: progress(int(90 * done / total), f"Generated images for {done} of {total} frames"),
     )
 
-    if selected_district != 'All Districts':
-        cloud_analysis_query = cloud_analysis_query.filter(city__iexact=selected_district)
+    for frame, png_images in zip(available_frames, frame_results):
+        timestamp_dt = frame.timestamp
+        if png_images: 
+            current_image_set_for_pdf = {
+                'timestamp': timestamp_dt,
+                'cropped_tn': None,
+                'masked_district': None,
+                'aligned_overlay_tn': None,
+            }
+            # Keep PNGs as in-memory assets and reference them by asset URL
+            for img_type, png_bytes in png_images.items():
+                if png_bytes:
+                    asset_name = f"{timestamp_dt.strftime(FRAME_FOLDER_FORMAT)}/{img_type}.png"
+                    pdf_assets[asset_name] = ('image/png', png_bytes)
+                    current_image_set_for_pdf[img_type] = asset_url(asset_name)
+                elif img_type == 'masked_district' and selected_district == 'All Districts':
+                    # If masked_district is None but 'All Districts' is selected, reuse cropped_tn
+                    current_image_set_for_pdf['masked_district'] = current_image_set_for_pdf['cropped_tn']
+                else:
+                    current_image_set_for_pdf[img_type] = None 
+            
+            generated_images_for_pdf_template.append(current_image_set_for_pdf)
 
-    if filter_start_datetime and filter_end_datetime:
-        cloud_analysis_query = cloud_analysis_query.filter(
-            timestamp__gte=filter_start_datetime,
-            timestamp__lt=filter_end_datetime
-        )
-    
-    EXCLUDE_NO_PRECIP_MESSAGE = "No significant cloud levels found for precipitation"
-    cloud_analysis_query = cloud_analysis_query.exclude(values__iexact=EXCLUDE_NO_PRECIP_MESSAGE)
+        else:
+            print(f"PDF Generation Process: Skipping images for {timestamp_dt} due to generation failure.")
 
-    filtered_cloud_analysis_data = list(cloud_analysis_query.order_by('city', 'timestamp'))
+    # --- Filtering CloudAnalysis data (same logic as in report_view) ---
+    filtered_cloud_analysis_data = _filtered_cloud_analysis(filters)
     
     print(f"Data Fetch: Fetched {len(filtered_cloud_analysis_data)} weather data points for PDF.")
 
-    full_available_districts = []
-    try:
-        if not os.path.exists(SHAPEFILE_PATH):
-            print(f"ERROR: Shapefile for district list not found at {SHAPEFILE_PATH}. Falling back to default list.")
-            full_available_districts = ['Coimbatore', 'Chennai', 'Madurai', 'Trichy', 'Salem', 'Ariyalur']
-        else:
-            temp_gdf = gpd.read_file(SHAPEFILE_PATH)
-            gdf_tn_districts_for_list = temp_gdf[
-                (temp_gdf['NAME_1'].str.strip().str.lower() == 'tamilnadu') |
-                (temp_gdf['NAME_1'].str.strip().str.lower() == 'tamil nadu')
-            ]
-            
-            if 'NAME_2' in gdf_tn_districts_for_list.columns:
-                unique_districts = gdf_tn_districts_for_list['NAME_2'].dropna().unique().tolist()
-                full_available_districts = sorted(unique_districts)
-            else:
-                full_available_districts = ['Coimbatore', 'Chennai', 'Madurai', 'Trichy', 'Salem', 'Ariyalur']
-
-    except Exception as e:
-        print(f"Error loading districts from shapefile for dropdown: {e}. Falling back to default list.")
-        full_available_districts = ['Coimbatore', 'Chennai', 'Madurai', 'Trichy', 'Salem', 'Ariyalur']
+    full_available_districts = _get_available_districts(filters['region'])
 
 
     context_for_pdf = {
-        'generated_images_for_display': generated_images_for_pdf_template, # Pass URLs for PDF
+        'generated_images_for_display': generated_images_for_pdf_template, # Asset URLs for PDF
         'selected_date': filter_date.strftime('%Y-%m-%d'),
         'selected_district': selected_district,
         'available_districts': full_available_districts, # Needed for the template, even if not directly displayed in PDF
         'cloud_analysis_data': filtered_cloud_analysis_data,
+        'district_summary': _district_daily_summary(filters),
         'selected_image_view': selected_image_view,
         'selected_start_time': selected_start_time_for_template,
         'selected_end_time': selected_end_time_for_template,
     }
 
-    # --- Playwright PDF Generation ---
+    # --- PDF Generation on the warm Chromium pool (report/pdf_renderer.py) ---
+    progress(90, "Rendering PDF")
+    html_content = render_to_string('report/report_pdf.html', context_for_pdf)
+    pdf_buffer = render_pdf(html_content, assets=pdf_assets)
+
+    pdf_filename = f"Weather_Report_{report_folder_name}.pdf"
+    print(f"PDF generated successfully: {pdf_filename}")
+    return pdf_buffer, pdf_filename
+
+
+# --- REPORT JOB VIEWS: Submit a PDF job, poll its status, download the result ---
+def _report_job_payload(job):
+    payload = {
+        'job_id': job.pk,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'status_url': reverse('report:report_job_status', args=[job.pk]),
+        'download_url': None,
+    }
+    if job.status == ReportJob.STATUS_DONE and job.kind == ReportJob.KIND_ANIMATION:
+        payload['download_url'] = f"{reverse('report:report_animation')}?{urlencode(job.params)}" # Now served from the cache
+    elif job.status == ReportJob.STATUS_DONE:
+        payload['download_url'] = reverse('report:report_job_download', args=[job.pk])
+    elif job.status == ReportJob.STATUS_FAILED:
+        payload['error'] = job.error
+    return payload
+
+
+@require_POST
+def submit_report_job_view(request):
+    """Queues a PDF job for the posted report filters (or reuses a cached/in-flight one)."""
+    job, created = submit_report_job(report_job_params(request.POST))
+    if created:
+        print(f"Report job {job.pk} queued: {job.params}")
+    return JsonResponse(_report_job_payload(job), status=202 if job.status != ReportJob.STATUS_DONE else 200)
+
+
+def report_job_status(request, job_id):
+    job = get_object_or_404(ReportJob, pk=job_id)
+    response = JsonResponse(_report_job_payload(job))
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def report_job_download(request, job_id):
+    job = get_object_or_404(ReportJob, pk=job_id, kind=ReportJob.KIND_PDF, status=ReportJob.STATUS_DONE)
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch() # You might need headless=True in production
-            page = browser.new_page()
-            html_content = render_to_string('report/report_pdf.html', context_for_pdf, request=request)
-            page.set_content(html_content)
-            page.wait_for_load_state("networkidle", timeout=30000) # Increased timeout to 30 seconds
-
-            pdf_buffer = page.pdf(
-                format="A4",
-                print_background=True, # Ensures background colors/images from CSS are printed
-                margin={
-                    "top": "20px",
-                    "bottom": "20px",
-                    "left": "20px",
-                    "right": "20px"
-                }
-            )
-            browser.close()
-
-            response = HttpResponse(pdf_buffer, content_type='application/pdf')
-            pdf_filename = f"Weather_Report_{report_folder_name}.pdf"
-            response['Content-Disposition'] = f'attachment; filename="{pdf_filename}"'
-            
-            print(f"PDF generated successfully: {pdf_filename}")
-            return response
-            
-    except Exception as e:
-        print(f"Error generating PDF: {e}")
-        # Return a JSON response with an error message to the user's browser
-        return JsonResponse({'status': 'error', 'message': f'Failed to generate PDF: {e}'}, status=500)
-    finally:
-        # Clean up the temporarily saved images after PDF generation
-        if os.path.exists(report_specific_media_dir):
-            try:
-                shutil.rmtree(report_specific_media_dir)
-                print(f"Cleaned up temporary report images directory: {report_specific_media_dir}")
-            except OSError as e:
-                print(f"Error removing temporary directory {report_specific_media_dir} during cleanup: {e}")
\ No newline at end of file
+        pdf_file = job.pdf_file.open('rb')
+    except (FileNotFoundError, ValueError):
+        raise Http404("The PDF for this report is no longer available.")
+    return FileResponse(pdf_file, as_attachment=True, filename=job.filename, content_type='application/pdf')
+
+
+# --- LEGACY DOWNLOAD URL: Serves a cached PDF, otherwise queues the job instead of rendering inline ---
+def download_report_pdf(request):
+    job, _ = submit_report_job(report_job_params(request.GET))
+    if job.status == ReportJob.STATUS_DONE:
+        return report_job_download(request, job.pk)
+    return JsonResponse(_report_job_payload(job), status=202)
+
+
+# --- Animated timeline of the selected range (GIF / WebP / MP4), cached per parameter set ---
+def report_animation(request):
+    """
+    Plays the frames of the selected date, time range and district as an animation.
+    Query params are the report filters plus format (gif, webp, mp4), fps and source
+    (image: cropped screenshots, classes: class rasters in legend colours).
+
+    Only a cached animation is streamed; otherwise its build is queued for the report
+    worker and the response is 202 with the job's status URL, like download_report_pdf.
+    """
+    try:
+        params = animation_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    if params['format'] == 'mp4' and not mp4_available():
+        return JsonResponse({'status': 'error', 'message': "MP4 export requires ffmpeg, which is not installed."}, status=501)
+
+    frames = animation_frames(params)
+    try:
+        check_animation(params, frames)
+    except AnimationError as e:
+        print(f"Animation not available for {params}: {e}")
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=404)
+
+    path = animation_path(params, frames)
+    if not os.path.exists(path):
+        job, created = submit_report_job(params, kind=ReportJob.KIND_ANIMATION)
+        if created:
+            print(f"Animation job {job.pk} queued: {job.params}")
+        if job.status != ReportJob.STATUS_DONE or not os.path.exists(path):
+            return JsonResponse(_report_job_payload(job), status=202)
+
+    content_type = ANIMATION_FORMATS[params['format']][0]
+    response = FileResponse(open(path, 'rb'), content_type=content_type, filename=animation_filename(params))
+    patch_cache_control(response, max_age=60)
+    return response
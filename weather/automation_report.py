@@ -0,0 +1,105 @@
+# weather/automation_report.py
+
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from .catalogue import FRAME_FOLDER_FORMAT
+from .models import CloudAnalysis
+
+# One automation report per capture slot, stored next to the slot's images.
+AUTOMATION_REPORT_FORMAT = 'automation_report_%Y%m%d_%H%M%S.pdf'
+
+# The capture daemon writes the cycle's results next to the images; older folders use the short name.
+RESULTS_JSON_FORMATS = ('cloud_analysis_results_{folder}.json', 'cloud_analysis_results.json')
+
+
+def automation_report_path(frame):
+    """Where the automation report for `frame`'s slot lives (it may not exist yet)."""
+    return os.path.join(frame.media_path(frame.folder), frame.timestamp.strftime(AUTOMATION_REPORT_FORMAT))
+
+
+def _link_callback(uri, rel):
+    """
+    Convert HTML URIs to absolute system paths so xhtml2pdf can access them.
+    This is crucial for local images specified with 'file:///' protocol.
+    """
+    if uri.startswith('file:///'):
+        return uri[len('file:///'):]
+
+    if uri.startswith(settings.MEDIA_URL):
+        path = os.path.join(settings.MEDIA_ROOT, uri.replace(settings.MEDIA_URL, ""))
+    elif uri.startswith(settings.STATIC_URL):
+        path = os.path.join(settings.STATIC_ROOT, uri.replace(settings.STATIC_URL, ""))
+    else:
+        return uri
+
+    if os.path.exists(path):
+        return path
+    print(f"Warning: Linked file not found: {path} for URI: {uri}")
+    return uri
+
+
+def _file_uri(path):
+    return f'file:///{path.replace(os.path.sep, "/")}' if path else ''
+
+
+def _load_cycle_results(frame):
+    """The cycle's results as the daemon saved them, or rebuilt from CloudAnalysis if the JSON is gone."""
+    folder_path = frame.media_path(frame.folder)
+    for name_format in RESULTS_JSON_FORMATS:
+        json_path = os.path.join(folder_path, name_format.format(folder=frame.timestamp.strftime(FRAME_FOLDER_FORMAT)))
+        if os.path.exists(json_path):
+            with open(json_path) as json_file:
+                return json.load(json_file)
+
+    return [
+        {'city': city, 'values': values, 'type': analysis_type, 'timestamp': timestamp.isoformat()}
+        for city, values, analysis_type, timestamp in CloudAnalysis.objects.filter(
+            region=frame.region, timestamp=frame.timestamp
+        ).order_by('city').values_list('city', 'values', 'type', 'timestamp')
+    ]
+
+
+def generate_automation_report(frame):
+    """
+    Renders the xhtml2pdf automation report for one capture slot and returns its path.
+
+    The PDF is written to a temporary file in the slot folder and moved into place, so
+    a concurrent reader never sees a half-written report.
+    """
+    from xhtml2pdf import pisa
+
+    results = _load_cycle_results(frame)
+    context = {
+        'current_time': frame.timestamp,
+        'current_run_results': results,
+        'full_screenshot_path_abs': _file_uri(frame.media_path(frame.full_path)), # file:/// format for PDF
+        'cropped_screenshot_path_abs': _file_uri(frame.media_path(frame.cropped_path)),
+        'json_output_content': json.dumps(results, indent=4),
+    }
+    html_string = render_to_string('weather/automation_report_pdf.html', context)
+
+    pdf_output_path = automation_report_path(frame)
+    fd, temp_path = tempfile.mkstemp(suffix='.pdf.tmp', dir=os.path.dirname(pdf_output_path))
+    try:
+        with os.fdopen(fd, "wb") as pdf_file:
+            pisa_status = pisa.CreatePDF(html_string, dest=pdf_file, link_callback=_link_callback)
+        if pisa_status.err:
+            raise Exception(f"PDF generation error with xhtml2pdf: {pisa_status.err}")
+        os.replace(temp_path, pdf_output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return pdf_output_path
+
+
+def get_automation_report(frame):
+    """Path of the slot's automation report, generating it on first use."""
+    pdf_output_path = automation_report_path(frame)
+    if os.path.exists(pdf_output_path):
+        return pdf_output_path
+    return generate_automation_report(frame)
@@ -0,0 +1,42 @@
+# weather/cache.py
+
+import hashlib
+
+from django.db.models import Max
+
+from .models import CloudAnalysis
+
+
+def data_version(region=None, start=None, end=None):
+    """
+    Version of the CloudAnalysis data: the highest row id. The capture daemon only ever
+    appends rows (re-analysis replaces them with new ones), so this changes exactly when
+    a new cycle is ingested and is a cheap index lookup. Used to key caches and ETags.
+
+    Args:
+        region (str, optional): Only this region's rows (a weather.regions key).
+        start, end (datetime, optional): Only rows timestamped in [start, end), so caches
+            of a past window are not invalidated by every new cycle.
+    """
+    analyses = CloudAnalysis.objects.all()
+    if region is not None:
+        analyses = analyses.filter(region=region)
+    if start is not None:
+        analyses = analyses.filter(timestamp__gte=start)
+    if end is not None:
+        analyses = analyses.filter(timestamp__lt=end)
+    return analyses.aggregate(version=Max('id'))['version'] or 0
+
+
+def params_digest(params):
+    """Stable digest of a QueryDict / dict of request parameters (order-insensitive)."""
+    if hasattr(params, 'lists'):
+        items = sorted((key, tuple(values)) for key, values in params.lists())
+    else:
+        items = sorted(params.items())
+    return hashlib.sha1(repr(items).encode('utf-8')).hexdigest()
+
+
+def versioned_cache_key(prefix, version, params):
+    """Cache key that changes whenever the data version or the parameters change."""
+    return f"{prefix}:{version}:{params_digest(params)}"
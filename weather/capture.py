@@ -0,0 +1,319 @@
+# weather/capture.py
+
+import os
+import time
+from functools import partial
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from PIL import Image
+
+from . import cube
+from .catalogue import register_frame
+from .layers import capture_layers
+from .models import CloudAnalysis
+from .precipitation import classify_image, save_class_raster
+from .work_queue import enqueue_analysis
+from .zones import capture_zone_sets, evaluate_frame
+
+BLUE_DOT_XPATH = '//*[@id="leaflet-map"]/div[1]/div[4]/div[2]'
+
+# Switches the overlay of the loaded map through windy's client-side store (no page reload).
+SWITCH_OVERLAY_SCRIPT = "W.store.set('overlay', arguments[0]);"
+
+
+class RegionCapture:
+    """
+    One capture cycle for one region: screenshots, crop, classify, per-district analysis.
+
+    Each instance drives its own browser session, so the daemon can run one per region in
+    parallel threads; log lines are prefixed with the region key to keep them apart.
+    Every layer is captured from that one session by switching the overlay in-page.
+
+    Args:
+        region (weather.regions.Region): What to capture and how to georeference it.
+        command (BaseCommand): The daemon, used for its stdout / stderr / style.
+        layers (list): weather.layers.Layer objects to capture, radar first (default: capture_layers()).
+        backend: Takes the screenshots instead of the browser, through its take_screenshots(capture,
+            base_folder) (e.g. weather.replay.ReplayBackend; default: windy.com via Selenium).
+    """
+
+    def __init__(self, region, command, layers=None, backend=None):
+        self.region = region
+        self.command = command
+        self.layers = layers or capture_layers()
+        self.backend = backend
+        self.frame = None
+        self.analyses = []
+        self.results = []
+
+    # --- Logging ---
+    def log(self, message, style=None):
+        message = f"[{self.region.key}] {message}"
+        self.command.stdout.write(style(message) if style else message)
+
+    def error(self, message):
+        self.command.stderr.write(self.command.style.ERROR(f"[{self.region.key}] {message}"))
+
+    # --- Browser ---
+    def _new_driver(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        chrome_options = webdriver.ChromeOptions()
+        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+        chrome_options.add_experimental_option('useAutomationExtension', False)
+        chrome_options.add_argument("--window-size=1920,1080")
+        # chrome_options.add_argument("--headless")
+        # chrome_options.add_argument("--disable-gpu")
+        # chrome_options.add_argument("--no-sandbox")
+
+        return webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+
+    def _switch_layer(self, driver, layer):
+        """Shows `layer` in the loaded map, reloading the page only if the in-page switch fails."""
+        try:
+            driver.execute_script(SWITCH_OVERLAY_SCRIPT, layer.overlay)
+        except Exception as e:
+            self.log(f"In-page switch to '{layer.overlay}' failed ({e}); reloading the page with that layer.")
+            driver.get(self.region.windy_url(layer.overlay))
+            time.sleep(10)
+        time.sleep(layer.settle_seconds)
+
+    def take_screenshots(self, base_folder):
+        """
+        Opens the region's map view in a fresh browser session and saves a full screenshot
+        of every layer. Returns the layers that were captured; the page load, cookie banner
+        and dot hiding are paid once, each further layer only costs its settle time.
+        """
+        from selenium.webdriver.common.action_chains import ActionChains
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.common.keys import Keys
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        driver = None
+        captured = []
+        try:
+            driver = self._new_driver()
+            driver.get(self.region.windy_url(self.layers[0].overlay))
+            self.log(f"Navigated to Windy.com with {self.layers[0].overlay} layer active and offset coordinates.")
+
+            wait = WebDriverWait(driver, 20)
+
+            try:
+                self.log('Attempting to dismiss cookie consent...')
+                cookie_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, 'button.cc-dismiss, a[aria-label="dismiss cookie message"]')))
+                cookie_button.click()
+                self.log('Cookie consent dismissed.')
+                time.sleep(1)
+            except Exception as e:
+                self.log(f"Could not find or dismiss cookie consent (might not be present): {e}. Continuing...")
+
+            self.log("Waiting for map to fully load (10 seconds)...")
+            time.sleep(10)
+
+            try:
+                dot_element = wait.until(EC.presence_of_element_located((By.XPATH, BLUE_DOT_XPATH)))
+                driver.execute_script("arguments[0].style.display = 'none';", dot_element)
+                self.log("Dot element's display set to 'none' via JavaScript.")
+                time.sleep(1)
+            except Exception as e:
+                self.log(f"FAILED to hide dot via JavaScript at XPath '{BLUE_DOT_XPATH}': {e}. Trying the ESC key...")
+                try:
+                    ActionChains(driver).send_keys(Keys.ESCAPE).perform()
+                    time.sleep(1)
+                except Exception as esc_e:
+                    self.log(f"Fallback (ESC key) failed: {esc_e}. The dot might still be visible.")
+
+            time.sleep(2)
+
+            for layer_number, layer in enumerate(self.layers):
+                full_screenshot_path = os.path.join(base_folder, layer.full_image_relpath)
+                os.makedirs(os.path.dirname(full_screenshot_path), exist_ok=True)
+                try:
+                    if layer_number:
+                        self._switch_layer(driver, layer)
+                    self.log(f"Taking full {layer.key} screenshot and saving to: {full_screenshot_path}")
+                    driver.save_screenshot(full_screenshot_path)
+                    captured.append(layer)
+                except Exception as e:
+                    self.error(f"Error capturing the {layer.key} layer: {e}")
+            return captured
+        finally:
+            if driver:
+                driver.quit()
+                self.log("Browser closed.")
+
+    # --- Analysis ---
+    def _save_masked_images(self, img_np, district_masks, base_folder):
+        """Writes each district's pixels of the radar crop (transparent elsewhere) under masked_cropped/."""
+        timestamp_str = os.path.basename(base_folder)
+        height, width, _ = img_np.shape
+        masked_np = np.empty((height, width, 4), dtype=np.uint8) # One buffer reused for every district
+        for district_name, mask in district_masks.items():
+            masked_np.fill(0)
+            masked_np[mask, :3] = img_np[mask]
+            masked_np[mask, 3] = 255
+            district_masked_folder = os.path.join(base_folder, "masked_cropped", district_name.replace(" ", "_"))
+            os.makedirs(district_masked_folder, exist_ok=True)
+            masked_cropped_path = os.path.join(district_masked_folder, f"{timestamp_str}_{district_name.lower().replace(' ', '_')}_masked.png")
+            Image.fromarray(masked_np, "RGBA").save(masked_cropped_path)
+
+    def _store_radar_frame(self, img_np, classes, district_masks, base_folder, current_time):
+        """
+        Registers the radar frame, writes the per-district masked images, appends the class
+        raster to the precipitation cube and evaluates the zone sets. Each step logs its
+        own failure, so one does not stop the others.
+        """
+        region = self.region
+        timestamp_str = os.path.basename(base_folder)
+        # --- Frame catalogue entry (so report views never scan the archive) ---
+        try:
+            self.frame = register_frame(base_folder, current_time, region=region.key)
+            self.log(f"Frame {timestamp_str} registered in the frame catalogue.")
+        except Exception as e:
+            self.error(f"Error registering frame {timestamp_str} in the catalogue: {e}")
+        try:
+            self._save_masked_images(img_np, district_masks, base_folder)
+        except Exception as e:
+            self.error(f"Error saving the masked district images of {timestamp_str}: {e}")
+        try:
+            cube.append_slice(region.key, current_time, classes, self.frame.content_hash if self.frame else '')
+        except Exception as e:
+            self.error(f"Error appending to the precipitation cube (run 'manage.py build_precip_cube' to repair): {e}")
+        for zone_set in capture_zone_sets():
+            try:
+                zone_count, wet_count = evaluate_frame(zone_set, region, current_time, classes)
+                self.log(f"{zone_set.name}: {wet_count} of {zone_count} zones with precipitation.")
+            except Exception as e:
+                self.error(f"Error evaluating zone set {zone_set.key} (run 'manage.py build_zone_stats' to repair): {e}")
+
+    def analyze(self, layers, base_folder, current_time):
+        """
+        Crops and classifies each layer's screenshot and saves one CloudAnalysis row per
+        district and layer, tagged with the layer's name as `type`. Each screenshot is
+        classified once; each district is then a boolean lookup into the class raster.
+        The district masks are rasterized once and shared by all layers. The radar layer
+        also registers the frame, writes the per-district masked images, appends its
+        class raster to the precipitation cube (weather.cube) and evaluates the zone sets
+        of settings.CAPTURE_ZONE_SETS (weather.zones), once the caller's transaction (if
+        any) commits.
+        """
+        region = self.region
+        timestamp_str = os.path.basename(base_folder)
+        district_masks = None
+
+        for layer in layers:
+            with Image.open(os.path.join(base_folder, layer.full_image_relpath)) as screenshot:
+                image = screenshot.convert("RGB")
+            crop_box = region.crop_box
+            if not (0 <= crop_box[0] < crop_box[2] <= image.width and 0 <= crop_box[1] < crop_box[3] <= image.height):
+                raise ValueError(f"Crop box {crop_box} is out of bounds for a {image.width}x{image.height} screenshot.")
+
+            cropped_image = image.crop(crop_box)
+            cropped_screenshot_path = os.path.join(base_folder, layer.cropped_image_relpath)
+            os.makedirs(os.path.dirname(cropped_screenshot_path), exist_ok=True)
+            cropped_image.save(cropped_screenshot_path)
+            self.log(f"Cropped {region.name} {layer.key} image saved at: {cropped_screenshot_path}")
+
+            img_np = np.array(cropped_image)
+            height, width, _ = img_np.shape
+
+            # A region may calibrate its own radar legend; the other layers use the layer's legend
+            legend = region.legend if layer.is_radar else layer.legend
+            classes = classify_image(img_np, legend, layer.max_tolerance)
+            class_raster_path = os.path.join(base_folder, layer.class_raster_relpath)
+            os.makedirs(os.path.dirname(class_raster_path), exist_ok=True)
+            save_class_raster(classes, class_raster_path)
+
+            if district_masks is None:
+                # Cached per region and size, so the daemon rasterizes the districts once, not every cycle
+                district_masks = cube.district_masks(region.key, height, width)
+                if not district_masks:
+                    raise ValueError(f"No district boundaries for {region.name}.")
+
+            if layer.is_radar:
+                # Files outside the database would survive a rollback of the caller's transaction
+                # (an analysis job that fails or loses its lease), so they are written once it commits.
+                transaction.on_commit(partial(self._store_radar_frame, img_np, classes, district_masks, base_folder, current_time))
+
+            legend_labels = np.array(('',) + tuple(legend.values()), dtype=object)
+            for district_name, mask in district_masks.items():
+                present_classes = np.unique(classes[mask])
+                matched_labels = sorted(legend_labels[present_classes[present_classes > 0]])
+                color_text = ", ".join(matched_labels) if matched_labels else layer.no_match_message
+                self.log(f"{layer.name} for {district_name}: {color_text}")
+
+                try:
+                    with transaction.atomic(): # Savepoint: a failed row must not break the caller's transaction
+                        self.analyses.append(CloudAnalysis.objects.create(
+                            city=district_name,
+                            values=color_text,
+                            type=layer.name,
+                            timestamp=current_time,
+                            region=region.key,
+                        ))
+                except Exception as e:
+                    self.error(f"Error saving {district_name} ({layer.key}) to Django model: {e}")
+
+                self.results.append({
+                    "city": district_name,
+                    "values": color_text,
+                    "type": layer.name,
+                    # Format for JSON/API as desired, using the rounded time
+                    "timestamp": current_time.strftime('%Y-%m-%d %H:%M:%S'),
+                })
+
+    def published_results(self):
+        """The results of the layers whose data the daemon POSTs (see Layer.publish)."""
+        published_types = {layer.name for layer in self.layers if layer.publish}
+        return [result for result in self.results if result['type'] in published_types]
+
+    def run(self, current_time, timestamp_str, enqueue=False):
+        """
+        Captures and analyses the region for one slot. Returns True on success; never raises.
+        With `enqueue`, the screenshots are queued for analysis workers (weather.work_queue)
+        instead of being analysed here.
+        """
+        close_old_connections()
+        try:
+            base_folder = self.region.capture_folder(timestamp_str)
+            os.makedirs(base_folder, exist_ok=True)
+
+            try:
+                if self.backend is not None:
+                    layers = self.backend.take_screenshots(self, base_folder)
+                else:
+                    layers = self.take_screenshots(base_folder)
+            except Exception as e:
+                self.error(f"An unexpected error occurred during browser automation: {e}")
+                return False
+            if not layers:
+                return False
+
+            if enqueue:
+                try:
+                    folder = os.path.relpath(base_folder, settings.MEDIA_ROOT).replace(os.sep, '/')
+                    jobs = enqueue_analysis(self.region.key, [layer.key for layer in layers], current_time, folder)
+                except Exception as e:
+                    self.error(f"Error queueing the analysis jobs: {e}")
+                    return False
+                self.log(f"{len(jobs)} analysis jobs queued for {', '.join(layer.key for layer in layers)}.",
+                         self.command.style.SUCCESS)
+                return True
+
+            try:
+                self.analyze(layers, base_folder, current_time)
+            except Exception as e:
+                self.error(f"Error during image processing or shapefile handling: {e}")
+                return False
+
+            self.log(f"{len(self.analyses)} district results saved for {', '.join(layer.key for layer in layers)}.",
+                     self.command.style.SUCCESS)
+            return True
+        finally:
+            # Runs on a daemon worker thread, which would otherwise keep its connection open.
+            connection.close()
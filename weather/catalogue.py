@@ -0,0 +1,114 @@
+# weather/catalogue.py
+
+import hashlib
+import os
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from .models import Frame
+from .precipitation import classify_image, save_class_raster
+from .regions import DEFAULT_REGION_KEY, get_region
+
+# The capture daemon captures one frame per slot of this many minutes, so each wet frame
+# stands for this many minutes of precipitation (weather.rollups, weather.cube).
+CYCLE_MINUTES = 15
+
+# Capture folders are named after their rounded capture time.
+FRAME_FOLDER_FORMAT = '%Y-%m-%d_%H-%M-%S'
+
+FULL_IMAGE_RELPATH = os.path.join('full', 'windy_map_full.png')
+CLASS_RASTER_RELPATH = os.path.join('class', 'precip_classes.png')
+
+# Older captures used a different name for the cropped image; the first one found wins.
+CROPPED_IMAGE_RELPATHS = (
+    os.path.join('cropped', 'tamil_nadu_cropped.png'),
+    os.path.join('cropped', 'windy_map_cropped.png'),
+)
+
+
+def parse_frame_folder_name(folder_name):
+    """Returns the capture time encoded in a folder name, or None if it is not a capture folder."""
+    try:
+        return datetime.strptime(folder_name, FRAME_FOLDER_FORMAT)
+    except ValueError:
+        return None
+
+
+def _file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _relative_to_media(path):
+    return os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+
+def register_frame(folder_path, timestamp=None, build_class_raster=False, region=DEFAULT_REGION_KEY):
+    """
+    Creates or updates the Frame row for one capture folder.
+
+    Args:
+        folder_path (str): Absolute path of the capture folder (inside MEDIA_ROOT).
+        timestamp (datetime): Capture time; parsed from the folder name if omitted.
+        build_class_raster (bool): Classify the cropped image and write the class raster
+                                   if the folder does not have one yet.
+        region (str): Key of the region (weather.regions) the folder was captured for.
+
+    Returns:
+        Frame or None: The catalogue entry, or None if the folder is not a capture folder.
+    """
+    if timestamp is None:
+        timestamp = parse_frame_folder_name(os.path.basename(os.path.normpath(folder_path)))
+        if timestamp is None:
+            return None
+
+    full_path = os.path.join(folder_path, FULL_IMAGE_RELPATH)
+    cropped_path = next(
+        (os.path.join(folder_path, rel) for rel in CROPPED_IMAGE_RELPATHS
+         if os.path.exists(os.path.join(folder_path, rel))),
+        None
+    )
+    class_path = os.path.join(folder_path, CLASS_RASTER_RELPATH)
+
+    width = height = None
+    content_hash = ''
+    if cropped_path:
+        content_hash = _file_sha256(cropped_path)
+        with Image.open(cropped_path) as img:
+            width, height = img.size
+            if build_class_raster and not os.path.exists(class_path):
+                os.makedirs(os.path.dirname(class_path), exist_ok=True)
+                legend = get_region(region).legend
+                save_class_raster(classify_image(np.array(img.convert("RGB")), legend), class_path)
+
+    frame, _ = Frame.objects.update_or_create(
+        region=region,
+        timestamp=timestamp,
+        defaults={
+            'folder': _relative_to_media(folder_path),
+            'full_path': _relative_to_media(full_path) if os.path.exists(full_path) else '',
+            'cropped_path': _relative_to_media(cropped_path) if cropped_path else '',
+            'class_path': _relative_to_media(class_path) if os.path.exists(class_path) else '',
+            'content_hash': content_hash,
+            'width': width,
+            'height': height,
+        }
+    )
+    return frame
+
+
+def frames_in_range(start, end, region=DEFAULT_REGION_KEY):
+    """
+    Frames of `region` with start <= timestamp < end, oldest first (a single range scan on
+    the (region, timestamp) index). region=None returns the frames of every region.
+    """
+    frames = Frame.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    if region is not None:
+        frames = frames.filter(region=region)
+    return frames.order_by('timestamp')
@@ -0,0 +1,262 @@
+# weather/cube.py
+#
+# Append-only store of per-pixel precipitation classes, one memory-mapped cube per region and day:
+#
+#   <PRECIP_CUBE_ROOT>/<region>/<YYYY-MM-DD>.u8     uint8 (time, y, x) classes, slices in arrival order
+#   <PRECIP_CUBE_ROOT>/<region>/<YYYY-MM-DD>.times  int64 capture times (seconds since 1970, local time)
+#   <PRECIP_CUBE_ROOT>/<region>/<YYYY-MM-DD>.hashes 64-byte content hash of each slice's capture (Frame.content_hash;
+#                                                   zeros if unknown)
+#   <PRECIP_CUBE_ROOT>/<region>/<YYYY-MM-DD>.json   {"height": ..., "width": ...}
+#
+# A slice is written before its time, so readers (which size the memmap from the time
+# index) never see a partly written slice. Writers (the capture daemon, analysis workers
+# on any host sharing the root, build_precip_cube) serialize on an flock of the day's
+# .times file. Queries are numpy reductions over memmap slices; no image is decoded.
+
+import fcntl
+import json
+import os
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+from .catalogue import CYCLE_MINUTES
+from .regions import DEFAULT_REGION_KEY, get_region
+
+_EPOCH = datetime(1970, 1, 1)
+_HASH_BYTES = 64 # A sha256 in hex
+
+
+def cube_root():
+    return getattr(settings, 'PRECIP_CUBE_ROOT', os.path.join(settings.BASE_DIR, 'precip_cube'))
+
+
+def _day_paths(region_key, day):
+    base = os.path.join(cube_root(), region_key, day.strftime('%Y-%m-%d'))
+    return base + '.u8', base + '.times', base + '.json'
+
+
+def _hashes_path(times_path):
+    return times_path[:-len('.times')] + '.hashes'
+
+
+def _to_seconds(timestamp):
+    return int((timestamp.replace(tzinfo=None) - _EPOCH).total_seconds())
+
+
+def _from_seconds(seconds):
+    return _EPOCH + timedelta(seconds=int(seconds))
+
+
+def _read_times(times_path):
+    if not os.path.exists(times_path):
+        return np.empty(0, dtype=np.int64)
+    return np.fromfile(times_path, dtype=np.int64)
+
+
+def append_slice(region_key, timestamp, classes, content_hash=''):
+    """
+    Appends one capture's class raster to the region's cube for that day, recording
+    `content_hash` (its Frame.content_hash) so readers can tell which capture it holds.
+
+    Returns:
+        bool: False if the day already holds a slice for `timestamp` (nothing written).
+
+    Raises:
+        ValueError: If the raster's shape differs from the day's earlier slices.
+    """
+    classes = np.ascontiguousarray(classes, dtype=np.uint8)
+    data_path, times_path, meta_path = _day_paths(region_key, timestamp.date())
+    seconds = _to_seconds(timestamp)
+
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    with open(times_path, 'ab') as times_file:
+        # Held until the file is closed; blocks other threads and processes appending to this day
+        fcntl.flock(times_file, fcntl.LOCK_EX)
+        times = _read_times(times_path)
+        if seconds in times:
+            return False
+
+        if os.path.exists(meta_path):
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+            if (meta['height'], meta['width']) != classes.shape:
+                raise ValueError(f"Class raster is {classes.shape}, the {timestamp:%Y-%m-%d} cube holds "
+                                 f"{(meta['height'], meta['width'])} slices.")
+        else:
+            with open(meta_path, 'w') as meta_file:
+                json.dump({'height': classes.shape[0], 'width': classes.shape[1]}, meta_file)
+
+        # Drop bytes of a slice whose time never made it to the index (interrupted append);
+        # days begun before hashes were recorded are padded with zeros (unknown capture)
+        slice_bytes = classes.size
+        with open(data_path, 'ab') as data_file:
+            data_file.truncate(len(times) * slice_bytes)
+            data_file.write(classes.tobytes())
+        with open(_hashes_path(times_path), 'ab') as hashes_file:
+            hashes_file.truncate(len(times) * _HASH_BYTES)
+            hashes_file.write(content_hash.encode('ascii')[:_HASH_BYTES].ljust(_HASH_BYTES, b'\0'))
+        times_file.write(np.int64(seconds).tobytes())
+    return True
+
+
+def _open_day(region_key, day):
+    """(times, memmap of shape (time, y, x)) for one day, or None if the day has no cube."""
+    data_path, times_path, meta_path = _day_paths(region_key, day)
+    times = _read_times(times_path)
+    if not len(times) or not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as meta_file:
+        meta = json.load(meta_file)
+    cube = np.memmap(data_path, dtype=np.uint8, mode='r', shape=(len(times), meta['height'], meta['width']))
+    return times, cube
+
+
+def iter_slices(start, end, region_key=DEFAULT_REGION_KEY):
+    """
+    Yields (timestamps, classes) per day for captures with start <= timestamp < end.
+    `classes` is a (time, y, x) view into the memmap (a copy only if the day's slices
+    are out of order or partly selected), `timestamps` the matching datetimes.
+    """
+    start_seconds, end_seconds = _to_seconds(start), _to_seconds(end)
+    day = start.date()
+    while datetime.combine(day, time.min) < end.replace(tzinfo=None):
+        opened = _open_day(region_key, day)
+        if opened is not None:
+            times, cube = opened
+            selected = np.flatnonzero((times >= start_seconds) & (times < end_seconds))
+            if len(selected):
+                if len(selected) == len(times) and np.all(np.diff(times) > 0):
+                    classes = cube
+                else:
+                    selected = selected[np.argsort(times[selected], kind='stable')]
+                    classes = cube[selected]
+                yield [_from_seconds(t) for t in times[selected]], classes
+        day += timedelta(days=1)
+
+
+def slice_count(start, end, region_key=DEFAULT_REGION_KEY):
+    return sum(len(timestamps) for timestamps, _ in iter_slices(start, end, region_key))
+
+
+def _slice_hash(times_path, index):
+    """Content hash recorded for slice `index`, or '' if unknown."""
+    try:
+        with open(_hashes_path(times_path), 'rb') as hashes_file:
+            hashes_file.seek(index * _HASH_BYTES)
+            return hashes_file.read(_HASH_BYTES).rstrip(b'\0').decode('ascii')
+    except FileNotFoundError:
+        return ''
+
+
+def frame_slice(region_key, timestamp, content_hash=None):
+    """
+    The (y, x) classes of the capture at `timestamp`, copied out of the cube, or None if
+    it has no slice. With `content_hash`, also None unless the slice is known to come from
+    that capture: the cube keeps a slot's first capture, so a recaptured slot's slice is stale.
+    """
+    opened = _open_day(region_key, timestamp.date())
+    if opened is None:
+        return None
+    times, cube = opened
+    matches = np.flatnonzero(times == _to_seconds(timestamp))
+    if not len(matches):
+        return None
+    if content_hash is not None:
+        _, times_path, _ = _day_paths(region_key, timestamp.date())
+        if _slice_hash(times_path, matches[0]) != content_hash:
+            return None
+    return np.array(cube[matches[0]])
+
+
+# --- Pixel queries: each returns a (y, x) array, or None if no slice falls in the range ---
+def max_class(start, end, region_key=DEFAULT_REGION_KEY):
+    """Heaviest class seen at each pixel."""
+    result = None
+    for _, classes in iter_slices(start, end, region_key):
+        day_max = classes.max(axis=0)
+        result = day_max if result is None else np.maximum(result, day_max)
+    return result
+
+
+def mean_class(start, end, region_key=DEFAULT_REGION_KEY):
+    """Mean class at each pixel over the captures in the range (float32)."""
+    total = None
+    count = 0
+    for _, classes in iter_slices(start, end, region_key):
+        day_total = classes.sum(axis=0, dtype=np.uint32)
+        total = day_total if total is None else total + day_total
+        count += len(classes)
+    return None if total is None else (total / count).astype(np.float32)
+
+
+def precip_minutes(start, end, region_key=DEFAULT_REGION_KEY, min_class=1):
+    """Minutes of precipitation of at least `min_class` at each pixel."""
+    wet_slots = None
+    for _, classes in iter_slices(start, end, region_key):
+        day_wet = (classes >= min_class).sum(axis=0, dtype=np.uint32)
+        wet_slots = day_wet if wet_slots is None else wet_slots + day_wet
+    return None if wet_slots is None else wet_slots * CYCLE_MINUTES
+
+
+# --- District aggregates ---
+@lru_cache(maxsize=8)
+def district_masks(region_key, height, width):
+    """{district name: boolean (y, x) mask} for a region's cube of this size."""
+    from rasterio.features import rasterize
+    from shapely.ops import unary_union
+
+    region = get_region(region_key)
+    districts_gdf = region.load_districts()
+    if districts_gdf is None:
+        return {}
+    transform = region.transform(width, height)
+    masks = {}
+    for district_name in region.district_names():
+        district_gdf = districts_gdf[districts_gdf[region.district_field] == district_name]
+        masks[district_name] = rasterize(
+            [unary_union(district_gdf.geometry.to_list())], out_shape=(height, width), transform=transform,
+            fill=0, all_touched=True, dtype=np.uint8
+        ).astype(bool)
+    return masks
+
+
+def district_aggregates(start, end, region_key=DEFAULT_REGION_KEY, min_class=1):
+    """
+    Per-district summary of the captures in [start, end):
+
+        max_class        heaviest class at any pixel of the district
+        precip_minutes   minutes in which any pixel of the district had at least `min_class`
+        wet_area_mean    mean fraction of the district's pixels with at least `min_class`
+        slices           number of captures in the range
+
+    Returns:
+        list: One dict per district (with a 'city' key), sorted by district name.
+    """
+    totals = {}
+    slices = 0
+    for _, classes in iter_slices(start, end, region_key):
+        masks = district_masks(region_key, classes.shape[1], classes.shape[2])
+        wet = classes >= min_class
+        slices += len(classes)
+        for district_name, mask in masks.items():
+            district_classes = classes[:, mask] # (time, pixels in district)
+            district_wet = wet[:, mask]
+            entry = totals.setdefault(district_name, {'max_class': 0, 'wet_slots': 0, 'wet_fraction_sum': 0.0})
+            if district_classes.size:
+                entry['max_class'] = max(entry['max_class'], int(district_classes.max()))
+                entry['wet_slots'] += int(district_wet.any(axis=1).sum())
+                entry['wet_fraction_sum'] += float(district_wet.mean(axis=1).sum())
+
+    return [
+        {
+            'city': district_name,
+            'max_class': entry['max_class'],
+            'precip_minutes': entry['wet_slots'] * CYCLE_MINUTES,
+            'wet_area_mean': round(entry['wet_fraction_sum'] / slices, 4) if slices else 0.0,
+            'slices': slices,
+        }
+        for district_name, entry in sorted(totals.items())
+    ]
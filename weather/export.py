@@ -0,0 +1,143 @@
+# weather/export.py
+
+import csv
+import io
+import json
+
+# Rows fetched per query. Memory use is bounded by this, not by the size of the export.
+EXPORT_CHUNK_SIZE = 5000
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def iter_cloud_analysis_chunks(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields lists of row dicts (restricted to `fields`) in primary-key order.
+
+    Each chunk is a separate keyset query (`id > last_id ORDER BY id LIMIT n`), so
+    only one chunk is ever held in memory and every query is a primary-key range scan.
+    This keeps memory flat on MySQL too, where a plain `.iterator()` is buffered
+    client-side by the driver.
+    """
+    select_fields = tuple(dict.fromkeys(fields + ('id',)))
+    last_id = 0
+    while True:
+        chunk = list(
+            queryset.filter(id__gt=last_id).order_by('id').values(*select_fields)[:chunk_size]
+        )
+        if not chunk:
+            return
+        last_id = chunk[-1]['id']
+        yield [{field: row[field] for field in fields} for row in chunk]
+
+
+def _json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def stream_ndjson(chunks):
+    """One JSON object per line."""
+    for chunk in chunks:
+        yield ''.join(json.dumps(row, default=_json_default) + '\n' for row in chunk).encode('utf-8')
+
+
+def stream_csv(chunks, fields):
+    """CSV with a header row; one encoded block per chunk."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    yield buffer.getvalue().encode('utf-8')
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents can be taken out as bytes after each write."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _parquet_schema(fields):
+    import pyarrow as pa
+
+    types = {
+        'id': pa.int64(),
+        'region': pa.string(),
+        'city': pa.string(),
+        'values': pa.string(),
+        'type': pa.string(),
+        'timestamp': pa.timestamp('s'),
+        'precip_mask': pa.int16(),
+        'max_class': pa.int8(),
+        'has_precipitation': pa.bool_(),
+    }
+    return pa.schema([(field, types[field]) for field in fields])
+
+
+def stream_parquet(chunks, fields):
+    """
+    Parquet with one row group per chunk, streamed as each row group is written.
+    Requires the optional `pyarrow` dependency.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(fields)
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for chunk in chunks:
+            columns = {field: [row[field] for row in chunk] for field in fields}
+            writer.write_table(pa.table(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def stream_export(queryset, fields, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """Returns a bytes generator for `queryset` in one of EXPORT_FORMATS."""
+    chunks = iter_cloud_analysis_chunks(queryset, fields, chunk_size)
+    if export_format == 'ndjson':
+        return stream_ndjson(chunks)
+    if export_format == 'csv':
+        return stream_csv(chunks, fields)
+    if export_format == 'parquet':
+        return stream_parquet(chunks, fields)
+    raise ValueError(f"Unknown export format '{export_format}'.")
@@ -0,0 +1,156 @@
+# weather/filters.py
+
+from datetime import datetime, time, timedelta
+
+from django.db.models import F
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .precipitation import LEGEND_LABELS, labels_to_mask
+
+# CloudAnalysis fields exposed by the API and exports; ?fields=... selects a subset.
+CLOUD_API_FIELDS = ('id', 'region', 'city', 'values', 'type', 'timestamp', 'precip_mask', 'max_class', 'has_precipitation')
+
+
+def parse_range_bound(value, name, is_end=False):
+    """
+    Accepts an ISO datetime or a plain date. A date means the start of that day, or for
+    `end` the start of the next day, so `end` can always be applied as an exclusive bound.
+
+    Raises:
+        ValidationError: If `value` is neither, keyed by the query parameter `name`.
+    """
+    try:
+        parsed_date = parse_date(value)
+        parsed = None if parsed_date else parse_datetime(value)
+    except ValueError:
+        parsed_date = parsed = None
+    if parsed is not None:
+        return parsed
+    if parsed_date is None:
+        raise ValidationError({name: f"Expected an ISO date or datetime, got '{value}'."})
+    if is_end:
+        parsed_date += timedelta(days=1)
+    return datetime.combine(parsed_date, time.min)
+
+
+def _parse_class_param(value):
+    """Bitmask for ?class=..., a comma-separated list of class numbers (1-7) or legend labels."""
+    mask = 0
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if item.isdigit():
+            precip_class = int(item)
+            if not 1 <= precip_class <= len(LEGEND_LABELS):
+                raise ValidationError({'class': f"Class must be between 1 and {len(LEGEND_LABELS)}, got {precip_class}."})
+            mask |= 1 << (precip_class - 1)
+        else:
+            label_mask = labels_to_mask(item)
+            if not label_mask:
+                raise ValidationError({'class': f"Unknown precipitation class '{item}'."})
+            mask |= label_mask
+    return mask
+
+
+def filter_cloud_analysis(queryset, params):
+    """
+    Applies the /api/cloud/ filters to a CloudAnalysis queryset:
+    region, type (layer name) and city (comma-separated), start / end (ISO date or datetime, end exclusive),
+    class (any of the given classes present), min_class and has_precipitation.
+    """
+    region = params.get('region')
+    if region:
+        queryset = queryset.filter(region__in=[r.strip() for r in region.split(',') if r.strip()])
+
+    analysis_type = params.get('type')
+    if analysis_type:
+        queryset = queryset.filter(type__in=[t.strip() for t in analysis_type.split(',') if t.strip()])
+
+    city = params.get('city')
+    if city:
+        cities = [c.strip() for c in city.split(',') if c.strip()]
+        queryset = queryset.filter(city__in=cities)
+
+    start = params.get('start')
+    if start:
+        queryset = queryset.filter(timestamp__gte=parse_range_bound(start, 'start'))
+
+    end = params.get('end')
+    if end:
+        queryset = queryset.filter(timestamp__lt=parse_range_bound(end, 'end', is_end=True))
+
+    class_param = params.get('class')
+    if class_param:
+        class_mask = _parse_class_param(class_param)
+        queryset = queryset.annotate(
+            matching_classes=F('precip_mask').bitand(class_mask)
+        ).filter(has_precipitation=True, matching_classes__gt=0)
+
+    min_class = params.get('min_class')
+    if min_class:
+        if not min_class.isdigit():
+            raise ValidationError({'min_class': f"Expected an integer, got '{min_class}'."})
+        queryset = queryset.filter(max_class__gte=int(min_class))
+
+    has_precipitation = params.get('has_precipitation')
+    if has_precipitation:
+        queryset = queryset.filter(has_precipitation=has_precipitation.lower() in ('1', 'true', 'yes'))
+
+    return queryset
+
+
+def requested_fields(params):
+    """Fields selected with ?fields=... (validated against CLOUD_API_FIELDS), all by default."""
+    fields = params.get('fields')
+    if not fields:
+        return CLOUD_API_FIELDS
+    requested = tuple(f.strip() for f in fields.split(',') if f.strip())
+    unknown = [f for f in requested if f not in CLOUD_API_FIELDS]
+    if unknown:
+        raise ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(CLOUD_API_FIELDS)}."})
+    return requested
+
+
+# DistrictRollup fields returned by /api/cloud/rollups/.
+ROLLUP_API_FIELDS = (
+    'region', 'city', 'granularity', 'period_start', 'sample_count', 'max_class', 'precip_minutes',
+    'class_1_count', 'class_2_count', 'class_3_count', 'class_4_count',
+    'class_5_count', 'class_6_count', 'class_7_count',
+)
+
+
+def filter_rollups(queryset, params):
+    """
+    Applies the /api/cloud/rollups/ filters: granularity ('hour' or 'day', default 'day'),
+    region and city (comma-separated), start / end on period_start and min_class.
+    """
+    granularity = params.get('granularity', 'day')
+    if granularity not in ('hour', 'day'):
+        raise ValidationError({'granularity': "Expected 'hour' or 'day'."})
+    queryset = queryset.filter(granularity=granularity)
+
+    region = params.get('region')
+    if region:
+        queryset = queryset.filter(region__in=[r.strip() for r in region.split(',') if r.strip()])
+
+    city = params.get('city')
+    if city:
+        queryset = queryset.filter(city__in=[c.strip() for c in city.split(',') if c.strip()])
+
+    start = params.get('start')
+    if start:
+        queryset = queryset.filter(period_start__gte=parse_range_bound(start, 'start'))
+
+    end = params.get('end')
+    if end:
+        queryset = queryset.filter(period_start__lt=parse_range_bound(end, 'end', is_end=True))
+
+    min_class = params.get('min_class')
+    if min_class:
+        if not min_class.isdigit():
+            raise ValidationError({'min_class': f"Expected an integer, got '{min_class}'."})
+        queryset = queryset.filter(max_class__gte=int(min_class))
+
+    return queryset
@@ -0,0 +1,127 @@
+# weather/frame_query.py
+#
+# Point and bounding-box precipitation queries against one frame (/api/cloud/query/):
+# coordinates are mapped to pixels through the region's georeference (Region.bounds)
+# and read from the frame's class raster. Decoded rasters are kept in a small in-process
+# LRU cache, keyed by the frame's capture (content hash), so repeated queries against the
+# latest frame only cost the frame lookup and a numpy gather.
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from . import cube
+from .models import Frame
+from .precipitation import classify_image, load_class_raster
+
+# Decoded class rasters kept per process (a 0.5 MP raster is about 256 KB)
+FRAME_CACHE_SIZE = 16
+
+_frame_cache = OrderedDict() # (frame pk, content hash, retention tier, class path) -> (y, x) classes
+_frame_cache_lock = threading.Lock()
+
+
+def frame_at(region, at=None):
+    """The region's latest frame captured at or before `at` (default: the latest frame), or None."""
+    frames = Frame.objects.filter(region=region.key)
+    if at is not None:
+        frames = frames.filter(timestamp__lte=at)
+    return frames.order_by('-timestamp').first()
+
+
+def _load_classes(frame, region):
+    """
+    The frame's class raster: its cube slice (no image decoding) if the cube holds this
+    capture of the slot, else its class raster, else its cropped image classified now.
+    Retention-downsampled frames are read from their own (smaller) class raster; the
+    georeference scales with the raster's size.
+    """
+    if frame.retention_tier != Frame.TIER_DOWNSAMPLED and frame.content_hash:
+        classes = cube.frame_slice(region.key, frame.timestamp, frame.content_hash)
+        if classes is not None:
+            return classes
+    class_path = frame.media_path(frame.class_path)
+    if class_path and os.path.exists(class_path):
+        return load_class_raster(class_path)
+    cropped_path = frame.media_path(frame.cropped_path)
+    if not cropped_path or not os.path.exists(cropped_path):
+        return None
+    with Image.open(cropped_path) as img:
+        return classify_image(np.array(img.convert("RGB")), region.legend)
+
+
+def frame_classes(frame, region):
+    """The frame's (y, x) class raster (cached per process), or None if it has no raster or crop."""
+    cache_key = (frame.pk, frame.content_hash, frame.retention_tier, frame.class_path)
+    with _frame_cache_lock:
+        classes = _frame_cache.get(cache_key)
+        if classes is not None:
+            _frame_cache.move_to_end(cache_key)
+            return classes
+
+    classes = _load_classes(frame, region)
+    if classes is None:
+        return None
+    classes.setflags(write=False) # Shared by concurrent requests
+    with _frame_cache_lock:
+        _frame_cache[cache_key] = classes
+        while len(_frame_cache) > FRAME_CACHE_SIZE:
+            _frame_cache.popitem(last=False)
+    return classes
+
+
+def query_points(region, classes, points):
+    """
+    Class at each (lat, lon) point, vectorized over the batch.
+
+    Returns:
+        list: One dict per point with 'lat', 'lon', 'class' and 'label' (both None outside the region).
+    """
+    height, width = classes.shape
+    lats = np.array([lat for lat, _ in points], dtype=np.float64)
+    lons = np.array([lon for _, lon in points], dtype=np.float64)
+    rows, cols, inside = region.pixel_indices(lats, lons, width, height)
+    point_classes = np.where(inside, classes[rows, cols], 0)
+
+    legend_labels = (None,) + region.legend_labels
+    return [
+        {
+            'lat': float(lat),
+            'lon': float(lon),
+            'class': int(precip_class) if is_inside else None,
+            'label': legend_labels[precip_class] if is_inside else None,
+        }
+        for lat, lon, precip_class, is_inside in zip(lats, lons, point_classes, inside)
+    ]
+
+
+def query_boxes(region, classes, boxes):
+    """
+    Heaviest class and wet fraction inside each (min_lon, min_lat, max_lon, max_lat) box,
+    over every pixel the box touches.
+
+    Returns:
+        list: One dict per box with 'bbox', 'max_class', 'label' and 'wet_fraction'
+              (all None if the box misses the region).
+    """
+    height, width = classes.shape
+    legend_labels = (None,) + region.legend_labels
+    results = []
+    for bbox in boxes:
+        window = region.pixel_window(bbox, width, height)
+        if window is None:
+            results.append({'bbox': list(bbox), 'max_class': None, 'label': None, 'wet_fraction': None})
+            continue
+        row_start, row_stop, col_start, col_stop = window
+        box_classes = classes[row_start:row_stop, col_start:col_stop]
+        max_class = int(box_classes.max())
+        results.append({
+            'bbox': list(bbox),
+            'max_class': max_class,
+            'label': legend_labels[max_class],
+            'wet_fraction': round(float(np.count_nonzero(box_classes)) / box_classes.size, 4),
+        })
+    return results
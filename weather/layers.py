@@ -0,0 +1,109 @@
+# weather/layers.py
+
+from functools import lru_cache
+
+from django.conf import settings
+
+from .catalogue import CLASS_RASTER_RELPATH, CROPPED_IMAGE_RELPATHS, FULL_IMAGE_RELPATH
+from .precipitation import MAX_COLOR_TOLERANCE, NO_PRECIP_MESSAGE, WINDY_LEGEND
+
+RADAR_LAYER_KEY = 'radar'
+
+# Legends of the other windy overlays, lightest to heaviest. Sampled from windy's own
+# legend bars; calibrate them for a deployment with settings.WEATHER_LAYERS if needed.
+SATELLITE_LEGEND = {
+    (120, 120, 120): "Low cloud - Grey", (185, 185, 185): "Mid cloud - Light Grey",
+    (240, 240, 240): "High cloud - White", (97, 167, 222): "Cold tops - Blue",
+    (225, 85, 200): "Very cold tops - Magenta",
+}
+RAIN_ACCUMULATION_LEGEND = {
+    (95, 125, 180): "5 mm - Blue", (70, 170, 160): "10 mm - Teal",
+    (90, 195, 90): "20 mm - Green", (220, 215, 70): "50 mm - Yellow",
+    (230, 130, 50): "100 mm - Orange", (200, 50, 60): "200 mm - Red",
+}
+
+
+class Layer:
+    """
+    One windy overlay captured each cycle, with the legend used to classify it.
+
+    Args:
+        key (str): Identifier used in settings and file names.
+        name (str): Stored as CloudAnalysis.type ("Weather radar" for the radar layer).
+        overlay (str): windy's overlay id, as used in its URL and map store.
+        legend (dict): RGB colour -> label, lightest to heaviest.
+        max_tolerance (int): Maximum RGB distance for a pixel to match a legend colour.
+        settle_seconds (float): Wait after switching to this layer before the screenshot.
+        no_match_message (str): CloudAnalysis.values when no legend colour matched.
+        publish (bool): Include this layer's results in the daemon's API POST.
+    """
+
+    def __init__(self, key, name, overlay, legend, max_tolerance=MAX_COLOR_TOLERANCE, settle_seconds=4,
+                 no_match_message=NO_PRECIP_MESSAGE, publish=False):
+        self.key = key
+        self.name = name
+        self.overlay = overlay
+        self.legend = legend
+        self.max_tolerance = max_tolerance
+        self.settle_seconds = settle_seconds
+        self.no_match_message = no_match_message
+        self.publish = publish
+
+    def __repr__(self):
+        return f"Layer({self.key!r})"
+
+    @property
+    def is_radar(self):
+        return self.key == RADAR_LAYER_KEY
+
+    @property
+    def legend_labels(self):
+        return tuple(self.legend.values())
+
+    # The radar layer keeps the original file names, which the frame catalogue indexes.
+    @property
+    def full_image_relpath(self):
+        return FULL_IMAGE_RELPATH if self.is_radar else f"full/windy_map_full_{self.key}.png"
+
+    @property
+    def cropped_image_relpath(self):
+        return CROPPED_IMAGE_RELPATHS[0] if self.is_radar else f"cropped/{self.key}_cropped.png"
+
+    @property
+    def class_raster_relpath(self):
+        return CLASS_RASTER_RELPATH if self.is_radar else f"class/{self.key}_classes.png"
+
+
+# --- Registry ---
+_BUILTIN_LAYERS = {
+    RADAR_LAYER_KEY: dict(name="Weather radar", overlay='radar', legend=WINDY_LEGEND, publish=True),
+    'satellite': dict(name="Satellite clouds", overlay='satellite', legend=SATELLITE_LEGEND,
+                      no_match_message="No significant cloud cover found"),
+    'rain_accumulation': dict(name="Rain accumulation", overlay='rainAccu', legend=RAIN_ACCUMULATION_LEGEND,
+                              no_match_message="No significant rain accumulation found"),
+}
+
+
+@lru_cache(maxsize=1)
+def _registry():
+    """Built-in layers updated with settings.WEATHER_LAYERS (layer key -> Layer keyword arguments)."""
+    definitions = {key: dict(options) for key, options in _BUILTIN_LAYERS.items()}
+    for key, options in getattr(settings, 'WEATHER_LAYERS', {}).items():
+        definitions.setdefault(key, {}).update(options)
+    return {key: Layer(key, **options) for key, options in definitions.items()}
+
+
+def get_layer(key=None):
+    """Layer for `key` (radar if empty). Raises KeyError for unknown keys."""
+    return _registry()[key or RADAR_LAYER_KEY]
+
+
+def layer_for_type(type_name):
+    """The layer whose results are stored with CloudAnalysis.type == `type_name`, or None."""
+    return next((layer for layer in _registry().values() if layer.name == type_name), None)
+
+
+def capture_layers():
+    """Layers captured each cycle (settings.CAPTURE_LAYERS), radar first."""
+    layers = [get_layer(key) for key in getattr(settings, 'CAPTURE_LAYERS', [RADAR_LAYER_KEY])]
+    return sorted(layers, key=lambda layer: not layer.is_radar)
@@ -0,0 +1,279 @@
+# weather/live.py
+#
+# Live push of finished cycles to dashboards, over Server-Sent Events (/api/cloud/events/)
+# and a WebSocket (/ws/cycles/, routed in layer/asgi.py), so they no longer poll /api/cloud/.
+#
+# The capture daemon and the analysis workers record each finished slot as a CycleEvent
+# row. Each ASGI worker process runs one hub per event loop: a single task polls the table
+# for new ids (every LIVE_POLL_SECONDS, or at once when the event was recorded in the same
+# process) and fans them out to its subscribers' queues, so database load does not grow
+# with the number of dashboards and no external broker is needed. Subscribers resume from
+# the last id they saw; a subscriber that falls behind re-reads from the table.
+
+import asyncio
+import json
+import threading
+import weakref
+from datetime import timedelta
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import CloudAnalysis, CycleEvent
+
+# Events read per query, when polling or when a subscriber catches up
+EVENT_PAGE_SIZE = 100
+# Events queued per subscriber before it is switched to catching up from the table
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def poll_seconds():
+    return getattr(settings, 'LIVE_POLL_SECONDS', 1.0)
+
+
+def keepalive_seconds():
+    return getattr(settings, 'LIVE_KEEPALIVE_SECONDS', 15)
+
+
+# --- Recording (capture daemon / analysis workers) ---
+def _changed_districts(capture):
+    """The capture's results whose values differ from the region's previous slot, per layer."""
+    analyses_by_type = {}
+    for analysis in capture.analyses:
+        analyses_by_type.setdefault(analysis.type, []).append(analysis)
+
+    changed = []
+    for type_name, analyses in analyses_by_type.items():
+        earlier = CloudAnalysis.objects.filter(region=capture.region.key, type=type_name, timestamp__lt=analyses[0].timestamp)
+        previous_timestamp = earlier.order_by('-timestamp').values_list('timestamp', flat=True).first()
+        previous = dict(earlier.filter(timestamp=previous_timestamp).values_list('city', 'values')) if previous_timestamp else {}
+        for analysis in analyses:
+            if previous.get(analysis.city) != analysis.values:
+                changed.append({'city': analysis.city, 'type': type_name, 'values': analysis.values,
+                                'previous_values': previous.get(analysis.city)})
+    return changed
+
+
+def record_cycle(capture, timestamp):
+    """
+    Records a finished RegionCapture as a CycleEvent for live subscribers and drops events
+    older than LIVE_EVENTS_KEEP_DAYS. Call once its results are saved.
+
+    Returns:
+        CycleEvent: The recorded event.
+    """
+    frame = capture.frame
+    event = CycleEvent.objects.create(region=capture.region.key, timestamp=timestamp, payload={
+        'region': capture.region.key,
+        'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        'frame_url': f"{settings.MEDIA_URL}{frame.cropped_path}" if frame is not None and frame.cropped_path else None,
+        'results': capture.results,
+        'changed': _changed_districts(capture),
+    })
+    CycleEvent.objects.filter(created_at__lt=timezone.now() - timedelta(days=getattr(settings, 'LIVE_EVENTS_KEEP_DAYS', 7))).delete()
+    wake_hubs()
+    return event
+
+
+# --- Fan-out (ASGI worker processes) ---
+class _Subscriber:
+    def __init__(self, region):
+        self.region = region
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.lagging = False # Missed queued events; catch up from the table
+
+
+class EventHub:
+    """
+    Fans new CycleEvent rows out to the subscribers of one event loop. One task polls the
+    table while anyone is subscribed and stops with the last subscriber.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.last_id = None
+        self._subscribers = set()
+        self._wake = asyncio.Event()
+        self._task = None
+
+    async def add(self, subscriber):
+        if self._task is None:
+            # Not polling since the last subscriber left (or ever): skip what was recorded meanwhile
+            latest_id = await _latest_event_id()
+            if self._task is None: # Another subscriber may have started the poller while we waited
+                self.last_id = latest_id
+        self._subscribers.add(subscriber)
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def remove(self, subscriber):
+        self._subscribers.discard(subscriber)
+        self._wake.set() # Lets an idle poller notice it has no one left
+
+    def wake(self):
+        self._wake.set()
+
+    async def _run(self):
+        try:
+            while self._subscribers:
+                try:
+                    events = await _events_after(self.last_id)
+                except Exception as e:
+                    print(f"Live events: polling for new cycle events failed: {e}")
+                    events = []
+                for event in events:
+                    self.last_id = event.pk
+                    for subscriber in list(self._subscribers):
+                        try:
+                            subscriber.queue.put_nowait(event)
+                        except asyncio.QueueFull:
+                            subscriber.lagging = True
+                if len(events) == EVENT_PAGE_SIZE:
+                    continue # More waiting
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), poll_seconds())
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._task = None
+
+
+_hubs = weakref.WeakKeyDictionary() # event loop -> EventHub
+_hubs_lock = threading.Lock()
+
+
+def _hub():
+    loop = asyncio.get_running_loop()
+    with _hubs_lock:
+        hub = _hubs.get(loop)
+        if hub is None:
+            hub = _hubs[loop] = EventHub(loop)
+    return hub
+
+
+def wake_hubs():
+    """Makes this process's hubs poll now (an event was just recorded here). Thread-safe."""
+    with _hubs_lock:
+        hubs = list(_hubs.values())
+    for hub in hubs:
+        try:
+            hub.loop.call_soon_threadsafe(hub.wake)
+        except RuntimeError:
+            pass # Loop already closed
+
+
+@sync_to_async
+def _latest_event_id():
+    return CycleEvent.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+@sync_to_async
+def _events_after(last_id, region=None):
+    events = CycleEvent.objects.filter(pk__gt=last_id)
+    if region:
+        events = events.filter(region=region)
+    return list(events.order_by('pk')[:EVENT_PAGE_SIZE])
+
+
+async def subscribe(last_id=None, region=None):
+    """
+    Yields CycleEvent rows as they are recorded, starting after `last_id` (default: only
+    new ones), optionally for one region only. Yields None every LIVE_KEEPALIVE_SECONDS
+    without events, so transports can keep idle connections open.
+    """
+    hub = _hub()
+    subscriber = _Subscriber(region)
+    await hub.add(subscriber)
+    try:
+        if last_id is None:
+            last_id = hub.last_id
+        else:
+            subscriber.lagging = True # Replay what was missed first
+        while True:
+            if subscriber.lagging:
+                subscriber.lagging = False
+                events = await _events_after(last_id, region)
+                for event in events:
+                    last_id = event.pk
+                    yield event
+                if len(events) == EVENT_PAGE_SIZE:
+                    subscriber.lagging = True
+                continue
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), keepalive_seconds())
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            # Events already replayed from the table, or of other regions
+            if event.pk <= last_id or (region and event.region != region):
+                continue
+            last_id = event.pk
+            yield event
+    finally:
+        hub.remove(subscriber)
+
+
+def event_json(event):
+    return json.dumps({'id': event.pk, **event.payload})
+
+
+def parse_last_id(value):
+    return int(value) if value and str(value).isdigit() else None
+
+
+# --- Server-Sent Events ---
+async def sse_stream(last_id=None, region=None):
+    """text/event-stream chunks for subscribe(): one 'cycle' event per CycleEvent, comments as keepalives."""
+    yield f"retry: {int(poll_seconds() * 1000) + 2000}\n\n"
+    async for event in subscribe(last_id, region):
+        if event is None:
+            yield ": keepalive\n\n"
+        else:
+            yield f"id: {event.pk}\nevent: cycle\ndata: {event_json(event)}\n\n"
+
+
+# --- WebSocket (raw ASGI; layer/asgi.py routes WEBSOCKET_PATH here) ---
+WEBSOCKET_PATH = '/ws/cycles/'
+
+
+async def websocket_app(scope, receive, send):
+    """
+    Sends each CycleEvent as one JSON text message ({"id": ..., "region": ..., ...}).
+    Query params: region, last_id (resume after this event id).
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    params = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    last_id = parse_last_id(params.get('last_id', [''])[0])
+    region = params.get('region', [''])[0] or None
+    await send({'type': 'websocket.accept'})
+
+    disconnected = asyncio.Event()
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'websocket.disconnect':
+            pass # Clients have nothing to say; incoming messages are ignored
+        disconnected.set()
+
+    listener = asyncio.ensure_future(wait_for_disconnect())
+    events = subscribe(last_id, region)
+    try:
+        while not disconnected.is_set():
+            next_event = asyncio.ensure_future(events.__anext__())
+            await asyncio.wait({next_event, listener}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_event.done():
+                next_event.cancel()
+                await asyncio.gather(next_event, return_exceptions=True)
+                break
+            event = next_event.result()
+            if event is not None:
+                await send({'type': 'websocket.send', 'text': event_json(event)})
+    finally:
+        listener.cancel()
+        await events.aclose()
+        await sync_to_async(close_old_connections)()
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from weather.automation_report import get_automation_report
+from weather.live import record_cycle
+from weather.publish import post_results
+from weather.replay import STUB_PUBLISH_URL
+from weather.work_queue import claim_next_job, default_worker_name, expire_leases, fail_job, run_analysis_job
+import time
+
+
+class Command(BaseCommand):
+    help = ('Analyses screenshots queued by "cloud_analysis --enqueue" (weather.work_queue). '
+            'Start several processes, on this host or others sharing MEDIA_ROOT and the database, for more throughput.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty instead of polling.")
+        parser.add_argument('--name', default=None, help="Worker name recorded on leased jobs (default: host:pid).")
+        parser.add_argument('--region', action='append', help="Only lease jobs of this region (repeatable).")
+        parser.add_argument('--layer', action='append', help="Only lease jobs of this layer (repeatable).")
+        parser.add_argument('--publish-url', default=None,
+                            help="POST every region's results here instead of its api_endpoint_url (e.g. a 'manage.py publish_stub'; "
+                                 "the default under REPLAY_SANDBOX settings).")
+        parser.add_argument('--automation-pdf', action='store_true',
+                            help="Also render the slot's automation report once its radar layer is analysed.")
+
+    def handle(self, **options):
+        worker_name = options['name'] or default_worker_name()
+        if getattr(settings, 'REPLAY_SANDBOX', False) and not options['publish_url']:
+            options['publish_url'] = STUB_PUBLISH_URL # Working a replay's queue; never the regions' real endpoints
+        self.stdout.write(self.style.SUCCESS(f"Analysis worker {worker_name} started."))
+
+        try:
+            while True:
+                close_old_connections()
+                released = expire_leases()
+                if released:
+                    self.stdout.write(self.style.WARNING(f"Released {released} analysis job(s) with expired leases."))
+
+                job = claim_next_job(worker_name, options['region'], options['layer'])
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f"Analysing {job} (attempt {job.attempts} of {job.max_attempts})")
+                try:
+                    capture = run_analysis_job(job, self)
+                except Exception as e:
+                    self.stderr.write(self.style.ERROR(f"Analysis job {job.pk} failed: {e}"))
+                    fail_job(job, str(e))
+                    continue
+                self.stdout.write(self.style.SUCCESS(f"Analysis job {job.pk} done: {len(capture.analyses)} district results saved."))
+                try:
+                    event = record_cycle(capture, job.timestamp)
+                    self.stdout.write(f"Live cycle event {event.pk} recorded.")
+                except Exception as e:
+                    self.stderr.write(self.style.ERROR(f"Error recording the live cycle event for job {job.pk}: {e}"))
+
+                # --- Publishing happens after the results are committed; its errors are logged, not retried ---
+                post_results(self, options['publish_url'] or capture.region.api_endpoint_url, capture.published_results(), 1)
+                if options['automation_pdf'] and capture.frame is not None:
+                    try:
+                        pdf_path = get_automation_report(capture.frame)
+                        self.stdout.write(self.style.SUCCESS(f"[{capture.region.key}] PDF report generated and saved successfully to: {pdf_path}"))
+                    except Exception as e:
+                        self.stderr.write(self.style.ERROR(f"[{capture.region.key}] Error generating PDF report: {e}"))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Analysis worker stopped."))
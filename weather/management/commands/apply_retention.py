@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand
+from weather.models import Frame
+from weather.retention import compact_frame, downsample_frame, due_count, due_frames, retention_policy, retention_steps
+import signal
+import time
+
+BATCH_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = ('Moves ageing capture folders down the retention tiers (weather.retention): compact after '
+            'IMAGE_RETENTION["full_days"], downsampled after IMAGE_RETENTION["compact_days"]. '
+            'Incremental and safe to interrupt; rerun (e.g. from cron) to continue.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full-days', type=int, help="Override: keep everything for this many days.")
+        parser.add_argument('--compact-days', type=int, help="Override: keep full-size crops for this many days.")
+        parser.add_argument('--factor', type=int, help="Override: downsampling factor.")
+        parser.add_argument('--region', help="Only this region's frames (weather.regions key).")
+        parser.add_argument('--limit', type=int, default=None, help="Process at most this many frames.")
+        parser.add_argument('--max-seconds', type=float, default=None, help="Stop starting new frames after this long.")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without touching files.")
+
+    def _request_stop(self, signum, frame):
+        self.stop_requested = True
+        self.stdout.write(self.style.WARNING("Stopping after the current frame..."))
+
+    def _batches(self, tier, cutoff, region, failed_pks):
+        """
+        Due frames in small batches, re-queried each time: processed frames leave the due
+        set and failed ones are excluded, so no cursor is held open while rows are updated.
+        """
+        while not self.stop_requested:
+            batch = list(due_frames(tier, cutoff, region).exclude(pk__in=failed_pks)[:BATCH_SIZE])
+            if not batch:
+                return
+            yield batch
+
+    def handle(self, **options):
+        policy = retention_policy()
+        for option, key in (('full_days', 'full_days'), ('compact_days', 'compact_days'), ('factor', 'downsample_factor')):
+            if options[option] is not None:
+                policy[key] = options[option]
+
+        # Finish the frame in hand on Ctrl-C / SIGTERM, so no frame is left half-processed
+        self.stop_requested = False
+        previous_handlers = {sig: signal.signal(sig, self._request_stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+
+        started = time.monotonic()
+        processed = failed = 0
+        freed_bytes = 0
+        failed_pks = set()
+        higher_cutoff = None
+        try:
+            # Highest tier first: a frame old enough for it goes there directly, without a second pass
+            for tier, cutoff in reversed(retention_steps(policy)):
+                if options['dry_run']:
+                    # Nothing moves, so count each frame once, for the highest tier it is due for
+                    frames = due_frames(tier, cutoff, options['region'])
+                    if higher_cutoff is not None:
+                        frames = frames.filter(timestamp__gte=higher_cutoff)
+                    higher_cutoff = cutoff
+                    batches = [frames.iterator()]
+                else:
+                    batches = self._batches(tier, cutoff, options['region'], failed_pks)
+
+                for batch in batches:
+                    for frame in batch:
+                        if self.stop_requested or (options['limit'] is not None and processed >= options['limit']) \
+                                or (options['max_seconds'] is not None and time.monotonic() - started > options['max_seconds']):
+                            self.stop_requested = True
+                            break
+                        try:
+                            if tier == Frame.TIER_DOWNSAMPLED:
+                                freed_bytes += downsample_frame(frame, policy['downsample_factor'], options['dry_run'])
+                            else:
+                                freed_bytes += compact_frame(frame, options['dry_run'])
+                            processed += 1
+                            if options['verbosity'] > 1:
+                                self.stdout.write(f"{frame.region}/{frame.folder} -> {Frame(retention_tier=tier).get_retention_tier_display()}")
+                        except Exception as e:
+                            self.stderr.write(self.style.ERROR(f"Error applying retention to {frame.region}/{frame.folder}: {e}"))
+                            failed += 1
+                            failed_pks.add(frame.pk)
+                    if self.stop_requested:
+                        break
+                if self.stop_requested:
+                    break
+        finally:
+            for sig, handler in previous_handlers.items():
+                signal.signal(sig, handler)
+
+        remaining = due_count(retention_steps(policy), options['region'])
+        verb = "would free" if options['dry_run'] else "freed"
+        self.stdout.write(self.style.SUCCESS(
+            f"Retention: {processed} frames processed, {failed} failed, {verb} {freed_bytes / (1024 * 1024):.1f} MB "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
+        if remaining and not options['dry_run']:
+            self.stdout.write(f"{remaining} frames still due; run again to continue.")
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils.dateparse import parse_date
+from weather.automation_report import automation_report_path, generate_automation_report
+from weather.models import Frame
+from datetime import datetime, time as dt_time
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = 'Renders the per-slot xhtml2pdf automation reports missing from the Frame catalogue, off the capture path.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only slots captured on or after this date (YYYY-MM-DD).")
+        parser.add_argument('--force', action='store_true', help="Re-render reports that already exist.")
+        parser.add_argument('--watch', type=int, default=0, metavar='SECONDS',
+                            help="Keep running, checking for new slots every SECONDS.")
+
+    def _pending_frames(self, since, force):
+        frames = Frame.objects.exclude(full_path='').order_by('timestamp')
+        if since:
+            frames = frames.filter(timestamp__gte=datetime.combine(since, dt_time.min))
+        for frame in frames.iterator():
+            if force or not os.path.exists(automation_report_path(frame)):
+                yield frame
+
+    def _build_pending(self, since, force):
+        built = failed = 0
+        for frame in self._pending_frames(since, force):
+            try:
+                pdf_path = generate_automation_report(frame)
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f"Error generating automation report for {frame.folder}: {e}"))
+                failed += 1
+                continue
+            self.stdout.write(f"Automation report written: {pdf_path}")
+            built += 1
+        return built, failed
+
+    def handle(self, **options):
+        since = parse_date(options['since']) if options['since'] else None
+
+        while True:
+            close_old_connections()
+            built, failed = self._build_pending(since, options['force'])
+            if built or failed or not options['watch']:
+                self.stdout.write(self.style.SUCCESS(f"Automation reports: {built} written, {failed} failed."))
+            if not options['watch']:
+                break
+            options['force'] = False # Only the first pass re-renders existing reports
+            time.sleep(options['watch'])
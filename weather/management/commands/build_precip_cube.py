@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from weather.cube import append_slice
+from weather.models import Frame
+from weather.precipitation import classify_image, load_class_raster
+from weather.regions import get_region
+from datetime import datetime, time as dt_time
+from PIL import Image
+import numpy as np
+import os
+
+
+class Command(BaseCommand):
+    help = 'Backfills the memory-mapped precipitation cube (weather.cube) from the Frame catalogue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only frames captured on or after this date (YYYY-MM-DD).")
+        parser.add_argument('--region', help="Only this region's frames (weather.regions key).")
+
+    def _frame_classes(self, frame):
+        """The frame's class raster, classifying the cropped image if no raster was saved."""
+        class_path = frame.media_path(frame.class_path)
+        if class_path and os.path.exists(class_path):
+            return load_class_raster(class_path)
+        cropped_path = frame.media_path(frame.cropped_path)
+        if not cropped_path or not os.path.exists(cropped_path):
+            return None
+        with Image.open(cropped_path) as img:
+            return classify_image(np.array(img.convert("RGB")), get_region(frame.region).legend)
+
+    def handle(self, **options):
+        frames = Frame.objects.order_by('region', 'timestamp')
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError("--since must be a date in YYYY-MM-DD format.")
+            frames = frames.filter(timestamp__gte=datetime.combine(since, dt_time.min))
+        if options['region']:
+            frames = frames.filter(region=options['region'])
+
+        appended = present = failed = 0
+        for frame in frames.iterator():
+            try:
+                classes = self._frame_classes(frame)
+                if classes is None:
+                    self.stdout.write(self.style.WARNING(f"{frame.region}/{frame.folder}: no class raster or cropped image, skipped."))
+                    failed += 1
+                    continue
+                if append_slice(frame.region, frame.timestamp, classes, frame.content_hash):
+                    appended += 1
+                else:
+                    present += 1
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f"Error adding {frame.region}/{frame.folder} to the cube: {e}"))
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Precipitation cube: {appended} slices appended, {present} already present, {failed} skipped."
+        ))
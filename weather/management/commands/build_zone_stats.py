@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from weather.models import Frame
+from weather.precipitation import classify_image, load_class_raster
+from weather.regions import get_region
+from weather.zones import all_zone_sets, capture_zone_sets, evaluate_frame, get_zone_set
+from datetime import datetime, time as dt_time
+from PIL import Image
+import numpy as np
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = ('Evaluates zone sets (weather.zones) on catalogued frames and stores their per-zone results (ZoneStat), '
+            'e.g. after adding a zone set to WEATHER_ZONE_SETS. Rerunning replaces a frame\'s earlier results.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--zone-set', action='append',
+                            help="Zone set key (repeatable; default: settings.CAPTURE_ZONE_SETS).")
+        parser.add_argument('--since', help="Only frames captured on or after this date (YYYY-MM-DD).")
+        parser.add_argument('--region', help="Only this region's frames (weather.regions key).")
+        parser.add_argument('--list', action='store_true', help="List the configured zone sets and exit.")
+
+    def _frame_classes(self, frame):
+        """The frame's class raster, classifying the cropped image if no raster was saved."""
+        class_path = frame.media_path(frame.class_path)
+        if class_path and os.path.exists(class_path):
+            return load_class_raster(class_path)
+        cropped_path = frame.media_path(frame.cropped_path)
+        if not cropped_path or not os.path.exists(cropped_path):
+            return None
+        with Image.open(cropped_path) as img:
+            return classify_image(np.array(img.convert("RGB")), get_region(frame.region).legend)
+
+    def handle(self, **options):
+        if options['list']:
+            for zone_set in all_zone_sets():
+                detail = f"{zone_set.cell_degrees}°" if zone_set.cell_degrees else (zone_set.path or "region districts")
+                self.stdout.write(f"{zone_set.key}: {zone_set.name} ({zone_set.kind}, {detail})")
+            return
+
+        try:
+            zone_sets = [get_zone_set(key) for key in options['zone_set']] if options['zone_set'] else capture_zone_sets()
+        except KeyError as e:
+            raise CommandError(f"Unknown zone set {e}; see --list.")
+        if not zone_sets:
+            raise CommandError("No zone sets to evaluate (pass --zone-set or set CAPTURE_ZONE_SETS).")
+
+        frames = Frame.objects.order_by('region', 'timestamp')
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError("--since must be a date in YYYY-MM-DD format.")
+            frames = frames.filter(timestamp__gte=datetime.combine(since, dt_time.min))
+        if options['region']:
+            frames = frames.filter(region=options['region'])
+
+        evaluated = skipped = failed = saved = 0
+        zone_counts = {}
+        evaluate_seconds = 0.0
+        for frame in frames.iterator():
+            classes = self._frame_classes(frame)
+            if classes is None:
+                self.stdout.write(self.style.WARNING(f"{frame.region}/{frame.folder}: no class raster or cropped image, skipped."))
+                skipped += 1
+                continue
+            region = get_region(frame.region)
+            for zone_set in zone_sets:
+                started = time.monotonic()
+                try:
+                    zone_count, wet_count = evaluate_frame(zone_set, region, frame.timestamp, classes)
+                except Exception as e:
+                    self.stderr.write(self.style.ERROR(f"Error evaluating {zone_set.key} on {frame.region}/{frame.folder}: {e}"))
+                    failed += 1
+                    continue
+                evaluate_seconds += time.monotonic() - started
+                zone_counts[zone_set.key] = max(zone_counts.get(zone_set.key, 0), zone_count)
+                evaluated += 1
+                saved += wet_count
+
+        per_frame = f", {evaluate_seconds / evaluated * 1000:.0f} ms per frame and zone set" if evaluated else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"Zone stats: {evaluated} frame evaluations ({', '.join(f'{key}: {count} zones' for key, count in zone_counts.items()) or 'none'}), "
+            f"{saved} zone results saved, {skipped} frames skipped, {failed} failed{per_frame}."
+        ))
@@ -1,92 +1,57 @@
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from weather.models import CloudAnalysis
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.keys import Keys
-from webdriver_manager.chrome import ChromeDriverManager
-from PIL import Image
+from weather.automation_report import get_automation_report
+from weather.capture import RegionCapture
+from weather.layers import capture_layers
+from weather.memwatch import MemoryWatchdog, restart_process, with_option
+from weather.live import record_cycle
+from weather.publish import post_results
+from weather.models import AnalysisJob
+from weather.regions import capture_regions
+from weather.replay import STUB_PUBLISH_URL, ReplayBackend, SimulatedClock, SystemClock
+from weather.rollups import update_rollups
+from django.utils.dateparse import parse_datetime
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta # Import timedelta
 import os
+import sys
 import time
 import json
-from django.template.loader import render_to_string
-
-from xhtml2pdf import pisa
-
-import geopandas as gpd
-import numpy as np
-import rasterio
-from rasterio.features import rasterize
-from rasterio.transform import from_bounds
-from shapely.ops import unary_union
-
-import requests
 
 class Command(BaseCommand):
-    help = 'Automates screenshot capture from Windy.com, crops to ALL Tamil Nadu districts, masks with shapefile, and analyzes cloud levels.'
-
-    BLUE_DOT_XPATH = '//*[@id="leaflet-map"]/div[1]/div[4]/div[2]'
-    API_ENDPOINT_URL = "http://172.16.7.118:8003/api/tamilnadu/satellite/push.windy_radar_data.php"
-
-    def _link_callback(self, uri, rel):
-        """
-        Convert HTML URIs to absolute system paths so xhtml2pdf can access them.
-        This is crucial for local images specified with 'file:///' protocol.
-        """
-        if uri.startswith('file:///'):
-            return uri[len('file:///'):]
-        
-        sUrl = settings.STATIC_URL
-        sRoot = settings.STATIC_ROOT
-        mUrl = settings.MEDIA_URL
-        mRoot = settings.MEDIA_ROOT
-
-        if uri.startswith(mUrl):
-            path = os.path.join(mRoot, uri.replace(mUrl, ""))
-        elif uri.startswith(sUrl):
-            path = os.path.join(sRoot, uri.replace(sUrl, ""))
-        else:
-            return uri
-
-        if os.path.exists(path):
-            return path
-        else:
-            self.stderr.write(self.style.WARNING(f"Warning: Linked file not found: {path} for URI: {uri}"))
-            return uri
-
-    def _generate_and_save_automation_pdf(self, results_data, current_time, base_folder,
-                                           full_screenshot_path_abs, cropped_screenshot_path_abs,
-                                           json_output_content):
-        """
-        Generates a PDF report for a single automation run using xhtml2pdf and saves it to a file.
-        """
-        pdf_filename = f"automation_report_{current_time.strftime('%Y%m%d_%H%M%S')}.pdf"
-        pdf_output_path = os.path.join(base_folder, pdf_filename)
-
-        context = {
-            'current_time': current_time,
-            'current_run_results': results_data,
-            'full_screenshot_path_abs': f'file:///{full_screenshot_path_abs.replace(os.path.sep, "/")}', # Ensure file:/// format for PDF
-            'cropped_screenshot_path_abs': f'file:///{cropped_screenshot_path_abs.replace(os.path.sep, "/")}', # Ensure file:/// format for PDF
-            'json_output_content': json_output_content,
-        }
-
-        html_string = render_to_string('weather/automation_report_pdf.html', context)
-
-        with open(pdf_output_path, "wb") as pdf_file:
-            pisa_status = pisa.CreatePDF(
-                html_string,
-                dest=pdf_file,
-                link_callback=self._link_callback
-            )
-
-        if pisa_status.err:
-            raise Exception(f"PDF generation error with xhtml2pdf: {pisa_status.err}")
+    help = ('Automates screenshot capture from Windy.com for every configured region (weather.regions), '
+            'masks each district with its shapefile, and analyzes cloud levels.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--automation-pdf', action='store_true',
+                            help="Also render each slot's xhtml2pdf automation report, after its data has been published. "
+                                 "Otherwise run 'manage.py build_automation_reports' or open /automation-report/<slot>/.")
+        parser.add_argument('--enqueue', action='store_true',
+                            help="Only capture: queue each screenshot for 'manage.py analysis_worker' processes "
+                                 "(weather.work_queue), which analyse, save, roll up and publish it.")
+        parser.add_argument('--cycles', type=int, default=None, help="Stop after this many cycles (default: run forever).")
+        parser.add_argument('--publish-url', default=None,
+                            help="POST every region's results here instead of its api_endpoint_url (e.g. a 'manage.py publish_stub').")
+
+        # --- Offline replay (weather.replay), for load tests ---
+        parser.add_argument('--replay', action='store_true',
+                            help="Replay archived full screenshots instead of capturing windy.com, on a simulated clock. "
+                                 "Only with a settings module that sets REPLAY_SANDBOX = True and points DATABASES, "
+                                 "MEDIA_ROOT and PRECIP_CUBE_ROOT at scratch copies; publishes to the local "
+                                 f"'manage.py publish_stub' ({STUB_PUBLISH_URL}) unless --publish-url is given.")
+        parser.add_argument('--replay-from', default=None,
+                            help="Folder of archived capture folders to replay (required with --replay; not MEDIA_ROOT, "
+                                 "which receives the replayed captures).")
+        parser.add_argument('--speed', type=float, default=60.0,
+                            help="Simulated seconds per real second in replay (0: skip waits entirely; default 60).")
+        parser.add_argument('--start', default=None, help="Simulated start time in replay, YYYY-MM-DDTHH:MM (default: now).")
+        parser.add_argument('--memory-log', default=getattr(settings, 'DAEMON_MEMORY_LOG', None),
+                            help="Append per-cycle memory reports (RSS per stage, allocation growth) to this file.")
+        parser.add_argument('--tracemalloc', type=int, default=getattr(settings, 'DAEMON_TRACEMALLOC_FRAMES', 0), metavar='FRAMES',
+                            help="Trace allocations with this traceback depth and report the top growth sites between cycles "
+                                 "(0 = off; slows the image processing, so use it to hunt leaks).")
+        parser.add_argument('--restart-rss-mb', type=float, default=getattr(settings, 'DAEMON_RESTART_RSS_MB', None),
+                            help="Restart the daemon between cycles once its RSS exceeds this many MB.")
 
     # NEW: Function to round datetime to nearest N minutes
     def _round_to_nearest_minutes(self, dt_object, minutes=15):
@@ -118,40 +83,124 @@ class Command(BaseCommand):
         return rounded_dt
 
 
-    def handle(self, **kwargs):
-        self.stdout.write(self.style.SUCCESS('Starting Windy.com cloud analysis automation for all Tamil Nadu districts...'))
+    def _post_results(self, api_endpoint_url, current_run_results, cycle):
+        post_results(self, api_endpoint_url, current_run_results, cycle)
 
-        shapefile_path = "C:/Users/tamilarasans/Downloads/gadm41_IND_2.json/gadm41_IND_2.json"
-        if not os.path.exists(shapefile_path):
-            self.stderr.write(self.style.ERROR(f"Critical Error: Shapefile not found at {shapefile_path}. Exiting."))
+    def _restart_argv(self, kwargs, cycle):
+        """This command line, resuming where this run is about to stop: before `cycle`."""
+        argv = sys.argv
+        if kwargs['cycles'] is not None:
+            argv = with_option(argv, '--cycles', kwargs['cycles'] - cycle + 1)
+        if kwargs['replay']:
+            argv = with_option(argv, '--start', self.clock.now().isoformat(timespec='seconds'))
+        return argv
+
+    def _end_cycle(self, watchdog, cycle_started, current_time):
+        """Closes a cycle: memory report, and in replay the cycle's timing and backlog."""
+        watchdog.end_cycle()
+        if self.replay_stats is None:
+            return
+        work_seconds = time.monotonic() - cycle_started
+        lag = self.clock.now() - current_time
+        previous_time = self.replay_stats['last_slot']
+        missed = 0 if previous_time is None else max(0, round((current_time - previous_time) / timedelta(minutes=15)) - 1)
+        self.replay_stats.update(
+            cycles=self.replay_stats['cycles'] + 1, missed=self.replay_stats['missed'] + missed,
+            work=self.replay_stats['work'] + work_seconds, max_work=max(self.replay_stats['max_work'], work_seconds),
+            last_slot=current_time,
+        )
+        backlog = AnalysisJob.objects.filter(status__in=[AnalysisJob.STATUS_QUEUED, AnalysisJob.STATUS_RUNNING]).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Replay cycle {self.replay_stats['cycles']} (slot {current_time:%Y-%m-%d %H:%M}): {work_seconds:.2f}s real, "
+            f"done {lag.total_seconds() / 60:.1f} simulated minutes after its slot, {missed} slots skipped, "
+            f"{backlog} analysis jobs outstanding."
+        ))
+
+    def _replay_summary(self):
+        stats = self.replay_stats
+        if not stats or not stats['cycles']:
             return
+        elapsed = time.monotonic() - stats['started']
+        self.stdout.write(self.style.SUCCESS(
+            f"Replay finished: {stats['cycles']} cycles in {elapsed:.1f}s real "
+            f"({stats['cycles'] / elapsed * 3600:.0f} cycles per real hour), work {stats['work'] / stats['cycles']:.2f}s mean / "
+            f"{stats['max_work']:.2f}s max per cycle, {stats['missed']} slots skipped, "
+            f"simulated time reached {self.clock.now():%Y-%m-%d %H:%M}."
+        ))
 
-        try:
-            gdf = gpd.read_file(shapefile_path)
-            tamil_nadu_gdf = gdf[gdf['NAME_1'] == 'TamilNadu']
-            if tamil_nadu_gdf.empty:
-                self.stderr.write(self.style.ERROR("Error: 'TamilNadu' not found in shapefile under 'NAME_1'. Please check the shapefile content."))
+    def handle(self, **kwargs):
+        # --- Clock and capture backend: wall clock + windy.com, or a simulated clock + archived screenshots ---
+        self.clock = SystemClock()
+        self.replay_stats = None
+        backend = None
+        if kwargs['replay']:
+            # A replay writes frames, analyses, rollups, cube slices and cycle events like a live run
+            if not getattr(settings, 'REPLAY_SANDBOX', False):
+                self.stderr.write(self.style.ERROR(
+                    "--replay writes to the database, MEDIA_ROOT and PRECIP_CUBE_ROOT like a live run. Use a settings "
+                    "module that points them at scratch copies and sets REPLAY_SANDBOX = True."
+                ))
+                return
+            if not kwargs['replay_from']:
+                self.stderr.write(self.style.ERROR("--replay needs --replay-from, the archive to replay."))
+                return
+            if os.path.realpath(kwargs['replay_from']) == os.path.realpath(settings.MEDIA_ROOT):
+                self.stderr.write(self.style.ERROR("--replay-from must not be MEDIA_ROOT, which receives the replayed captures."))
                 return
+            start = parse_datetime(kwargs['start']) if kwargs['start'] else datetime.now()
+            if start is None:
+                self.stderr.write(self.style.ERROR("--start must be YYYY-MM-DDTHH:MM."))
+                return
+            try:
+                backend = ReplayBackend(kwargs['replay_from'])
+            except ValueError as e:
+                self.stderr.write(self.style.ERROR(str(e)))
+                return
+            if not kwargs['publish_url']:
+                kwargs['publish_url'] = STUB_PUBLISH_URL # Never the regions' real endpoints
+            self.clock = SimulatedClock(start, kwargs['speed'])
+            self.replay_stats = {'started': time.monotonic(), 'cycles': 0, 'missed': 0, 'work': 0.0, 'max_work': 0.0, 'last_slot': None}
+            self.stdout.write(self.style.WARNING(
+                f"REPLAY: {len(backend.sources)} archived screenshots from {kwargs['replay_from']} into {settings.MEDIA_ROOT}, "
+                f"simulated clock from {start:%Y-%m-%d %H:%M} at {kwargs['speed']:g}x, publishing to {kwargs['publish_url']}."
+            ))
+
+        regions = capture_regions()
+        self.stdout.write(self.style.SUCCESS(f"Starting Windy.com cloud analysis automation for {', '.join(region.name for region in regions)}..."))
+
+        for region in regions:
+            district_names = region.district_names()
+            if not district_names:
+                self.stderr.write(self.style.ERROR(f"Error: No districts found for {region.name} in {region.shapefile_path}. Exiting."))
+                return
+            self.stdout.write(f"Found {len(district_names)} districts in {region.name}: {', '.join(district_names)}")
 
-            tamil_nadu_gdf = tamil_nadu_gdf.to_crs("EPSG:4326")
+        layers = capture_layers()
+        self.stdout.write(f"Layers captured each cycle: {', '.join(layer.name for layer in layers)}")
 
-            all_tn_districts = tamil_nadu_gdf['NAME_2'].unique().tolist()
-            if not all_tn_districts:
-                self.stderr.write(self.style.ERROR("Error: No districts found for 'TamilNadu' under 'NAME_2' in shapefile. Exiting."))
-                return
+        # One browser session per region, side by side, so adding regions does not stretch the cycle
+        max_parallel = getattr(settings, 'CAPTURE_MAX_PARALLEL', None) or len(regions)
 
-            self.stdout.write(f"Found {len(all_tn_districts)} districts in Tamil Nadu: {', '.join(all_tn_districts)}")
+        watchdog = MemoryWatchdog(
+            log_path=kwargs['memory_log'], tracemalloc_frames=kwargs['tracemalloc'],
+            restart_rss_mb=kwargs['restart_rss_mb'], write=self.stdout.write,
+        )
 
-        except Exception as e:
-            self.stderr.write(self.style.ERROR(f"Error loading or processing shapefile initially: {e}. Exiting."))
-            return
+        cycle = 0
+        while kwargs['cycles'] is None or cycle < kwargs['cycles']:
+            cycle += 1
+            last_cycle = cycle == kwargs['cycles']
+            # --- Clean self-restart between cycles once the footprint has crept past the threshold ---
+            if watchdog.restart_due:
+                self.stdout.write(self.style.WARNING("Memory threshold exceeded; restarting the daemon."))
+                restart_process(self._restart_argv(kwargs, cycle))
 
-        while True:
             self.stdout.write("\n" + "="*50)
             self.stdout.write("STARTING NEW 15-MINUTE CYCLE: Capturing fresh screenshot and performing initial analysis.")
             self.stdout.write("="*50 + "\n")
 
-            current_raw_time = datetime.now() # Capture the exact current time
+            cycle_started = time.monotonic()
+            current_raw_time = self.clock.now() # Capture the exact current time
             
             # --- NEW: Round the current_raw_time to the nearest 15 minutes ---
             current_time = self._round_to_nearest_minutes(current_raw_time, minutes=15)
@@ -161,236 +210,63 @@ class Command(BaseCommand):
 
             timestamp_str = current_time.strftime('%Y-%m-%d_%H-%M-%S')
 
-            base_folder = os.path.join(settings.BASE_DIR, "images", timestamp_str)
-            full_image_folder = os.path.join(base_folder, "full")
-            cropped_image_folder = os.path.join(base_folder, "cropped")
-            os.makedirs(full_image_folder, exist_ok=True)
-            os.makedirs(cropped_image_folder, exist_ok=True)
-
-            full_screenshot_path = os.path.join(full_image_folder, "windy_map_full.png")
-            cropped_screenshot_path = os.path.join(cropped_image_folder, "tamil_nadu_cropped.png")
-
-            CROP_BOX = (551, 170, 1065, 687) # Left, Upper, Right, Lower
-
-            driver = None
-            current_run_results = []
-
-            try:
-                chrome_options = webdriver.ChromeOptions()
-                chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-                chrome_options.add_experimental_option('useAutomationExtension', False)
-                chrome_options.add_argument("--window-size=1920,1080")
-                # chrome_options.add_argument("--headless")
-                # chrome_options.add_argument("--disable-gpu")
-                # chrome_options.add_argument("--no-sandbox")
-
-                driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
-
-                driver.get("https://www.windy.com/-Weather-radar-radar?radar,10.950,77.500,7")
-                self.stdout.write(f"Navigated to Windy.com with radar layer active and offset coordinates.")
+            captures = [RegionCapture(region, self, layers, backend) for region in regions]
+            with watchdog.stage('capture'):
+                with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix='capture') as executor:
+                    succeeded = list(executor.map(lambda capture: capture.run(current_time, timestamp_str, kwargs['enqueue']), captures))
+            captures = [capture for capture, ok in zip(captures, succeeded) if ok]
+
+            if kwargs['enqueue']:
+                # Analysis, rollups and publishing happen in the analysis workers
+                self.stdout.write(f"{len(captures)} of {len(regions)} regions captured and queued for analysis.")
+                del captures
+                self._end_cycle(watchdog, cycle_started, current_time)
+                if not last_cycle:
+                    self.stdout.write("Waiting 15 minutes before the next capture....\n")
+                    self.clock.sleep(900)
+                continue
 
-                wait = WebDriverWait(driver, 20)
+            if not captures:
+                self.stderr.write(self.style.ERROR("No region was captured in this cycle."))
+                self._end_cycle(watchdog, cycle_started, current_time)
+                if not last_cycle:
+                    self.stdout.write("Waiting 15 minutes before retry...\n")
+                    self.clock.sleep(900)
+                continue
 
+            # --- Fold this cycle into the hourly / daily district rollups ---
+            current_run_analyses = [analysis for capture in captures for analysis in capture.analyses]
+            with watchdog.stage('rollups'):
                 try:
-                    self.stdout.write('Attempting to dismiss cookie consent...')
-                    cookie_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, 'button.cc-dismiss, a[aria-label="dismiss cookie message"]')))
-                    cookie_button.click()
-                    self.stdout.write('Cookie consent dismissed.')
-                    time.sleep(1)
+                    update_rollups(current_run_analyses)
+                    self.stdout.write(f"Rollups updated for {len(current_run_analyses)} districts.")
                 except Exception as e:
-                    self.stdout.write(f"Could not find or dismiss cookie consent (might not be present): {e}. Continuing...")
-                    pass
-
-                self.stdout.write("Waiting for map to fully load (10 seconds)...")
-                time.sleep(10)
-
-                self.stdout.write("Attempting to hide the blue dot using JavaScript injection with confirmed XPath...")
+                    self.stderr.write(self.style.ERROR(f"Error updating district rollups (run 'manage.py rebuild_rollups' to repair): {e}"))
 
+            # --- Push this cycle to live dashboards (weather.live) ---
+            for capture in captures:
                 try:
-                    dot_element = wait.until(EC.presence_of_element_located((By.XPATH, self.BLUE_DOT_XPATH)))
-                    driver.execute_script("arguments[0].style.display = 'none';", dot_element)
-                    self.stdout.write("SUCCESS (Attempted): Dot element's display set to 'none' via JavaScript using confirmed XPath.")
-                    self.stdout.write("NOTE: This method is often ineffective for elements drawn on a canvas, the dot may still be visible in the screenshot.")
-                    time.sleep(1)
+                    event = record_cycle(capture, current_time)
+                    self.stdout.write(f"[{capture.region.key}] Live cycle event {event.pk} recorded.")
                 except Exception as e:
-                    self.stdout.write(f"FAILED to hide dot via JavaScript at XPath '{self.BLUE_DOT_XPATH}': {e}.")
-                    self.stdout.write("The element might not be present by this XPath, or another issue occurred. Trying fallback interactive methods (ESC key only)...")
-
-                    try:
-                        self.stdout.write("Fallback: Trying to press ESC key.")
-                        ActionChains(driver).send_keys(Keys.ESCAPE).perform()
-                        self.stdout.write("Pressed ESC key to dismiss dot.")
-                        time.sleep(1)
-                    except Exception as esc_e:
-                        self.stdout.write(f"Fallback (ESC key) failed: {esc_e}. The dot might still be visible.")
-                
-                time.sleep(2)
-
-                self.stdout.write(f"Taking full screenshot and saving to: {full_screenshot_path}")
-                driver.save_screenshot(full_screenshot_path)
-                self.stdout.write("Screenshot saved successfully.")
+                    self.stderr.write(self.style.ERROR(f"[{capture.region.key}] Error recording the live cycle event: {e}"))
 
-            except Exception as e:
-                self.stderr.write(self.style.ERROR(f"An unexpected error occurred during browser automation: {e}"))
-                self.stdout.write("Waiting 15 minutes before retry...\n")
-                time.sleep(900)
-                continue
-            finally:
-                if driver:
-                    driver.quit()
-                    self.stdout.write("Browser closed.")
 
-            # --- Image processing and initial analysis for ALL districts (runs once per 15-min cycle) ---
-            try:
-                image = Image.open(full_screenshot_path).convert("RGB")
-                if not (0 <= CROP_BOX[0] < CROP_BOX[2] <= image.width and
-                                 0 <= CROP_BOX[1] < CROP_BOX[3] <= image.height):
-                    self.stderr.write(self.style.ERROR("CROP_BOX coordinates are out of bounds. Skipping all district analysis for this run."))
-                    time.sleep(900)
-                    continue
-
-                cropped_image = image.crop(CROP_BOX)
-                cropped_image.save(cropped_screenshot_path)
-                self.stdout.write(f"Cropped Tamil Nadu image saved at: {cropped_screenshot_path}")
-
-                img_pil = cropped_image.convert("RGB")
-                img_np = np.array(img_pil)
-                height, width, _ = img_np.shape
-
-                final_min_lon = 74.80
-                final_max_lon = 80.37
-                final_min_lat = 7.98
-                final_max_lat = 13.53
-
-                transform = from_bounds(final_min_lon, final_min_lat, final_max_lon, final_max_lat, width, height)
-
-                windy_legend = {
-                    (42, 88, 142): "1.5 mm - Blue", (49, 152, 158): "2 mm - Cyan",
-                    (58, 190, 140): "3 mm - Aqua Green", (109, 207, 102): "7 mm - Lime",
-                    (192, 222, 72): "10 mm - Yellow Green", (241, 86, 59): "20 mm - Red",
-                    (172, 64, 112): "30 mm - Purple"
-                }
-
-                def match_color_robust(rgb_pixel, legend, max_tolerance=60):
-                    best_match_label = None
-                    min_distance = float('inf')
-                    for legend_color_rgb, label in legend.items():
-                        distance = ((rgb_pixel[0] - legend_color_rgb[0])**2 +
-                                    (rgb_pixel[1] - legend_color_rgb[1])**2 +
-                                    (rgb_pixel[2] - legend_color_rgb[2])**2)**0.5
-                        if distance <= max_tolerance and distance < min_distance:
-                            min_distance = distance
-                            best_match_label = label
-                    return best_match_label
-
-                for district_name in all_tn_districts:
-                    self.stdout.write(f"\nProcessing district: {district_name} for initial analysis and DB save...")
-
-                    district_masked_folder = os.path.join(base_folder, "masked_cropped", district_name.replace(" ", "_"))
-                    os.makedirs(district_masked_folder, exist_ok=True)
-                    masked_cropped_path = os.path.join(district_masked_folder, f"{timestamp_str}_{district_name.lower().replace(' ', '_')}_masked.png")
-                    
-                    current_district_gdf = tamil_nadu_gdf[tamil_nadu_gdf['NAME_2'] == district_name]
-
-                    if current_district_gdf.empty:
-                        self.stderr.write(self.style.WARNING(f"Warning: {district_name} not found in the filtered Tamil Nadu shapefile data. Skipping."))
-                        continue
-
-                    district_polygon = unary_union(current_district_gdf.geometry.to_list())
-
-                    mask = rasterize(
-                        [district_polygon],
-                        out_shape=(height, width),
-                        transform=transform,
-                        fill=0,
-                        all_touched=True,
-                        dtype=np.uint8
-                    )
-
-                    transparent_image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-                    original_rgba_image = cropped_image.convert("RGBA")
-                    original_rgba_np = np.array(original_rgba_image)
-
-                    for y in range(height):
-                        for x in range(width):
-                            if mask[y, x]:
-                                r, g, b, a = original_rgba_np[y, x]
-                                if a > 0: 
-                                    transparent_image.putpixel((x, y), (r, g, b, 255))
-
-                    transparent_image.save(masked_cropped_path)
-                    self.stdout.write(f"Masked image of {district_name} saved at: {masked_cropped_path}")
-
-                    image_district_for_analysis = transparent_image.convert('RGB')
-                    pixels_to_analyze = list(image_district_for_analysis.getdata())
-                    
-                    matched_colors = set()
-                    for pixel_color in pixels_to_analyze:
-                        if pixel_color != (0, 0, 0): 
-                            label = match_color_robust(pixel_color, windy_legend, max_tolerance=60)
-                            if label:
-                                matched_colors.add(label)
-
-                    # Use the rounded 'current_time' for the database
-                    timestamp_for_db = current_time 
-                    color_text = ", ".join(sorted(matched_colors)) if matched_colors else "No significant cloud levels found for precipitation"
-                    self.stdout.write(f"Analysis for {district_name}: {color_text}")
-
-                    try:
-                        CloudAnalysis.objects.create(
-                            city=district_name,
-                            values=color_text,
-                            type="Weather radar",
-                            timestamp=timestamp_for_db
-                        )
-                        self.stdout.write(self.style.SUCCESS(f"Cloud analysis for {district_name} saved to database."))
-                    except Exception as e:
-                        self.stderr.write(self.style.ERROR(f"Error saving {district_name} to Django model: {e}"))
-
-                    district_data_for_post_collection = { 
-                        "city": district_name,
-                        "values": color_text,
-                        "type": "Weather radar",
-                        # Format for JSON/API as desired, using the rounded time
-                        "timestamp": timestamp_for_db.strftime('%Y-%m-%d %H:%M:%S') 
-                    }
-                    current_run_results.append(district_data_for_post_collection)
-            
-            except Exception as e:
-                self.stderr.write(self.style.ERROR(f"Error during initial image processing or shapefile handling for all districts: {e}"))
-                self.stdout.write("Waiting 15 minutes before retry...\n")
-                time.sleep(900)
-                continue
-
-
-            # --- Save the collected JSON data locally (once per 15-min cycle) ---
+            # --- Save the collected JSON data locally (once per 15-min cycle, next to each region's images) ---
             json_filename = f"cloud_analysis_results_{timestamp_str}.json"
-            json_output_path = os.path.join(base_folder, json_filename)
-            json_output_content = json.dumps(current_run_results, indent=4)
-            try:
-                with open(json_output_path, "w") as json_file:
-                    json_file.write(json_output_content)
-                self.stdout.write(self.style.SUCCESS(f"All initial analysis results for this 15-min cycle saved to JSON at: {json_output_path}"))
-            except Exception as e:
-                self.stderr.write(self.style.ERROR(f"Error saving full cycle JSON file: {e}"))
-
-            # --- Generate and Save PDF Report for this cycle ---
-            self.stdout.write("Generating PDF report for this run...")
-            try:
-                # Pass the rounded current_time to PDF generation
-                self._generate_and_save_automation_pdf(
-                    current_run_results,
-                    current_time, 
-                    base_folder,
-                    full_screenshot_path,
-                    cropped_screenshot_path,
-                    json_output_content
-                )
-                pdf_output_filename_for_message = f"automation_report_{current_time.strftime('%Y%m%d_%H%M%S')}.pdf"
-                pdf_full_path_for_message = os.path.join(base_folder, pdf_output_filename_for_message)
-                self.stdout.write(self.style.SUCCESS(f"PDF report generated and saved successfully to: {pdf_full_path_for_message}"))
-            except Exception as e:
-                self.stderr.write(self.style.ERROR(f"Error generating PDF report for this run: {e}"))
+            for capture in captures:
+                json_output_path = os.path.join(capture.region.capture_folder(timestamp_str), json_filename)
+                try:
+                    with open(json_output_path, "w") as json_file:
+                        json_file.write(json.dumps(capture.results, indent=4))
+                    self.stdout.write(self.style.SUCCESS(f"[{capture.region.key}] Analysis results for this 15-min cycle saved to JSON at: {json_output_path}"))
+                except Exception as e:
+                    self.stderr.write(self.style.ERROR(f"[{capture.region.key}] Error saving full cycle JSON file: {e}"))
+
+            # Regions sharing an endpoint are sent in one request
+            results_by_endpoint = {}
+            for capture in captures:
+                results_by_endpoint.setdefault(kwargs['publish_url'] or capture.region.api_endpoint_url, []).extend(capture.published_results())
 
             # --- Remaining Code ---
             num_post_attempts = 3
@@ -399,43 +275,29 @@ class Command(BaseCommand):
             for i in range(num_post_attempts):
                 self.stdout.write(f"\n--- URL PUSHING CYCLE {i + 1} of {num_post_attempts} (using data from this 15-min screenshot) ---")
                 
-                if self.API_ENDPOINT_URL and current_run_results:
-                    self.stdout.write(f"Attempting to send ALL analysis data to {self.API_ENDPOINT_URL} via POST (Cycle {i+1})...")
-                    
-                    headers = {
-                        'Content-Type': 'application/json',
-                    }
-
-                    try:
-                        self.stdout.write(f"Sending JSON payload: {json.dumps(current_run_results, indent=4)}")
-                        response = requests.post(self.API_ENDPOINT_URL, json=current_run_results, headers=headers, timeout=30)
-                        response.raise_for_status()
-
-                        self.stdout.write(self.style.SUCCESS(f"Data successfully POSTed to {self.API_ENDPOINT_URL} (Cycle {i+1})."))
-                        self.stdout.write(f"API Response Status Code: {response.status_code}")
+                with watchdog.stage(f'publish {i + 1}'):
+                    for api_endpoint_url, current_run_results in results_by_endpoint.items():
+                        self._post_results(api_endpoint_url, current_run_results, i + 1)
+
+                    # --- Automation PDF for this cycle: optional, and only once the data is out ---
+                    for capture in captures:
+                        if i != 0 or not kwargs['automation_pdf'] or capture.frame is None:
+                            continue
                         try:
-                            self.stdout.write(f"API Response JSON: {response.json()}")
-                        except json.JSONDecodeError:
-                            self.stdout.write(f"API Response Text: {response.text}")
-                    except requests.exceptions.HTTPError as http_err:
-                        self.stderr.write(self.style.ERROR(f"HTTP error during POST request (Cycle {i+1}): {http_err}"))
-                        if http_err.response:
-                            self.stderr.write(self.style.ERROR(f"Response from API (Cycle {i+1}): {http_err.response.text}"))
-                    except requests.exceptions.ConnectionError as conn_err:
-                        self.stderr.write(self.style.ERROR(f"Connection error during POST request (Cycle {i+1}, Is the server at {self.API_ENDPOINT_URL} reachable and port open?): {conn_err}"))
-                    except requests.exceptions.Timeout as timeout_err:
-                        self.stderr.write(self.style.ERROR(f"Timeout error during POST request (Cycle {i+1}, API took too long to respond): {timeout_err}"))
-                    except requests.exceptions.RequestException as req_err:
-                        self.stderr.write(self.style.ERROR(f"An unexpected error occurred during POST request (Cycle {i+1}): {req_err}"))
-                else:
-                    if not self.API_ENDPOINT_URL:
-                        self.stdout.write(self.style.WARNING(f"API_ENDPOINT_URL is not set. Skipping POST request (Cycle {i+1})."))
-                    if not current_run_results:
-                        self.stdout.write(self.style.WARNING(f"No analysis results to send. Skipping POST request (Cycle {i+1})."))
-                
+                            pdf_path = get_automation_report(capture.frame)
+                            self.stdout.write(self.style.SUCCESS(f"[{capture.region.key}] PDF report generated and saved successfully to: {pdf_path}"))
+                        except Exception as e:
+                            self.stderr.write(self.style.ERROR(f"[{capture.region.key}] Error generating PDF report for this run: {e}"))
+
                 if i < num_post_attempts - 1:
                     self.stdout.write(f"Inner loop (URL Pushing): Waiting {post_interval_seconds // 60} minutes before next URL push (Cycle {i+2})...\n")
-                    time.sleep(post_interval_seconds)
+                    self.clock.sleep(post_interval_seconds)
             self.stdout.write("\nFinished all URL pushing cycles for this 15-minute data set.")
-            self.stdout.write("Waiting 15 minutes before starting a new full run (fresh screenshot and analysis)....\n")
-            time.sleep(900)
\ No newline at end of file
+            # Drop this cycle's captures (images, analyses) before measuring what survives it
+            del captures, current_run_analyses, results_by_endpoint
+            self._end_cycle(watchdog, cycle_started, current_time)
+            if not last_cycle:
+                self.stdout.write("Waiting 15 minutes before starting a new full run (fresh screenshot and analysis)....\n")
+                self.clock.sleep(900)
+
+        self._replay_summary()
\ No newline at end of file
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+from weather.export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, parquet_available, stream_export
+from weather.filters import CLOUD_API_FIELDS, filter_cloud_analysis, requested_fields
+from weather.models import CloudAnalysis
+import sys
+
+
+class Command(BaseCommand):
+    help = 'Streams CloudAnalysis history to a file (or stdout) as NDJSON, CSV or Parquet with constant memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', default='ndjson', choices=list(EXPORT_FORMATS), help="Output format (default: ndjson).")
+        parser.add_argument('--output', '-o', help="Output file path. Defaults to stdout.")
+        parser.add_argument('--region', help="Comma-separated region keys.")
+        parser.add_argument('--type', dest='analysis_type', help="Comma-separated layer names (e.g. 'Weather radar').")
+        parser.add_argument('--city', help="Comma-separated district names.")
+        parser.add_argument('--start', help="ISO date or datetime (inclusive).")
+        parser.add_argument('--end', help="ISO date or datetime (exclusive; a date includes that whole day).")
+        parser.add_argument('--class', dest='precip_class', help="Comma-separated class numbers or legend labels.")
+        parser.add_argument('--fields', help=f"Comma-separated subset of: {', '.join(CLOUD_API_FIELDS)}.")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help="Rows fetched per query.")
+
+    def handle(self, **options):
+        if options['format'] == 'parquet' and not parquet_available():
+            raise CommandError("Parquet export requires pyarrow, which is not installed.")
+
+        params = {
+            key: options[option]
+            for key, option in (('region', 'region'), ('type', 'analysis_type'), ('city', 'city'), ('start', 'start'), ('end', 'end'),
+                                ('class', 'precip_class'), ('fields', 'fields'))
+            if options[option]
+        }
+        try:
+            fields = requested_fields(params)
+            queryset = filter_cloud_analysis(CloudAnalysis.objects.all(), params)
+        except ValidationError as e:
+            raise CommandError(f"Invalid filter: {e.detail}")
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        written = 0
+        try:
+            for block in stream_export(queryset, fields, options['format'], options['chunk_size']):
+                output.write(block)
+                written += len(block)
+        finally:
+            if options['output']:
+                output.close()
+
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Exported {written} bytes of {options['format']} to {options['output']}"))
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Stacks only the frame renderers, the capture daemon and the exports need. None of them
+# should be loaded by starting Django and resolving the URLconf.
+HEAVY_MODULES = ('geopandas', 'matplotlib', 'sklearn', 'rasterio', 'shapely', 'pandas', 'pyarrow',
+                 'scipy', 'selenium', 'playwright', 'xhtml2pdf')
+
+# Run in a fresh interpreter: boots Django like a worker does (settings, apps, URLconf)
+# and reports the elapsed time and which heavy modules ended up imported.
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed, 'heavy': [m for m in %r if m in sys.modules]}))
+"""
+
+
+class Command(BaseCommand):
+    help = 'Measures Django process startup (setup + URLconf) in fresh interpreters and lists heavy imports it pulls in.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters to time (default 5).")
+        parser.add_argument('--top', type=int, default=0, help="Also list the N slowest imports (python -X importtime).")
+        parser.add_argument('--strict', action='store_true', help="Fail if startup imports any heavy module.")
+
+    def _run(self, *python_args):
+        result = subprocess.run(
+            [sys.executable, *python_args, '-c', STARTUP_SCRIPT % (HEAVY_MODULES,)],
+            capture_output=True, text=True, env=os.environ.copy(),
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Startup failed:\n{result.stderr.strip()}")
+        return result
+
+    def handle(self, **options):
+        samples = []
+        heavy = []
+        for _ in range(max(options['runs'], 1)):
+            measurement = json.loads(self._run().stdout.strip().splitlines()[-1])
+            samples.append(measurement['seconds'])
+            heavy = measurement['heavy']
+
+        self.stdout.write(
+            f"Startup over {len(samples)} runs: median {statistics.median(samples):.3f}s, "
+            f"min {min(samples):.3f}s, max {max(samples):.3f}s."
+        )
+
+        if options['top']:
+            # importtime lines: "import time: self [us] | cumulative | imported package"
+            imports = []
+            for line in self._run('-X', 'importtime').stderr.splitlines():
+                parts = line.split('|')
+                if line.startswith('import time:') and len(parts) == 3 and parts[1].strip().isdigit():
+                    imports.append((int(parts[1]), parts[2].strip()))
+            self.stdout.write("Slowest imports (cumulative):")
+            for cumulative_us, module in sorted(imports, reverse=True)[:options['top']]:
+                self.stdout.write(f"  {cumulative_us / 1000:8.1f} ms  {module}")
+
+        if heavy:
+            message = f"Heavy modules imported at startup: {', '.join(heavy)}."
+            if options['strict']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("No heavy modules imported at startup."))
@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import signal
+import threading
+import time
+from weather.replay import STUB_HOST, STUB_PORT
+
+
+class Command(BaseCommand):
+    help = ('Runs a local stand-in for the results API, for replay load tests: accepts the JSON POSTs of '
+            '"cloud_analysis --publish-url" / "analysis_worker --publish-url", counts them and can simulate slow or failing responses.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=STUB_HOST)
+        parser.add_argument('--port', type=int, default=STUB_PORT)
+        parser.add_argument('--delay', type=float, default=0.0, help="Seconds to wait before answering each POST.")
+        parser.add_argument('--fail-every', type=int, default=0, help="Answer every Nth POST with 503 (0: never).")
+        parser.add_argument('--quiet', action='store_true', help="Only print the totals when stopped.")
+
+    def _stop(self, signum, frame):
+        raise KeyboardInterrupt
+
+    def handle(self, **options):
+        command = self
+        lock = threading.Lock()
+        totals = {'posts': 0, 'results': 0, 'failed': 0, 'bytes': 0}
+
+        class StubHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass # Each POST is summarised below instead
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                try:
+                    results = json.loads(body or b'[]')
+                except ValueError:
+                    self._reply(400, {'error': 'Body is not JSON.'})
+                    return
+                if options['delay']:
+                    time.sleep(options['delay'])
+
+                with lock:
+                    totals['posts'] += 1
+                    post_number = totals['posts']
+                    fail = options['fail_every'] and post_number % options['fail_every'] == 0
+                    if fail:
+                        totals['failed'] += 1
+                    else:
+                        totals['results'] += len(results) if isinstance(results, list) else 1
+                        totals['bytes'] += len(body)
+                if not options['quiet']:
+                    slots = sorted({r.get('timestamp') for r in results if isinstance(r, dict)}) if isinstance(results, list) else []
+                    command.stdout.write(f"POST {post_number} {self.path}: {len(results) if isinstance(results, list) else 1} results "
+                                         f"for {', '.join(slots) or '-'}{' -> 503' if fail else ''}")
+                if fail:
+                    self._reply(503, {'error': 'Simulated failure.'})
+                else:
+                    self._reply(200, {'received': len(results) if isinstance(results, list) else 1, 'post': post_number})
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        server = ThreadingHTTPServer((options['host'], options['port']), StubHandler)
+        self.stdout.write(self.style.SUCCESS(f"Publish stub listening on http://{options['host']}:{options['port']}/ (Ctrl-C to stop)."))
+        started = time.monotonic()
+        signal.signal(signal.SIGTERM, self._stop) # Stopped like Ctrl-C by a load-test script
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Publish stub: {totals['posts']} POSTs ({totals['failed']} failed on purpose), {totals['results']} results, "
+            f"{totals['bytes'] / 1024:.1f} KiB in {elapsed:.1f}s."
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils.dateparse import parse_date
+from weather.models import CloudAnalysis
+from weather.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the hourly and daily per-district rollups from CloudAnalysis history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="First day to rebuild (YYYY-MM-DD). Defaults to the oldest analysis.")
+        parser.add_argument('--until', help="Last day to rebuild (YYYY-MM-DD). Defaults to the newest analysis.")
+        parser.add_argument('--region', help="Only rebuild this region's rollups (weather.regions key). Defaults to all regions.")
+
+    def handle(self, **options):
+        analyses = CloudAnalysis.objects.all()
+        if options['region']:
+            analyses = analyses.filter(region=options['region'])
+        bounds = analyses.aggregate(first=Min('timestamp'), last=Max('timestamp'))
+        if bounds['first'] is None:
+            self.stdout.write(self.style.WARNING("No CloudAnalysis rows; nothing to rebuild."))
+            return
+
+        since = parse_date(options['since']) if options['since'] else bounds['first'].date()
+        until = parse_date(options['until']) if options['until'] else bounds['last'].date()
+        if since is None or until is None:
+            raise CommandError("--since and --until must be dates in YYYY-MM-DD format.")
+
+        self.stdout.write(f"Rebuilding {options['region'] or 'all'} rollups from {since} to {until}...")
+        written = rebuild_rollups(since, until, options['region'])
+        self.stdout.write(self.style.SUCCESS(f"Rollups rebuilt: {written} rows written."))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from weather.catalogue import parse_frame_folder_name, register_frame
+from weather.regions import all_regions
+import os
+
+
+class Command(BaseCommand):
+    help = 'Scans every region\'s capture root under MEDIA_ROOT and (re)builds the Frame catalogue entries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only scan folders captured on or after this date (YYYY-MM-DD).")
+        parser.add_argument('--build-class-rasters', action='store_true',
+                            help="Classify the cropped image and write class/precip_classes.png where missing.")
+        parser.add_argument('--region', help="Only scan this region's folders (weather.regions key).")
+
+    def handle(self, **options):
+        media_root = settings.MEDIA_ROOT
+        if not os.path.isdir(media_root):
+            self.stderr.write(self.style.ERROR(f"MEDIA_ROOT does not exist: {media_root}"))
+            return
+
+        since = options.get('since')
+        registered = skipped = 0
+
+        for region in all_regions():
+            if options['region'] and region.key != options['region']:
+                continue
+            capture_root = region.capture_root()
+            if not os.path.isdir(capture_root):
+                continue
+
+            for folder_name in sorted(os.listdir(capture_root)):
+                folder_path = os.path.join(capture_root, folder_name)
+                timestamp = parse_frame_folder_name(folder_name)
+                if timestamp is None or not os.path.isdir(folder_path):
+                    continue
+                if since and folder_name < since:
+                    continue
+
+                try:
+                    frame = register_frame(folder_path, timestamp, build_class_raster=options['build_class_rasters'],
+                                           region=region.key)
+                except Exception as e:
+                    self.stderr.write(self.style.ERROR(f"Error registering {region.key}/{folder_name}: {e}"))
+                    skipped += 1
+                    continue
+
+                if not frame.cropped_path:
+                    self.stdout.write(self.style.WARNING(f"{region.key}/{folder_name}: no cropped image, registered without artifacts."))
+                registered += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Frame catalogue updated: {registered} folders registered, {skipped} failed."))
@@ -0,0 +1,196 @@
+# weather/memwatch.py
+#
+# Memory instrumentation for the long-running capture daemon (manage.py cloud_analysis):
+# current and peak RSS per stage of a cycle, optional tracemalloc snapshots diffed between
+# cycles (top growth sites), all appended to a log file, plus an RSS threshold after which
+# the daemon restarts itself between cycles.
+
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+_PROC_STATUS = '/proc/self/status'
+_PROC_CLEAR_REFS = '/proc/self/clear_refs'
+
+
+def _proc_status_kb(field):
+    try:
+        with open(_PROC_STATUS) as status_file:
+            for line in status_file:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (None where neither /proc nor psutil is available)."""
+    rss_kb = _proc_status_kb('VmRSS')
+    if rss_kb is not None:
+        return rss_kb / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def peak_rss_mb():
+    """High-water mark of the RSS in MB, since the last reset_peak_rss() where the kernel supports it."""
+    peak_kb = _proc_status_kb('VmHWM')
+    if peak_kb is None:
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            peak_kb /= 1024 # bytes there
+    return peak_kb / 1024
+
+
+def reset_peak_rss():
+    """Resets the kernel's RSS high-water mark (Linux 4.0+). Returns False where that is unsupported."""
+    try:
+        with open(_PROC_CLEAR_REFS, 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _format_mb(value):
+    return 'n/a' if value is None else f"{value:.1f} MB"
+
+
+class MemoryWatchdog:
+    """
+    Per-cycle memory report for the daemon.
+
+    Wrap each stage of a cycle in `with watchdog.stage('capture'):` and call
+    `end_cycle()` once the cycle is done; it logs the stage table and, with tracemalloc
+    enabled, the allocation sites that grew most since the previous cycle.
+
+    Args:
+        log_path (str): File the reports are appended to (None: stdout only).
+        tracemalloc_frames (int): Traceback depth kept by tracemalloc; 0 disables it
+            (it slows allocation-heavy code, so it is meant for leak hunts).
+        top (int): Growth sites listed per cycle.
+        restart_rss_mb (float): RSS above which restart_due becomes True (None: never).
+        write (callable): Receives each report line as well (e.g. the command's stdout.write).
+    """
+
+    def __init__(self, log_path=None, tracemalloc_frames=0, top=10, restart_rss_mb=None, write=None):
+        self.log_path = log_path
+        self.tracemalloc_frames = tracemalloc_frames
+        self.top = top
+        self.restart_rss_mb = restart_rss_mb
+        self.write = write
+        self.cycle = 0
+        self.restart_due = False
+        self._stages = []
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._peak_resettable = reset_peak_rss()
+
+        if tracemalloc_frames and not tracemalloc.is_tracing():
+            tracemalloc.start(tracemalloc_frames)
+        if log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+
+    def _log(self, lines):
+        if self.write:
+            for line in lines:
+                self.write(line)
+        if self.log_path:
+            with self._lock, open(self.log_path, 'a') as log_file:
+                log_file.write('\n'.join(lines) + '\n')
+
+    @contextmanager
+    def stage(self, name):
+        """Records RSS after the stage, its change, and the peak reached while it ran."""
+        rss_before = current_rss_mb()
+        if self._peak_resettable:
+            reset_peak_rss()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            rss_after = current_rss_mb()
+            self._stages.append({
+                'stage': name,
+                'rss': rss_after,
+                'delta': None if rss_before is None or rss_after is None else rss_after - rss_before,
+                # Without a resettable high-water mark this is the peak since the process started
+                'peak': peak_rss_mb(),
+                'traced_peak': tracemalloc.get_traced_memory()[1] / (1024 * 1024) if tracemalloc.is_tracing() else None,
+            })
+
+    def _growth_lines(self):
+        if not tracemalloc.is_tracing():
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        previous, self._snapshot = self._snapshot, snapshot
+        if previous is None:
+            return [f"  tracemalloc: baseline snapshot taken ({self.tracemalloc_frames} frames)."]
+        group_by = 'traceback' if self.tracemalloc_frames > 1 else 'lineno'
+        growth = [stat for stat in snapshot.compare_to(previous, group_by) if stat.size_diff > 0][:self.top]
+        lines = [f"  Top {len(growth)} allocation growth sites since the previous cycle:"]
+        for stat in growth:
+            frame = stat.traceback[0]
+            lines.append(f"    +{stat.size_diff / 1024:9.1f} KiB  +{stat.count_diff:6d} blocks  {frame.filename}:{frame.lineno}")
+        return lines
+
+    def end_cycle(self):
+        """Logs the cycle's stages and growth sites. Returns True once RSS exceeds the restart threshold."""
+        self.cycle += 1
+        rss = current_rss_mb()
+        lines = [f"[{datetime.now():%Y-%m-%d %H:%M:%S}] Memory after cycle {self.cycle} (pid {os.getpid()}): "
+                 f"RSS {_format_mb(rss)}, peak {_format_mb(peak_rss_mb())}"]
+        for entry in self._stages:
+            delta = 'n/a' if entry['delta'] is None else f"{entry['delta']:+.1f} MB"
+            line = f"  {entry['stage']:<12} RSS {_format_mb(entry['rss'])} ({delta}), peak {_format_mb(entry['peak'])}"
+            if entry['traced_peak'] is not None:
+                line += f", traced peak {entry['traced_peak']:.1f} MB"
+            lines.append(line)
+        self._stages = []
+        lines.extend(self._growth_lines())
+
+        if self.restart_rss_mb and rss is not None and rss > self.restart_rss_mb:
+            self.restart_due = True
+            lines.append(f"  RSS {rss:.1f} MB is above the {self.restart_rss_mb} MB threshold; restarting before the next cycle.")
+        self._log(lines)
+        return self.restart_due
+
+
+def with_option(argv, option, value):
+    """`argv` with every '--option X' / '--option=X' replaced by a single '--option=value'."""
+    args = []
+    skip_value = False
+    for arg in argv:
+        if skip_value:
+            skip_value = False
+        elif arg == option:
+            skip_value = True
+        elif not arg.startswith(f"{option}="):
+            args.append(arg)
+    return args + [f"{option}={value}"]
+
+
+def restart_process(argv=None):
+    """
+    Replaces this process with a fresh run of `argv` (default: the same command line),
+    keeping the pid. Callers whose progress lives in their options (cycles left, replay
+    position) pass the command line rewritten with with_option().
+    """
+    from django.db import connections
+
+    connections.close_all()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execv(sys.executable, [sys.executable] + (sys.argv if argv is None else argv))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0002_alter_cloudanalysis_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Frame',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(unique=True)),
+                ('folder', models.CharField(max_length=255)),
+                ('full_path', models.CharField(blank=True, max_length=255)),
+                ('cropped_path', models.CharField(blank=True, max_length=255)),
+                ('class_path', models.CharField(blank=True, max_length=255)),
+                ('content_hash', models.CharField(blank=True, max_length=64)),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['timestamp'],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:46
+
+from django.db import migrations, models
+
+from weather.precipitation import labels_to_mask, max_class_from_mask
+
+
+def backfill_precipitation_fields(apps, schema_editor):
+    # There are at most 2**7 distinct label combinations, so update per distinct string.
+    CloudAnalysis = apps.get_model('weather', 'CloudAnalysis')
+    for values_text in CloudAnalysis.objects.values_list('values', flat=True).distinct():
+        mask = labels_to_mask(values_text)
+        if mask:
+            CloudAnalysis.objects.filter(values=values_text).update(
+                precip_mask=mask,
+                max_class=max_class_from_mask(mask),
+                has_precipitation=True,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0003_frame'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cloudanalysis',
+            name='has_precipitation',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='cloudanalysis',
+            name='max_class',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cloudanalysis',
+            name='precip_mask',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='cloudanalysis',
+            index=models.Index(fields=['city', 'timestamp'], name='cloudanalysis_city_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cloudanalysis',
+            index=models.Index(fields=['timestamp'], name='cloudanalysis_ts_idx'),
+        ),
+        migrations.RunPython(backfill_precipitation_fields, migrations.RunPython.noop),
+    ]
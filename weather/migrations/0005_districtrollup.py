@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0004_cloudanalysis_precipitation_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistrictRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=50)),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('period_start', models.DateTimeField()),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('max_class', models.PositiveSmallIntegerField(default=0)),
+                ('precip_minutes', models.PositiveIntegerField(default=0)),
+                ('class_1_count', models.PositiveIntegerField(default=0)),
+                ('class_2_count', models.PositiveIntegerField(default=0)),
+                ('class_3_count', models.PositiveIntegerField(default=0)),
+                ('class_4_count', models.PositiveIntegerField(default=0)),
+                ('class_5_count', models.PositiveIntegerField(default=0)),
+                ('class_6_count', models.PositiveIntegerField(default=0)),
+                ('class_7_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularity', 'period_start'], name='districtrollup_period_idx')],
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'city', 'period_start'), name='districtrollup_unique_period')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0005_districtrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cloudanalysis',
+            name='region',
+            field=models.CharField(default='tamil_nadu', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='frame',
+            name='region',
+            field=models.CharField(default='tamil_nadu', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='frame',
+            name='timestamp',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name='cloudanalysis',
+            index=models.Index(fields=['region', 'timestamp'], name='cloudanalysis_region_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='frame',
+            index=models.Index(fields=['timestamp'], name='frame_ts_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='frame',
+            constraint=models.UniqueConstraint(fields=('region', 'timestamp'), name='frame_region_ts_unique'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0006_frame_region'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='frame',
+            name='retention_tier',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Full'), (1, 'Compact'), (2, 'Downsampled')], default=0),
+        ),
+        migrations.AddIndex(
+            model_name='frame',
+            index=models.Index(fields=['retention_tier', 'timestamp'], name='frame_tier_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0008_analysisjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Zone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zone_set', models.CharField(max_length=50)),
+                ('region', models.CharField(max_length=50)),
+                ('index', models.PositiveIntegerField()),
+                ('name', models.CharField(max_length=100)),
+                ('parent', models.CharField(blank=True, max_length=100)),
+                ('lat', models.FloatField()),
+                ('lon', models.FloatField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('zone_set', 'region', 'index'), name='zone_set_index_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ZoneStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('max_class', models.PositiveSmallIntegerField()),
+                ('precip_mask', models.PositiveSmallIntegerField()),
+                ('wet_permille', models.PositiveSmallIntegerField()),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='weather.zone')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['zone', 'timestamp'], name='zonestat_zone_ts_idx')],
+                'constraints': [models.UniqueConstraint(fields=('timestamp', 'zone'), name='zonestat_frame_zone_unique')],
+            },
+        ),
+    ]
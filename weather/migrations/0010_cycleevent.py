@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0009_zone_zonestat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CycleEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region', models.CharField(max_length=50)),
+                ('timestamp', models.DateTimeField()),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='cycleevent_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0010_cycleevent'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='districtrollup',
+            name='districtrollup_unique_period',
+        ),
+        migrations.AddField(
+            model_name='districtrollup',
+            name='region',
+            field=models.CharField(default='tamil_nadu', max_length=50),
+        ),
+        migrations.AddConstraint(
+            model_name='districtrollup',
+            constraint=models.UniqueConstraint(fields=('granularity', 'region', 'city', 'period_start'), name='districtrollup_unique_period'),
+        ),
+    ]
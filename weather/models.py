@@ -1,10 +1,246 @@
+import os
+
+from django.conf import settings
 from django.db import models
 
+from .precipitation import labels_to_mask, max_class_from_mask
+from .regions import DEFAULT_REGION_KEY
+
 class CloudAnalysis(models.Model):
     city = models.CharField(max_length=50)
-    values = models.CharField(max_length=255)
-    type = models.CharField(max_length=50, default="Weather radar")
+    values = models.CharField(max_length=255) # Legacy comma-separated labels, kept for API compatibility
+    type = models.CharField(max_length=50, default="Weather radar") # Layer name (weather.layers)
     timestamp = models.DateTimeField() # <-- REMOVED auto_now_add=True
+    region = models.CharField(max_length=50, default=DEFAULT_REGION_KEY) # weather.regions key
+
+    # Structured form of `values` (see weather.precipitation): bit (class - 1) set per class present.
+    precip_mask = models.PositiveSmallIntegerField(default=0)
+    max_class = models.PositiveSmallIntegerField(default=0)
+    has_precipitation = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['city', 'timestamp'], name='cloudanalysis_city_ts_idx'),
+            models.Index(fields=['timestamp'], name='cloudanalysis_ts_idx'),
+            models.Index(fields=['region', 'timestamp'], name='cloudanalysis_region_ts_idx'),
+        ]
 
     def __str__(self): 
-        return f"{self.city} - {self.values}"
\ No newline at end of file
+        return f"{self.city} - {self.values}"
+
+    def set_precipitation_from_values(self):
+        """
+        Derives precip_mask / max_class / has_precipitation from the legacy `values` string,
+        numbering classes by the legend of the row's layer (`type`, see weather.layers).
+        """
+        from .layers import layer_for_type
+
+        layer = layer_for_type(self.type)
+        self.precip_mask = labels_to_mask(self.values, layer.legend_labels if layer else None)
+        self.max_class = max_class_from_mask(self.precip_mask)
+        self.has_precipitation = self.precip_mask != 0
+
+    def save(self, *args, **kwargs):
+        self.set_precipitation_from_values()
+        super().save(*args, **kwargs)
+
+class Frame(models.Model):
+    """
+    Catalogue entry for one capture folder under MEDIA_ROOT.
+
+    Paths are relative to MEDIA_ROOT. Each region (weather.regions) has its own
+    frame per slot. The capture daemon registers each frame at ingest; `manage.py rescan_frames` (re)builds entries for existing folders.
+    `manage.py apply_retention` moves ageing frames down the retention tiers (weather.retention).
+    """
+    TIER_FULL = 0 # Everything the capture wrote
+    TIER_COMPACT = 1 # Crops and class rasters only
+    TIER_DOWNSAMPLED = 2 # Downsampled crops and class rasters only
+    RETENTION_TIER_CHOICES = [
+        (TIER_FULL, 'Full'),
+        (TIER_COMPACT, 'Compact'),
+        (TIER_DOWNSAMPLED, 'Downsampled'),
+    ]
+
+    region = models.CharField(max_length=50, default=DEFAULT_REGION_KEY) # weather.regions key
+    timestamp = models.DateTimeField() # Rounded capture time
+    folder = models.CharField(max_length=255)
+    full_path = models.CharField(max_length=255, blank=True)
+    cropped_path = models.CharField(max_length=255, blank=True)
+    class_path = models.CharField(max_length=255, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True) # sha256 of the cropped image
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    retention_tier = models.PositiveSmallIntegerField(choices=RETENTION_TIER_CHOICES, default=TIER_FULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['timestamp']
+        constraints = [
+            # One frame per region and slot; the unique index also serves per-region range queries.
+            models.UniqueConstraint(fields=['region', 'timestamp'], name='frame_region_ts_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['timestamp'], name='frame_ts_idx'),
+            # apply_retention picks the oldest frames still above a tier
+            models.Index(fields=['retention_tier', 'timestamp'], name='frame_tier_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"Frame {self.folder}"
+
+    def media_path(self, relative_path):
+        """Absolute filesystem path for one of this frame's relative paths ('' if unset)."""
+        return os.path.join(settings.MEDIA_ROOT, relative_path) if relative_path else ''
+
+
+class DistrictRollup(models.Model):
+    """
+    Per-district precipitation aggregate of one region for one hour or one day, maintained
+    incrementally at ingest (weather.rollups) and rebuildable with `manage.py rebuild_rollups`.
+    """
+    GRANULARITY_HOUR = 'hour'
+    GRANULARITY_DAY = 'day'
+    GRANULARITY_CHOICES = [(GRANULARITY_HOUR, 'Hour'), (GRANULARITY_DAY, 'Day')]
+
+    region = models.CharField(max_length=50, default=DEFAULT_REGION_KEY) # weather.regions key
+    city = models.CharField(max_length=50)
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    period_start = models.DateTimeField()
+    sample_count = models.PositiveIntegerField(default=0) # Capture cycles seen in this period
+    max_class = models.PositiveSmallIntegerField(default=0)
+    precip_minutes = models.PositiveIntegerField(default=0)
+    # Number of cycles in which each legend class (weather.precipitation) was present
+    class_1_count = models.PositiveIntegerField(default=0)
+    class_2_count = models.PositiveIntegerField(default=0)
+    class_3_count = models.PositiveIntegerField(default=0)
+    class_4_count = models.PositiveIntegerField(default=0)
+    class_5_count = models.PositiveIntegerField(default=0)
+    class_6_count = models.PositiveIntegerField(default=0)
+    class_7_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['granularity', 'region', 'city', 'period_start'], name='districtrollup_unique_period'),
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'period_start'], name='districtrollup_period_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.region}/{self.city} {self.granularity} {self.period_start:%Y-%m-%d %H:%M} (max class {self.max_class})"
+
+
+class AnalysisJob(models.Model):
+    """
+    Analysis of one captured layer of one region and slot, queued by the capture daemon
+    (`cloud_analysis --enqueue`) and leased by `manage.py analysis_worker` processes on
+    any host sharing MEDIA_ROOT and the database (weather.work_queue).
+
+    A running job holds a lease that its worker renews by heartbeat; a job whose lease
+    runs out (dead or stuck worker) or whose analysis fails is queued again until
+    `max_attempts` is reached.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    region = models.CharField(max_length=50) # weather.regions key
+    layer = models.CharField(max_length=50) # weather.layers key
+    timestamp = models.DateTimeField() # Rounded capture time
+    folder = models.CharField(max_length=255) # Capture folder, relative to MEDIA_ROOT
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0) # Leases taken so far
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    available_at = models.DateTimeField() # Not leased before this (retry backoff)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['region', 'layer', 'timestamp'], name='analysisjob_slot_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='analysisjob_claim_idx'),
+            models.Index(fields=['status', 'lease_expires_at'], name='analysisjob_lease_idx'),
+        ]
+
+    def __str__(self):
+        return f"Analysis {self.region}/{self.layer} {self.timestamp:%Y-%m-%d %H:%M} ({self.status})"
+
+
+class Zone(models.Model):
+    """
+    One zone of a zone set (weather.zones) in one region: a district, a taluk, an uploaded
+    polygon or a grid cell. `index` is the zone's value in the zone set's label raster.
+    """
+    zone_set = models.CharField(max_length=50) # weather.zones key
+    region = models.CharField(max_length=50) # weather.regions key
+    index = models.PositiveIntegerField()
+    name = models.CharField(max_length=100)
+    parent = models.CharField(max_length=100, blank=True) # Enclosing area (e.g. a taluk's district)
+    lat = models.FloatField() # Representative point (cell centre for grids)
+    lon = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['zone_set', 'region', 'index'], name='zone_set_index_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.zone_set}/{self.region} {self.parent + ' / ' if self.parent else ''}{self.name}"
+
+
+class ZoneStat(models.Model):
+    """
+    Precipitation in one zone at one capture, evaluated for all of a zone set's zones in one
+    pass per radar frame (weather.zones). Only zones with precipitation get a row.
+    """
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='stats')
+    timestamp = models.DateTimeField() # Rounded capture time
+    max_class = models.PositiveSmallIntegerField()
+    precip_mask = models.PositiveSmallIntegerField() # weather.precipitation bitmask
+    wet_permille = models.PositiveSmallIntegerField() # Thousandths of the zone's pixels with precipitation
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['timestamp', 'zone'], name='zonestat_frame_zone_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['zone', 'timestamp'], name='zonestat_zone_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.zone} {self.timestamp:%Y-%m-%d %H:%M} (max class {self.max_class})"
+
+
+class CycleEvent(models.Model):
+    """
+    One finished capture / analysis of a region's slot, as pushed to live dashboards
+    (weather.live). The auto-increment id orders the events and is what subscribers
+    resume from after a reconnect.
+    """
+    region = models.CharField(max_length=50) # weather.regions key
+    timestamp = models.DateTimeField() # Rounded capture time
+    payload = models.JSONField() # Results, frame URL and changed districts, as pushed
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='cycleevent_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Cycle event {self.pk}: {self.region} {self.timestamp:%Y-%m-%d %H:%M}"
@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CloudAnalysisCursorPagination(CursorPagination):
+    """Newest-first cursor pagination for /api/cloud/ (stable under concurrent inserts)."""
+    page_size = 500
+    page_size_query_param = 'page_size'
+    max_page_size = 5000
+    ordering = ('-timestamp', '-id')
+
+
+class DistrictRollupCursorPagination(CursorPagination):
+    """Newest-period-first cursor pagination for /api/cloud/rollups/."""
+    page_size = 500
+    page_size_query_param = 'page_size'
+    max_page_size = 5000
+    ordering = ('-period_start', '-id')
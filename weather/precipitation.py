@@ -0,0 +1,108 @@
+# weather/precipitation.py
+
+import numpy as np
+from PIL import Image
+
+# Windy radar legend: RGB colour -> precipitation label, ordered from lightest to heaviest.
+WINDY_LEGEND = {
+    (42, 88, 142): "1.5 mm - Blue", (49, 152, 158): "2 mm - Cyan",
+    (58, 190, 140): "3 mm - Aqua Green", (109, 207, 102): "7 mm - Lime",
+    (192, 222, 72): "10 mm - Yellow Green", (241, 86, 59): "20 mm - Red",
+    (172, 64, 112): "30 mm - Purple"
+}
+
+# Stored in CloudAnalysis.values when no legend colour matched inside a district.
+NO_PRECIP_MESSAGE = "No significant cloud levels found for precipitation"
+
+# Maximum RGB distance for a pixel to count as a legend colour (same as match_color_robust).
+MAX_COLOR_TOLERANCE = 60
+
+# Class 0 means "no precipitation"; legend entries are numbered 1..N in legend order.
+NO_PRECIP_CLASS = 0
+
+
+def classify_image(img_np, legend=WINDY_LEGEND, max_tolerance=MAX_COLOR_TOLERANCE):
+    """
+    Maps every pixel of an RGB array to a precipitation class.
+
+    Vectorised equivalent of the per-pixel nearest-colour match used by the capture
+    daemon: a pixel gets the class (1-based legend index) of the closest legend colour
+    within `max_tolerance`, otherwise class 0. Pure black pixels are always class 0.
+
+    Args:
+        img_np (np.ndarray): (H, W, 3) uint8 RGB image.
+
+    Returns:
+        np.ndarray: (H, W) uint8 class raster.
+    """
+    rgb = img_np[..., :3].astype(np.int32)
+    colours = np.array(list(legend.keys()), dtype=np.int32)
+
+    # Squared distance of every pixel to every legend colour: (H, W, N)
+    distances = ((rgb[:, :, None, :] - colours[None, None, :, :]) ** 2).sum(axis=-1)
+    nearest = distances.argmin(axis=-1)
+    nearest_distance = np.take_along_axis(distances, nearest[..., None], axis=-1)[..., 0]
+
+    classes = (nearest + 1).astype(np.uint8)
+    classes[nearest_distance > max_tolerance ** 2] = NO_PRECIP_CLASS
+    classes[(rgb == 0).all(axis=-1)] = NO_PRECIP_CLASS
+    return classes
+
+
+def save_class_raster(classes, path):
+    """Saves a class raster as a single-channel (mode 'L') PNG."""
+    Image.fromarray(classes).save(path, format="PNG")
+
+
+def load_class_raster(path):
+    """Loads a class raster written by save_class_raster as a (H, W) uint8 array."""
+    with Image.open(path) as img:
+        return np.array(img.convert('L'))
+
+
+# --- Compact encodings of a set of legend labels (stored on CloudAnalysis) ---
+LEGEND_LABELS = tuple(WINDY_LEGEND.values())
+_LABEL_TO_CLASS = {label.lower(): index + 1 for index, label in enumerate(LEGEND_LABELS)}
+
+
+def labels_to_mask(values_text, legend_labels=None):
+    """
+    Converts a CloudAnalysis.values string ("1.5 mm - Blue, 20 mm - Red") into a bitmask
+    where bit (class - 1) is set for every class present. Unknown labels are ignored.
+    `legend_labels` numbers the classes of another layer's legend (default: radar).
+    """
+    mask = 0
+    if not values_text:
+        return mask
+    label_to_class = _LABEL_TO_CLASS
+    if legend_labels is not None:
+        label_to_class = {label.lower(): index + 1 for index, label in enumerate(legend_labels)}
+    for label in values_text.split(','):
+        precip_class = label_to_class.get(label.strip().lower())
+        if precip_class:
+            mask |= 1 << (precip_class - 1)
+    return mask
+
+
+def classes_to_mask(precip_classes):
+    """Bitmask for an iterable of class numbers (class 0 is ignored)."""
+    mask = 0
+    for precip_class in precip_classes:
+        if precip_class:
+            mask |= 1 << (int(precip_class) - 1)
+    return mask
+
+
+def mask_to_classes(mask):
+    """Class numbers present in a bitmask, lightest first."""
+    return [index + 1 for index in range(len(LEGEND_LABELS)) if mask & (1 << index)]
+
+
+def mask_to_labels(mask):
+    """Legend labels present in a bitmask, lightest first."""
+    return [LEGEND_LABELS[precip_class - 1] for precip_class in mask_to_classes(mask)]
+
+
+def max_class_from_mask(mask):
+    """Heaviest class present in a bitmask (0 if none)."""
+    return mask.bit_length()
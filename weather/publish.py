@@ -0,0 +1,46 @@
+# weather/publish.py
+
+import json
+
+import requests
+
+
+def post_results(command, api_endpoint_url, current_run_results, cycle):
+    """
+    POSTs one batch of analysis results to a region's API endpoint, logging through the
+    management command that publishes them (the capture daemon or an analysis worker).
+    Errors are logged, never raised.
+    """
+    if api_endpoint_url and current_run_results:
+        command.stdout.write(f"Attempting to send analysis data to {api_endpoint_url} via POST (Cycle {cycle})...")
+        
+        headers = {
+            'Content-Type': 'application/json',
+        }
+
+        try:
+            command.stdout.write(f"Sending JSON payload: {json.dumps(current_run_results, indent=4)}")
+            response = requests.post(api_endpoint_url, json=current_run_results, headers=headers, timeout=30)
+            response.raise_for_status()
+
+            command.stdout.write(command.style.SUCCESS(f"Data successfully POSTed to {api_endpoint_url} (Cycle {cycle})."))
+            command.stdout.write(f"API Response Status Code: {response.status_code}")
+            try:
+                command.stdout.write(f"API Response JSON: {response.json()}")
+            except json.JSONDecodeError:
+                command.stdout.write(f"API Response Text: {response.text}")
+        except requests.exceptions.HTTPError as http_err:
+            command.stderr.write(command.style.ERROR(f"HTTP error during POST request (Cycle {cycle}): {http_err}"))
+            if http_err.response:
+                command.stderr.write(command.style.ERROR(f"Response from API (Cycle {cycle}): {http_err.response.text}"))
+        except requests.exceptions.ConnectionError as conn_err:
+            command.stderr.write(command.style.ERROR(f"Connection error during POST request (Cycle {cycle}, Is the server at {api_endpoint_url} reachable and port open?): {conn_err}"))
+        except requests.exceptions.Timeout as timeout_err:
+            command.stderr.write(command.style.ERROR(f"Timeout error during POST request (Cycle {cycle}, API took too long to respond): {timeout_err}"))
+        except requests.exceptions.RequestException as req_err:
+            command.stderr.write(command.style.ERROR(f"An unexpected error occurred during POST request (Cycle {cycle}): {req_err}"))
+    else:
+        if not api_endpoint_url:
+            command.stdout.write(command.style.WARNING(f"No API endpoint configured for these results. Skipping POST request (Cycle {cycle})."))
+        if not current_run_results:
+            command.stdout.write(command.style.WARNING(f"No analysis results to send. Skipping POST request (Cycle {cycle})."))
@@ -0,0 +1,181 @@
+# weather/regions.py
+
+import os
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+from .precipitation import WINDY_LEGEND
+
+DEFAULT_REGION_KEY = 'tamil_nadu'
+
+# GADM level-2 (district) boundaries for India; regions pick their state out of it.
+DEFAULT_SHAPEFILE_PATH = os.path.join(settings.BASE_DIR, 'weather', 'management', 'commands', 'gadm41_IND_2.json')
+
+
+class Region:
+    """
+    Everything needed to capture and georeference one area of the windy map.
+
+    Args:
+        key (str): Identifier stored on Frame / CloudAnalysis rows.
+        name (str): Display name.
+        map_view (tuple): (lat, lon, zoom) the windy map is opened at.
+        crop_box (tuple): (left, upper, right, lower) pixel box of the region in the screenshot.
+        bounds (tuple): (min_lon, min_lat, max_lon, max_lat) the cropped image covers.
+        state_names (tuple): Accepted spellings of the state in the shapefile's `state_field`.
+        legend (dict): RGB colour -> precipitation label used to classify the radar capture.
+        shapefile_path (str): District boundaries file; defaults to DEFAULT_SHAPEFILE_PATH.
+        api_endpoint_url (str): Where the daemon POSTs this region's results (None to skip).
+    """
+
+    def __init__(self, key, name, map_view, crop_box, bounds, state_names, legend=None,
+                 shapefile_path=None, state_field='NAME_1', district_field='NAME_2', api_endpoint_url=None):
+        self.key = key
+        self.name = name
+        self.map_view = tuple(map_view)
+        self.crop_box = tuple(crop_box)
+        self.bounds = tuple(bounds)
+        self.state_names = tuple(name.strip().lower() for name in state_names)
+        self.legend = legend or WINDY_LEGEND
+        self.shapefile_path = shapefile_path or DEFAULT_SHAPEFILE_PATH
+        self.state_field = state_field
+        self.district_field = district_field
+        self.api_endpoint_url = api_endpoint_url
+
+    def __repr__(self):
+        return f"Region({self.key!r})"
+
+    @property
+    def is_default(self):
+        return self.key == DEFAULT_REGION_KEY
+
+    @property
+    def legend_labels(self):
+        return tuple(self.legend.values())
+
+    @property
+    def extent(self):
+        """[min_lon, max_lon, min_lat, max_lat], as matplotlib's imshow expects."""
+        min_lon, min_lat, max_lon, max_lat = self.bounds
+        return [min_lon, max_lon, min_lat, max_lat]
+
+    def windy_url(self, layer='radar'):
+        lat, lon, zoom = self.map_view
+        return f"https://www.windy.com/-Weather-radar-radar?{layer},{lat:.3f},{lon:.3f},{zoom}"
+
+    def transform(self, width, height):
+        """Affine transform from pixel to lon/lat for a cropped image of this size."""
+        from rasterio.transform import from_bounds
+
+        min_lon, min_lat, max_lon, max_lat = self.bounds
+        return from_bounds(min_lon, min_lat, max_lon, max_lat, width, height)
+
+    def pixel_indices(self, lats, lons, width, height):
+        """
+        (rows, cols, inside) arrays locating lat/lon points in a cropped image of this size;
+        rows and cols are only meaningful where `inside` is True.
+        """
+        min_lon, min_lat, max_lon, max_lat = self.bounds
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        inside = (lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)
+        # Points on the east / south edge belong to the last column / row
+        cols = np.clip(np.floor((lons - min_lon) / (max_lon - min_lon) * width), 0, width - 1).astype(np.intp)
+        rows = np.clip(np.floor((max_lat - lats) / (max_lat - min_lat) * height), 0, height - 1).astype(np.intp)
+        return rows, cols, inside
+
+    def pixel_window(self, bbox, width, height):
+        """
+        (row_start, row_stop, col_start, col_stop) of the pixels a (min_lon, min_lat, max_lon,
+        max_lat) box touches in a cropped image of this size, or None if it misses the image.
+        """
+        min_lon, min_lat, max_lon, max_lat = self.bounds
+        box_min_lon, box_min_lat, box_max_lon, box_max_lat = bbox
+        x_scale = width / (max_lon - min_lon)
+        y_scale = height / (max_lat - min_lat)
+        col_start = max(int(np.floor((box_min_lon - min_lon) * x_scale)), 0)
+        col_stop = min(int(np.ceil((box_max_lon - min_lon) * x_scale)), width)
+        row_start = max(int(np.floor((max_lat - box_max_lat) * y_scale)), 0)
+        row_stop = min(int(np.ceil((max_lat - box_min_lat) * y_scale)), height)
+        if col_start >= col_stop or row_start >= row_stop:
+            return None
+        return row_start, row_stop, col_start, col_stop
+
+    def capture_root(self):
+        """Folder holding this region's capture folders. The default region keeps the original layout."""
+        if self.is_default:
+            return settings.MEDIA_ROOT
+        return os.path.join(settings.MEDIA_ROOT, 'regions', self.key)
+
+    def capture_folder(self, folder_name):
+        return os.path.join(self.capture_root(), folder_name)
+
+    def load_districts(self):
+        """The region's district geometries in EPSG:4326 (cached per process), or None."""
+        return _load_region_districts(self.key)
+
+    def district_names(self):
+        gdf = self.load_districts()
+        if gdf is None or self.district_field not in gdf.columns:
+            return []
+        return sorted(gdf[self.district_field].dropna().unique().tolist())
+
+
+# --- Registry ---
+_BUILTIN_REGIONS = {
+    DEFAULT_REGION_KEY: dict(
+        name='Tamil Nadu',
+        map_view=(10.950, 77.500, 7),
+        crop_box=(551, 170, 1065, 687),
+        bounds=(74.80, 7.98, 80.37, 13.53),
+        state_names=('TamilNadu', 'Tamil Nadu'),
+        api_endpoint_url="http://172.16.7.118:8003/api/tamilnadu/satellite/push.windy_radar_data.php",
+    ),
+}
+
+
+@lru_cache(maxsize=1)
+def _registry():
+    """
+    Built-in regions updated with settings.WEATHER_REGIONS, a dict of region key ->
+    Region keyword arguments. Entries for a built-in key override only the given fields.
+    """
+    definitions = {key: dict(options) for key, options in _BUILTIN_REGIONS.items()}
+    for key, options in getattr(settings, 'WEATHER_REGIONS', {}).items():
+        definitions.setdefault(key, {}).update(options)
+    return {key: Region(key, **options) for key, options in definitions.items()}
+
+
+def all_regions():
+    return list(_registry().values())
+
+
+def get_region(key=None):
+    """Region for `key` (the default region if empty). Raises KeyError for unknown keys."""
+    return _registry()[key or DEFAULT_REGION_KEY]
+
+
+def capture_regions():
+    """Regions the capture daemon collects each cycle (settings.CAPTURE_REGIONS, default region only by default)."""
+    return [get_region(key) for key in getattr(settings, 'CAPTURE_REGIONS', [DEFAULT_REGION_KEY])]
+
+
+@lru_cache(maxsize=None)
+def _load_region_districts(key):
+    import geopandas as gpd
+
+    region = get_region(key)
+    try:
+        if not os.path.exists(region.shapefile_path):
+            raise FileNotFoundError(f"Shapefile not found at {region.shapefile_path}.")
+        gdf = gpd.read_file(region.shapefile_path)
+        gdf_region = gdf[gdf[region.state_field].str.strip().str.lower().isin(region.state_names)].to_crs("EPSG:4326")
+        print(f"Shapefile loaded successfully for {region.name}.")
+        return gdf_region
+    except FileNotFoundError as fnfe:
+        print(f"CRITICAL ERROR: Shapefile (for {region.name}) not found: {fnfe}")
+    except Exception as e:
+        print(f"ERROR loading shapefile for {region.name}: {e}")
+    return None
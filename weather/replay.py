@@ -0,0 +1,86 @@
+# weather/replay.py
+#
+# Offline replay for load-testing the capture daemon (`cloud_analysis --replay`): archived
+# full screenshots stand in for fresh windy.com captures, and a simulated clock runs the
+# 15-minute cadence (and the daemon's other waits) many times faster than real time.
+
+import glob
+import itertools
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+
+from .catalogue import FULL_IMAGE_RELPATH
+
+# Where 'manage.py publish_stub' listens by default; replays publish there unless told otherwise
+STUB_HOST = '127.0.0.1'
+STUB_PORT = 8765
+STUB_PUBLISH_URL = f"http://{STUB_HOST}:{STUB_PORT}/"
+
+
+class SystemClock:
+    """Wall-clock time; what the daemon uses against live windy.com."""
+
+    def now(self):
+        return datetime.now()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class SimulatedClock:
+    """
+    Simulated time starting at `start` and running `speed` times faster than real time
+    (work included, so slow processing shows up as a growing backlog). speed=0 never
+    really sleeps: each sleep only moves the clock forward while work takes real time,
+    so a run measures raw throughput.
+    """
+
+    def __init__(self, start, speed=60.0):
+        self.speed = speed
+        self._start = start
+        self._real_start = time.monotonic()
+        self._skipped = timedelta() # Sleeps taken instantly (speed=0)
+        self._lock = threading.Lock()
+
+    def now(self):
+        elapsed = time.monotonic() - self._real_start
+        with self._lock:
+            return self._start + self._skipped + timedelta(seconds=elapsed * (self.speed or 1))
+
+    def sleep(self, seconds):
+        if self.speed:
+            time.sleep(seconds / self.speed)
+        else:
+            with self._lock:
+                self._skipped += timedelta(seconds=seconds)
+
+
+class ReplayBackend:
+    """
+    Capture backend that "screenshots" by copying archived full screenshots, one archived
+    frame per capture, cycling through the archive in capture-time order. Every layer of a
+    capture gets the same archived image.
+
+    Args:
+        archive_root (str): Folder holding capture folders (<root>/<slot>/full/windy_map_full.png).
+    """
+
+    def __init__(self, archive_root):
+        self.sources = sorted(glob.glob(os.path.join(archive_root, '*', FULL_IMAGE_RELPATH)))
+        if not self.sources:
+            raise ValueError(f"No archived screenshots ({FULL_IMAGE_RELPATH}) under {archive_root}.")
+        self._next_source = itertools.cycle(self.sources)
+        self._lock = threading.Lock()
+
+    def take_screenshots(self, capture, base_folder):
+        with self._lock:
+            source = next(self._next_source)
+        for layer in capture.layers:
+            full_screenshot_path = os.path.join(base_folder, layer.full_image_relpath)
+            os.makedirs(os.path.dirname(full_screenshot_path), exist_ok=True)
+            shutil.copyfile(source, full_screenshot_path)
+        capture.log(f"Replayed {source} as the {', '.join(layer.key for layer in capture.layers)} screenshot(s).")
+        return list(capture.layers)
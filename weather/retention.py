@@ -0,0 +1,153 @@
+# weather/retention.py
+#
+# Tiered retention of the capture archive. Frames move down one tier at a time, driven by
+# the catalogue (no directory scans):
+#
+#   Frame.TIER_FULL         everything the capture wrote
+#   Frame.TIER_COMPACT      full screenshots and per-district masked images removed;
+#                           crops, class rasters, results JSON and PDFs kept
+#   Frame.TIER_DOWNSAMPLED  crops and class rasters downsampled in place (same paths)
+#
+# Every step is idempotent and the tier is only recorded once a frame's files are done,
+# so an interrupted run leaves at most one frame half-processed, and the next run redoes it.
+
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from PIL import Image
+
+from .catalogue import CLASS_RASTER_RELPATH, register_frame
+from .models import Frame
+
+# Folders of a capture that the compact tier drops (full screenshots of every layer, masked images).
+COMPACT_REMOVED_DIRS = ('full', 'masked', 'masked_cropped')
+DOWNSAMPLED_DIRS = {'cropped': Image.LANCZOS, 'class': Image.NEAREST} # Class rasters keep exact class values
+
+DEFAULT_RETENTION = {
+    'full_days': 14, # Frames older than this are compacted (None: never)
+    'compact_days': 90, # Frames older than this are downsampled (None: never)
+    'downsample_factor': 4,
+}
+
+
+def retention_policy():
+    """DEFAULT_RETENTION updated with settings.IMAGE_RETENTION."""
+    return {**DEFAULT_RETENTION, **getattr(settings, 'IMAGE_RETENTION', {})}
+
+
+def _tree_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+    return total
+
+
+def _refresh_catalogue(frame, tier):
+    """Re-registers the frame (paths, size, content hash) and records its new tier."""
+    register_frame(frame.media_path(frame.folder), frame.timestamp, build_class_raster=True, region=frame.region)
+    Frame.objects.filter(pk=frame.pk).update(retention_tier=tier)
+
+
+def compact_frame(frame, dry_run=False):
+    """
+    Moves a full frame to the compact tier. The class raster is built first if the
+    capture never wrote one, so the crop and its classes always survive.
+
+    Returns:
+        int: Bytes removed (or that would be removed with dry_run).
+    """
+    folder_path = frame.media_path(frame.folder)
+    removed_paths = [os.path.join(folder_path, name) for name in COMPACT_REMOVED_DIRS]
+    removed_bytes = sum(_tree_size(path) for path in removed_paths if os.path.exists(path))
+    if dry_run:
+        return removed_bytes
+
+    if not os.path.exists(os.path.join(folder_path, CLASS_RASTER_RELPATH)):
+        register_frame(folder_path, frame.timestamp, build_class_raster=True, region=frame.region)
+    for path in removed_paths:
+        shutil.rmtree(path, ignore_errors=True)
+    _refresh_catalogue(frame, Frame.TIER_COMPACT)
+    return removed_bytes
+
+
+def _downsample_file(path, size, resample):
+    """Replaces `path` with a resized copy through a temp file, so the original is never left truncated."""
+    with Image.open(path) as img:
+        resized = img.resize(size, resample)
+    fd, temp_path = tempfile.mkstemp(suffix='.png.tmp', dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        resized.save(temp_path, format='PNG', optimize=True)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def downsample_frame(frame, factor, dry_run=False):
+    """
+    Moves a compact frame to the downsampled tier: every crop and class raster is shrunk
+    by `factor`. Files no longer at the frame's catalogued size (already done by an
+    interrupted run) are left alone.
+
+    Returns:
+        int: Bytes saved; with dry_run only what compacting would remove (downsampled sizes are not estimated).
+    """
+    saved_bytes = 0
+    if frame.retention_tier < Frame.TIER_COMPACT:
+        saved_bytes = compact_frame(frame, dry_run)
+    if dry_run or not frame.width or not frame.height:
+        return saved_bytes
+
+    folder_path = frame.media_path(frame.folder)
+    full_size = (frame.width, frame.height)
+    target_size = (max(1, round(frame.width / factor)), max(1, round(frame.height / factor)))
+    for dir_name, resample in DOWNSAMPLED_DIRS.items():
+        dir_path = os.path.join(folder_path, dir_name)
+        if not os.path.isdir(dir_path):
+            continue
+        for file_name in sorted(os.listdir(dir_path)):
+            path = os.path.join(dir_path, file_name)
+            if not file_name.endswith('.png'):
+                continue
+            with Image.open(path) as img:
+                if img.size != full_size:
+                    continue
+            size_before = os.path.getsize(path)
+            _downsample_file(path, target_size, resample)
+            saved_bytes += size_before - os.path.getsize(path)
+    _refresh_catalogue(frame, Frame.TIER_DOWNSAMPLED)
+    return saved_bytes
+
+
+def due_frames(tier, older_than, region=None):
+    """Frames below `tier` captured before `older_than`, oldest first (a range scan on frame_tier_ts_idx)."""
+    frames = Frame.objects.filter(retention_tier__lt=tier, timestamp__lt=older_than).exclude(cropped_path='')
+    if region:
+        frames = frames.filter(region=region)
+    return frames.order_by('retention_tier', 'timestamp')
+
+
+def due_count(steps, region=None):
+    """Number of frames due for any of the (tier, cutoff) `steps`, each counted once."""
+    frames = Frame.objects.none()
+    for tier, cutoff in steps:
+        frames = frames | due_frames(tier, cutoff, region)
+    return frames.count()
+
+
+def retention_steps(policy=None, now=None):
+    """(tier, cutoff) pairs for the tiers the policy enables, lowest tier first."""
+    policy = policy or retention_policy()
+    now = now or datetime.now() # Frame timestamps are naive local times, like the daemon's
+    steps = []
+    if policy['full_days'] is not None:
+        steps.append((Frame.TIER_COMPACT, now - timedelta(days=policy['full_days'])))
+    if policy['compact_days'] is not None:
+        steps.append((Frame.TIER_DOWNSAMPLED, now - timedelta(days=policy['compact_days'])))
+    return steps
@@ -0,0 +1,115 @@
+# weather/rollups.py
+
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+
+from .catalogue import CYCLE_MINUTES
+from .layers import get_layer
+from .models import CloudAnalysis, DistrictRollup
+from .precipitation import LEGEND_LABELS, mask_to_classes
+
+GRANULARITIES = (DistrictRollup.GRANULARITY_HOUR, DistrictRollup.GRANULARITY_DAY)
+CLASS_COUNT_FIELDS = tuple(f"class_{n}_count" for n in range(1, len(LEGEND_LABELS) + 1))
+COUNTER_FIELDS = ('sample_count', 'precip_minutes') + CLASS_COUNT_FIELDS
+
+
+def period_start(timestamp, granularity):
+    """Start of the hour or day containing `timestamp`."""
+    if granularity == DistrictRollup.GRANULARITY_HOUR:
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _empty_totals():
+    totals = dict.fromkeys(COUNTER_FIELDS, 0)
+    totals['max_class'] = 0
+    return totals
+
+
+def _accumulate(totals, precip_mask, max_class, has_precipitation):
+    totals['sample_count'] += 1
+    if has_precipitation:
+        totals['precip_minutes'] += CYCLE_MINUTES
+    for precip_class in mask_to_classes(precip_mask):
+        totals[f"class_{precip_class}_count"] += 1
+    totals['max_class'] = max(totals['max_class'], max_class)
+
+
+def _totals_by_period(rows):
+    """Groups (region, city, timestamp, precip_mask, max_class, has_precipitation) tuples into per-period totals."""
+    totals_by_key = {}
+    for region, city, timestamp, precip_mask, max_class, has_precipitation in rows:
+        for granularity in GRANULARITIES:
+            key = (granularity, region, city, period_start(timestamp, granularity))
+            totals = totals_by_key.setdefault(key, _empty_totals())
+            _accumulate(totals, precip_mask, max_class, has_precipitation)
+    return totals_by_key
+
+
+def update_rollups(analyses):
+    """
+    Folds newly ingested CloudAnalysis rows (one capture cycle) into the hourly and
+    daily rollups. Costs one locked read-modify-write per (district, period).
+    Rollups are precipitation totals, so rows of layers other than radar are skipped.
+    """
+    radar_type = get_layer().name
+    totals_by_key = _totals_by_period(
+        (a.region, a.city, a.timestamp, a.precip_mask, a.max_class, a.has_precipitation)
+        for a in analyses if a.type == radar_type
+    )
+    with transaction.atomic():
+        for (granularity, region, city, start), totals in totals_by_key.items():
+            rollup, _ = DistrictRollup.objects.select_for_update().get_or_create(
+                granularity=granularity, region=region, city=city, period_start=start
+            )
+            for field in COUNTER_FIELDS:
+                setattr(rollup, field, getattr(rollup, field) + totals[field])
+            rollup.max_class = max(rollup.max_class, totals['max_class'])
+            rollup.save()
+
+
+def rebuild_rollups(start_date, end_date, region=None):
+    """
+    Recomputes the rollups for every day in [start_date, end_date] from CloudAnalysis,
+    of one region (a weather.regions key) or of all of them.
+    Works one day at a time, so memory is bounded by a single day of rows.
+
+    Returns:
+        int: Number of rollup rows written.
+    """
+    written = 0
+    day = start_date
+    while day <= end_date:
+        day_start = datetime.combine(day, time.min)
+        day_end = day_start + timedelta(days=1)
+
+        analyses = CloudAnalysis.objects.filter(timestamp__gte=day_start, timestamp__lt=day_end, type=get_layer().name)
+        rollups = DistrictRollup.objects.filter(period_start__gte=day_start, period_start__lt=day_end)
+        if region is not None:
+            analyses = analyses.filter(region=region)
+            rollups = rollups.filter(region=region)
+        rows = analyses.values_list('region', 'city', 'timestamp', 'precip_mask', 'max_class', 'has_precipitation').iterator()
+        totals_by_key = _totals_by_period(rows)
+
+        with transaction.atomic():
+            rollups.delete()
+            DistrictRollup.objects.bulk_create([
+                DistrictRollup(granularity=granularity, region=region_key, city=city, period_start=start, **totals)
+                for (granularity, region_key, city, start), totals in totals_by_key.items()
+            ])
+        written += len(totals_by_key)
+        day += timedelta(days=1)
+    return written
+
+
+def daily_summary(day, region, cities=None):
+    """The region's day rollups for `day` (optionally limited to `cities`), heaviest precipitation first."""
+    queryset = DistrictRollup.objects.filter(
+        granularity=DistrictRollup.GRANULARITY_DAY,
+        region=region,
+        period_start=datetime.combine(day, time.min),
+    )
+    if cities:
+        queryset = queryset.filter(city__in=cities)
+    return list(queryset.order_by('-max_class', '-precip_minutes', 'city'))
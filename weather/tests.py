@@ -1,3 +1,730 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from . import cube
+from .capture import RegionCapture
+from . import frame_query
+from .cache import data_version
+from . import automation_report, layers, live, memwatch, regions, retention
+from .catalogue import CYCLE_MINUTES, frames_in_range, parse_frame_folder_name, register_frame
+from .filters import filter_cloud_analysis, parse_range_bound
+from .layers import capture_layers, get_layer, layer_for_type
+from .models import AnalysisJob, CloudAnalysis, CycleEvent, DistrictRollup, Frame
+from .precipitation import LEGEND_LABELS, mask_to_classes, save_class_raster
+from .regions import DEFAULT_REGION_KEY, capture_regions, get_region
+from .replay import ReplayBackend, SimulatedClock
+from .work_queue import (LeaseLost, claim_next_job, complete_job, enqueue_analysis, expire_leases, fail_job,
+                         heartbeat, run_analysis_job)
+from .rollups import rebuild_rollups, update_rollups
+from .zones import ZoneLayout
+
+SLOT = datetime(2030, 6, 1, 10, 15)
+
+
+def _expire(job):
+    AnalysisJob.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+
+def _make_available(job):
+    AnalysisJob.objects.filter(pk=job.pk).update(available_at=timezone.now())
+
+
+@override_settings(ANALYSIS_LEASE_SECONDS=120, ANALYSIS_MAX_ATTEMPTS=3, ANALYSIS_RETRY_SECONDS=60)
+class WorkQueueTests(TestCase):
+    def setUp(self):
+        self.job, = enqueue_analysis(DEFAULT_REGION_KEY, ['radar'], SLOT, 'folder')
+
+    def test_claim_leases_the_job_once(self):
+        job = claim_next_job('a')
+        self.assertEqual(job.pk, self.job.pk)
+        self.assertEqual((job.status, job.worker, job.attempts), (AnalysisJob.STATUS_RUNNING, 'a', 1))
+        self.assertIsNone(claim_next_job('b'))
+
+    def test_expired_lease_is_released_with_backoff(self):
+        job = claim_next_job('a')
+        self.assertEqual(expire_leases(), 0)
+        _expire(job)
+        before = timezone.now()
+        self.assertEqual(expire_leases(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (AnalysisJob.STATUS_QUEUED, ''))
+        self.assertGreaterEqual(job.available_at, before + timedelta(seconds=60))
+        self.assertIsNone(claim_next_job('b')) # Still backing off
+
+    def test_retry_backoff_doubles_then_fails(self):
+        job = claim_next_job('a')
+        before = timezone.now()
+        fail_job(job, 'first')
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.STATUS_QUEUED)
+        self.assertGreaterEqual(job.available_at, before + timedelta(seconds=60))
+        self.assertLess(job.available_at, before + timedelta(seconds=120))
+
+        _make_available(job)
+        job = claim_next_job('a')
+        before = timezone.now()
+        fail_job(job, 'second')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (AnalysisJob.STATUS_QUEUED, 2))
+        self.assertGreaterEqual(job.available_at, before + timedelta(seconds=120))
+
+        _make_available(job)
+        job = claim_next_job('a')
+        fail_job(job, 'third')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (AnalysisJob.STATUS_FAILED, 'third'))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_complete_job_is_fenced_after_takeover(self):
+        stale = claim_next_job('a')
+        _expire(stale)
+        expire_leases()
+        _make_available(stale)
+        current = claim_next_job('b')
+
+        self.assertFalse(heartbeat(stale))
+        with self.assertRaises(LeaseLost):
+            complete_job(stale)
+        complete_job(current)
+        current.refresh_from_db()
+        self.assertEqual((current.status, current.worker), (AnalysisJob.STATUS_DONE, 'b'))
+
+    def test_same_worker_is_fenced_by_attempt(self):
+        stale = claim_next_job('a')
+        _expire(stale)
+        expire_leases()
+        _make_available(stale)
+        claim_next_job('a')
+
+        with self.assertRaises(LeaseLost):
+            complete_job(stale)
+
+
+def _fake_analyze(capture, layers, base_folder, current_time):
+    """Stands in for RegionCapture.analyze: two districts' radar results, without images."""
+    for city, values in (('Salem', LEGEND_LABELS[1]), ('Madurai', '')):
+        capture.analyses.append(CloudAnalysis.objects.create(
+            city=city, values=values, type=layers[0].name, timestamp=current_time, region=capture.region.key,
+        ))
+
+
+@mock.patch.object(RegionCapture, 'analyze', _fake_analyze)
+class ReanalysisRollupTests(TestCase):
+    def _run_slot(self):
+        enqueue_analysis(DEFAULT_REGION_KEY, ['radar'], SLOT, 'folder')
+        job = claim_next_job('a')
+        run_analysis_job(job, BaseCommand(stdout=StringIO(), stderr=StringIO()))
+
+    def _rollup(self, granularity, city):
+        return DistrictRollup.objects.get(region=DEFAULT_REGION_KEY, granularity=granularity, city=city)
+
+    def test_reanalysis_does_not_double_count(self):
+        self._run_slot()
+        self._run_slot() # The slot queued again, e.g. after a recapture
+
+        self.assertEqual(CloudAnalysis.objects.filter(type=get_layer().name, timestamp=SLOT).count(), 2)
+        for granularity in (DistrictRollup.GRANULARITY_HOUR, DistrictRollup.GRANULARITY_DAY):
+            salem = self._rollup(granularity, 'Salem')
+            self.assertEqual((salem.sample_count, salem.precip_minutes, salem.class_2_count, salem.max_class),
+                             (1, 15, 1, 2))
+            self.assertEqual(self._rollup(granularity, 'Madurai').sample_count, 1)
+        self.assertEqual(AnalysisJob.objects.get().status, AnalysisJob.STATUS_DONE)
+
+
+def _clear_registries():
+    regions._registry.cache_clear()
+    layers._registry.cache_clear()
+
+
+class RegionRegistryTests(TestCase):
+    def setUp(self):
+        _clear_registries()
+        self.addCleanup(_clear_registries)
+
+    @override_settings(
+        WEATHER_REGIONS={
+            DEFAULT_REGION_KEY: {'name': 'TN'},
+            'kerala': dict(name='Kerala', map_view=(10.5, 76.3, 7), crop_box=(0, 0, 10, 10),
+                           bounds=(74.8, 8.2, 77.4, 12.8), state_names=('Kerala',)),
+        },
+        CAPTURE_REGIONS=['kerala', DEFAULT_REGION_KEY],
+    )
+    def test_settings_extend_and_override_the_builtin_regions(self):
+        default = get_region()
+        self.assertEqual((default.key, default.name, default.crop_box), (DEFAULT_REGION_KEY, 'TN', (551, 170, 1065, 687)))
+        self.assertEqual([region.key for region in capture_regions()], ['kerala', DEFAULT_REGION_KEY])
+        self.assertEqual(get_region('kerala').state_names, ('kerala',))
+        with self.assertRaises(KeyError):
+            get_region('goa')
+
+    def test_rollups_are_kept_per_region(self):
+        update_rollups([
+            CloudAnalysis.objects.create(city='Salem', values=LEGEND_LABELS[1], timestamp=SLOT, region=region)
+            for region in (DEFAULT_REGION_KEY, 'kerala')
+        ])
+        CloudAnalysis.objects.filter(region=DEFAULT_REGION_KEY).delete()
+        rebuild_rollups(SLOT.date(), SLOT.date(), DEFAULT_REGION_KEY)
+
+        rollups = DistrictRollup.objects.filter(granularity=DistrictRollup.GRANULARITY_DAY)
+        self.assertEqual(list(rollups.values_list('region', 'sample_count')), [('kerala', 1)])
+
+
+class LayerRegistryTests(TestCase):
+    def setUp(self):
+        _clear_registries()
+        self.addCleanup(_clear_registries)
+
+    @override_settings(CAPTURE_LAYERS=['satellite', 'radar', 'rain_accumulation'])
+    def test_radar_is_captured_first(self):
+        self.assertEqual([layer.key for layer in capture_layers()], ['radar', 'satellite', 'rain_accumulation'])
+
+    def test_only_radar_keeps_the_catalogued_file_names(self):
+        radar, satellite = get_layer(), get_layer('satellite')
+        self.assertEqual(radar.cropped_image_relpath, 'cropped/tamil_nadu_cropped.png')
+        self.assertEqual((satellite.full_image_relpath, satellite.cropped_image_relpath, satellite.class_raster_relpath),
+                         ('full/windy_map_full_satellite.png', 'cropped/satellite_cropped.png', 'class/satellite_classes.png'))
+
+    @override_settings(WEATHER_LAYERS={'satellite': {'max_tolerance': 20}, 'lightning': dict(
+        name="Lightning", overlay='thunder', legend={(255, 255, 0): "Strikes - Yellow"})})
+    def test_settings_extend_and_override_the_builtin_layers(self):
+        satellite = get_layer('satellite')
+        self.assertEqual((satellite.max_tolerance, satellite.name), (20, "Satellite clouds"))
+        self.assertEqual(layer_for_type("Lightning").key, 'lightning')
+        self.assertIsNone(layer_for_type("Hail"))
+        with self.assertRaises(KeyError):
+            get_layer('hail')
+
+
+class AnalysisJobTransactionTests(TestCase):
+    """The radar frame's files and catalogue entry are stored only once the job commits."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        screenshot = os.path.join(self.media_root, 'folder', get_layer().full_image_relpath)
+        os.makedirs(os.path.dirname(screenshot))
+        Image.new('RGB', (1100, 700), 'white').save(screenshot)
+
+        crop_box = get_region(DEFAULT_REGION_KEY).crop_box
+        shape = (crop_box[3] - crop_box[1], crop_box[2] - crop_box[0])
+        patcher = mock.patch('weather.capture.cube.district_masks', return_value={'Salem': np.ones(shape, dtype=bool)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(RegionCapture, '_store_radar_frame')
+        self.store_radar_frame = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _run_job(self):
+        enqueue_analysis(DEFAULT_REGION_KEY, ['radar'], SLOT, 'folder')
+        with self.settings(MEDIA_ROOT=self.media_root):
+            run_analysis_job(claim_next_job('a'), BaseCommand(stdout=StringIO(), stderr=StringIO()))
+
+    def test_frame_is_stored_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self._run_job()
+            self.store_radar_frame.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        self.store_radar_frame.assert_called_once()
+        self.assertEqual(CloudAnalysis.objects.get().city, 'Salem')
+
+    def test_failed_job_stores_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with mock.patch('weather.rollups.update_rollups', side_effect=RuntimeError('boom')):
+                with self.assertRaises(RuntimeError):
+                    self._run_job()
+        self.assertEqual(callbacks, [])
+        self.store_radar_frame.assert_not_called()
+        self.assertFalse(CloudAnalysis.objects.exists())
+
+
+def _temp_dir(test):
+    path = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, path)
+    return path
+
+
+class PrecipCubeTests(TestCase):
+    def setUp(self):
+        settings = self.settings(PRECIP_CUBE_ROOT=_temp_dir(self))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def _classes(self, value):
+        return np.full((3, 4), value, dtype=np.uint8)
+
+    def test_slices_are_read_back_in_time_order(self):
+        later = SLOT + timedelta(minutes=15)
+        self.assertTrue(cube.append_slice(DEFAULT_REGION_KEY, later, self._classes(3)))
+        self.assertTrue(cube.append_slice(DEFAULT_REGION_KEY, SLOT, self._classes(1)))
+        self.assertFalse(cube.append_slice(DEFAULT_REGION_KEY, SLOT, self._classes(7))) # Slot already held
+
+        (timestamps, classes), = cube.iter_slices(SLOT, later + timedelta(minutes=1))
+        self.assertEqual(timestamps, [SLOT, later])
+        self.assertEqual(classes[:, 0, 0].tolist(), [1, 3])
+        self.assertEqual(cube.max_class(SLOT, later)[0, 0], 1) # End is exclusive
+        self.assertEqual(cube.precip_minutes(SLOT, later + timedelta(minutes=1), min_class=2)[0, 0], CYCLE_MINUTES)
+
+    def test_rejects_a_raster_of_another_size(self):
+        cube.append_slice(DEFAULT_REGION_KEY, SLOT, self._classes(1))
+        with self.assertRaises(ValueError):
+            cube.append_slice(DEFAULT_REGION_KEY, SLOT + timedelta(minutes=15), np.zeros((4, 3), dtype=np.uint8))
+
+    def test_interrupted_append_is_overwritten(self):
+        cube.append_slice(DEFAULT_REGION_KEY, SLOT, self._classes(1))
+        data_path, _, _ = cube._day_paths(DEFAULT_REGION_KEY, SLOT.date())
+        with open(data_path, 'ab') as data_file:
+            data_file.write(b'\x05' * 5) # A slice whose time was never written
+        cube.append_slice(DEFAULT_REGION_KEY, SLOT + timedelta(minutes=15), self._classes(2))
+
+        (_, classes), = cube.iter_slices(SLOT, SLOT + timedelta(hours=1))
+        self.assertEqual(classes[:, 0, 0].tolist(), [1, 2])
+        self.assertEqual(os.path.getsize(data_path), 2 * 12)
+
+    def test_frame_slice_only_matches_its_capture(self):
+        cube.append_slice(DEFAULT_REGION_KEY, SLOT, self._classes(4), 'a' * 64)
+        cube.append_slice(DEFAULT_REGION_KEY, SLOT + timedelta(minutes=15), self._classes(5)) # Hash unknown
+
+        self.assertEqual(cube.frame_slice(DEFAULT_REGION_KEY, SLOT, 'a' * 64)[0, 0], 4)
+        self.assertIsNone(cube.frame_slice(DEFAULT_REGION_KEY, SLOT, 'b' * 64)) # Recaptured since
+        self.assertIsNone(cube.frame_slice(DEFAULT_REGION_KEY, SLOT + timedelta(minutes=15), 'c' * 64))
+        self.assertEqual(cube.frame_slice(DEFAULT_REGION_KEY, SLOT + timedelta(minutes=15))[0, 0], 5)
+        self.assertIsNone(cube.frame_slice(DEFAULT_REGION_KEY, SLOT + timedelta(minutes=30)))
+
+
+class FrameQueryTests(TestCase):
+    def setUp(self):
+        self.region = get_region(DEFAULT_REGION_KEY) # Bounds (74.80, 7.98, 80.37, 13.53)
+        self.classes = np.zeros((10, 10), dtype=np.uint8)
+        self.classes[:5, :5] = 4 # North-west quarter
+        self.classes[9, 9] = 2 # South-east corner pixel
+
+    def test_points_map_to_pixels(self):
+        results = frame_query.query_points(self.region, self.classes, [(13.5, 74.9), (8.0, 80.37), (9.0, 78.0), (20.0, 78.0)])
+        self.assertEqual([result['class'] for result in results], [4, 2, 0, None])
+        self.assertEqual(results[0]['label'], self.region.legend_labels[3])
+        self.assertIsNone(results[3]['label'])
+
+    def test_boxes_cover_every_touched_pixel(self):
+        whole, north_west, outside = frame_query.query_boxes(
+            self.region, self.classes, [self.region.bounds, (74.80, 11.0, 77.0, 13.53), (60.0, 0.0, 61.0, 1.0)]
+        )
+        self.assertEqual((whole['max_class'], whole['wet_fraction']), (4, 0.26))
+        self.assertEqual((north_west['max_class'], north_west['wet_fraction']), (4, 1.0))
+        self.assertEqual(outside, {'bbox': [60.0, 0.0, 61.0, 1.0], 'max_class': None, 'label': None, 'wet_fraction': None})
+
+
+class FrameClassesCacheTests(TestCase):
+    def setUp(self):
+        self.media_root = _temp_dir(self)
+        settings = self.settings(MEDIA_ROOT=self.media_root, PRECIP_CUBE_ROOT=_temp_dir(self))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        frame_query._frame_cache.clear()
+        self.addCleanup(frame_query._frame_cache.clear)
+
+        os.makedirs(os.path.join(self.media_root, 'class'))
+        self._write_raster(2)
+        self.frame = Frame.objects.create(timestamp=SLOT, folder='f', class_path='class/precip_classes.png',
+                                          content_hash='a' * 64)
+        self.region = get_region(DEFAULT_REGION_KEY)
+
+    def _write_raster(self, value):
+        save_class_raster(np.full((3, 4), value, dtype=np.uint8), os.path.join(self.media_root, 'class', 'precip_classes.png'))
+
+    def test_cube_slice_of_the_same_capture_is_preferred(self):
+        cube.append_slice(DEFAULT_REGION_KEY, SLOT, np.full((3, 4), 5, dtype=np.uint8), 'a' * 64)
+        self.assertEqual(frame_query.frame_classes(self.frame, self.region)[0, 0], 5)
+
+    def test_recapture_is_not_served_from_the_cache(self):
+        cube.append_slice(DEFAULT_REGION_KEY, SLOT, np.full((3, 4), 5, dtype=np.uint8), 'a' * 64)
+        classes = frame_query.frame_classes(self.frame, self.region)
+        self.assertIs(frame_query.frame_classes(self.frame, self.region), classes) # Cached
+        self.assertFalse(classes.flags.writeable)
+
+        # The slot is recaptured: new crop, new class raster; the cube keeps the first capture
+        self._write_raster(3)
+        self.frame.content_hash = 'b' * 64
+        self.assertEqual(frame_query.frame_classes(self.frame, self.region)[0, 0], 3)
+
+    def test_query_api(self):
+        url = reverse('cloud-query')
+        response = self.client.get(url, {'lat': '13.5', 'lon': '74.9'})
+        self.assertEqual(response.json()['points'][0]['class'], 2)
+        self.assertEqual(self.client.get(url, {'lat': '13.5', 'lon': '74.9', 'time': '2030-06-01T10:00:00'}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'lat': 'north'}).status_code, 400)
+
+
+def _add_analyses(count, start=SLOT, region=DEFAULT_REGION_KEY):
+    return [CloudAnalysis.objects.create(city='Salem', values='', timestamp=start + timedelta(minutes=15 * n), region=region)
+            for n in range(count)]
+
+
+class PrecipitationFieldsTests(TestCase):
+    def _analysis(self, city, values):
+        return CloudAnalysis.objects.create(city=city, values=values, timestamp=SLOT)
+
+    def test_fields_are_derived_from_values(self):
+        wet = self._analysis('Salem', f"{LEGEND_LABELS[3]}, {LEGEND_LABELS[0]}, Unknown colour")
+        self.assertEqual((wet.precip_mask, wet.max_class, wet.has_precipitation), (0b1001, 4, True))
+        self.assertEqual(mask_to_classes(wet.precip_mask), [1, 4])
+        dry = self._analysis('Madurai', '')
+        self.assertEqual((dry.precip_mask, dry.max_class, dry.has_precipitation), (0, 0, False))
+
+    def test_class_filters(self):
+        self._analysis('Salem', f"{LEGEND_LABELS[0]}, {LEGEND_LABELS[3]}")
+        self._analysis('Chennai', LEGEND_LABELS[1])
+        self._analysis('Madurai', '')
+
+        def cities(**params):
+            return sorted(filter_cloud_analysis(CloudAnalysis.objects.all(), params).values_list('city', flat=True))
+        self.assertEqual(cities(**{'class': '2,4'}), ['Chennai', 'Salem'])
+        self.assertEqual(cities(**{'class': LEGEND_LABELS[0]}), ['Salem'])
+        self.assertEqual(cities(min_class='3'), ['Salem'])
+        self.assertEqual(cities(has_precipitation='false'), ['Madurai'])
+        with self.assertRaises(ValidationError):
+            cities(**{'class': '9'})
+
+
+class CloudAnalysisAPITests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.rows = _add_analyses(5)
+
+    def _ids(self, response):
+        return [row['id'] for row in response.json()['results']]
+
+    def test_cursor_pages_are_stable_under_inserts(self):
+        response = self.client.get(reverse('cloud-api'), {'page_size': 2, 'fields': 'id'})
+        seen = self._ids(response)
+        _add_analyses(1, start=SLOT + timedelta(days=1)) # Arrives while the client pages
+        while response.json()['next']:
+            response = self.client.get(response.json()['next'])
+            seen += self._ids(response)
+        self.assertEqual(seen, [row.pk for row in reversed(self.rows)])
+
+    def test_unchanged_data_revalidates_to_304(self):
+        url = reverse('cloud-api')
+        response = self.client.get(url, {'city': 'Salem'})
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, {'city': 'Salem'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.client.get(url, {'city': 'Madurai'})['ETag'], etag)
+
+        _add_analyses(1, start=SLOT + timedelta(days=1))
+        changed = self.client.get(url, {'city': 'Salem'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()['results']), 6)
+
+    def test_pages_are_cached_per_data_version(self):
+        url = reverse('cloud-api')
+        first = self.client.get(url).json()
+        with self.assertNumQueries(1): # The data version only
+            self.assertEqual(self.client.get(url).json(), first)
+        _add_analyses(1, start=SLOT + timedelta(days=1))
+        self.assertEqual(len(self.client.get(url).json()['results']), 6)
+
+    def test_data_version_is_scoped(self):
+        other_region, = _add_analyses(1, region='tn_copy')
+        self.assertEqual(data_version(), other_region.pk)
+        self.assertEqual(data_version(region=DEFAULT_REGION_KEY), self.rows[-1].pk)
+        self.assertEqual(data_version(region=DEFAULT_REGION_KEY, end=SLOT + timedelta(minutes=15)), self.rows[0].pk)
+        self.assertEqual(data_version(start=SLOT + timedelta(days=1)), 0)
+
+
+class FrameCatalogueTests(TestCase):
+    def setUp(self):
+        self.media_root = _temp_dir(self)
+        settings = self.settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def _capture_folder(self, name, cropped_relpath='cropped/tamil_nadu_cropped.png'):
+        folder = os.path.join(self.media_root, name)
+        os.makedirs(os.path.join(folder, os.path.dirname(cropped_relpath)))
+        Image.new('RGB', (40, 20), (255, 255, 255)).save(os.path.join(folder, cropped_relpath))
+        return folder
+
+    def test_register_reads_the_folder_once(self):
+        folder = self._capture_folder('2030-06-01_10-15-00', 'cropped/windy_map_cropped.png') # Older name
+        frame = register_frame(folder, build_class_raster=True)
+        self.assertEqual((frame.timestamp, frame.folder, frame.width, frame.height), (SLOT, '2030-06-01_10-15-00', 40, 20))
+        self.assertEqual(frame.cropped_path, '2030-06-01_10-15-00/cropped/windy_map_cropped.png')
+        self.assertEqual(frame.class_path, '2030-06-01_10-15-00/class/precip_classes.png')
+        self.assertEqual(len(frame.content_hash), 64)
+
+        self.assertEqual(register_frame(folder).pk, frame.pk) # Re-registering updates the entry
+        self.assertIsNone(register_frame(self._capture_folder('not-a-capture')))
+        self.assertIsNone(parse_frame_folder_name('2030-06-01'))
+
+    def test_frames_in_range_is_half_open_and_per_region(self):
+        for minutes, region in ((0, DEFAULT_REGION_KEY), (15, DEFAULT_REGION_KEY), (15, 'tn_copy'), (30, DEFAULT_REGION_KEY)):
+            Frame.objects.create(region=region, timestamp=SLOT + timedelta(minutes=minutes), folder=f'{region}-{minutes}')
+        frames = frames_in_range(SLOT, SLOT + timedelta(minutes=30))
+        self.assertEqual([frame.folder for frame in frames], [f'{DEFAULT_REGION_KEY}-0', f'{DEFAULT_REGION_KEY}-15'])
+        self.assertEqual(frames_in_range(SLOT, SLOT + timedelta(minutes=30), region=None).count(), 3)
+
+
+class AutomationReportTests(TestCase):
+    def setUp(self):
+        media_root = _temp_dir(self)
+        settings = self.settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.folder = os.path.join(media_root, '2030-06-01_10-15-00')
+        os.makedirs(self.folder)
+        self.frame = Frame.objects.create(timestamp=SLOT, folder='2030-06-01_10-15-00')
+
+    def test_results_fall_back_to_the_database(self):
+        CloudAnalysis.objects.create(city='Salem', values=LEGEND_LABELS[0], timestamp=SLOT)
+        results = automation_report._load_cycle_results(self.frame)
+        self.assertEqual([(result['city'], result['values']) for result in results], [('Salem', LEGEND_LABELS[0])])
+
+        with open(os.path.join(self.folder, 'cloud_analysis_results_2030-06-01_10-15-00.json'), 'w') as json_file:
+            json.dump([{'city': 'Madurai'}], json_file)
+        self.assertEqual(automation_report._load_cycle_results(self.frame), [{'city': 'Madurai'}])
+
+    @mock.patch.object(automation_report, 'generate_automation_report')
+    def test_report_is_generated_once_per_slot(self, generate):
+        generate.side_effect = lambda frame: open(automation_report.automation_report_path(frame), 'wb').close()
+        automation_report.get_automation_report(self.frame)
+        path = automation_report.get_automation_report(self.frame)
+        self.assertEqual(path, os.path.join(self.folder, 'automation_report_20300601_101500.pdf'))
+        generate.assert_called_once()
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.media_root = _temp_dir(self)
+        settings = self.settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.folder = os.path.join(self.media_root, '2030-06-01_10-15-00')
+        for relpath, size in (('full/windy_map_full.png', (80, 60)), ('cropped/tamil_nadu_cropped.png', (40, 20)),
+                              ('masked_cropped/salem/salem.png', (40, 20))):
+            path = os.path.join(self.folder, relpath)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            Image.new('RGB', size, (255, 255, 255)).save(path)
+        self.frame = register_frame(self.folder, SLOT)
+
+    def test_compact_keeps_crop_and_classes(self):
+        removed = retention.compact_frame(self.frame, dry_run=True)
+        self.assertGreater(removed, 0)
+        self.assertTrue(os.path.exists(os.path.join(self.folder, 'full')))
+
+        self.assertEqual(retention.compact_frame(self.frame), removed)
+        self.assertEqual(sorted(os.listdir(self.folder)), ['class', 'cropped'])
+        self.frame.refresh_from_db()
+        self.assertEqual(self.frame.retention_tier, Frame.TIER_COMPACT)
+        self.assertEqual(self.frame.full_path, '')
+        self.assertTrue(self.frame.class_path)
+
+    def test_downsample_refreshes_the_catalogue(self):
+        original_hash = self.frame.content_hash
+        retention.downsample_frame(self.frame, 4)
+
+        with Image.open(os.path.join(self.folder, 'cropped', 'tamil_nadu_cropped.png')) as crop:
+            self.assertEqual(crop.size, (10, 5))
+        self.frame.refresh_from_db()
+        self.assertEqual((self.frame.retention_tier, self.frame.width, self.frame.height), (Frame.TIER_DOWNSAMPLED, 10, 5))
+        self.assertNotEqual(self.frame.content_hash, original_hash) # Caches keyed by capture see the change
+        self.assertFalse(os.path.exists(os.path.join(self.folder, 'full')))
+
+    def test_due_frames_follow_the_policy(self):
+        policy = {'full_days': 14, 'compact_days': 90, 'downsample_factor': 4}
+        steps = retention.retention_steps(policy, now=SLOT + timedelta(days=30))
+        self.assertEqual([tier for tier, _ in steps], [Frame.TIER_COMPACT, Frame.TIER_DOWNSAMPLED])
+        self.assertEqual(list(retention.due_frames(Frame.TIER_COMPACT, steps[0][1])), [self.frame])
+        self.assertFalse(retention.due_frames(Frame.TIER_DOWNSAMPLED, steps[1][1]).exists())
+        self.assertEqual(retention.due_count(retention.retention_steps(policy, now=SLOT + timedelta(days=100))), 1)
+        self.assertEqual(retention.retention_steps({**policy, 'full_days': None, 'compact_days': None}), [])
+
+
+@sync_to_async
+def _record_event(region=DEFAULT_REGION_KEY):
+    event = CycleEvent.objects.create(region=region, timestamp=SLOT, payload={'region': region})
+    live.wake_hubs()
+    return event
+
+
+@override_settings(LIVE_POLL_SECONDS=0.05, LIVE_KEEPALIVE_SECONDS=5)
+class LiveEventTests(TestCase):
+    async def _next(self, events):
+        return await asyncio.wait_for(events.__anext__(), 2)
+
+    async def _close(self, events):
+        await events.aclose()
+        task = live._hub()._task
+        if task is not None:
+            await task # The poller stops with its last subscriber
+
+    async def test_resume_replays_missed_events_in_order(self):
+        first, second = await _record_event(), await _record_event()
+        await _record_event('tn_copy')
+        events = live.subscribe(last_id=first.pk, region=DEFAULT_REGION_KEY)
+        self.assertEqual((await self._next(events)).pk, second.pk)
+        newer = await _record_event()
+        self.assertEqual((await self._next(events)).pk, newer.pk) # Then switches to the live feed
+        await self._close(events)
+
+    async def test_new_subscribers_only_see_new_events(self):
+        await _record_event()
+        events = live.subscribe()
+        next_event = asyncio.ensure_future(self._next(events))
+        await asyncio.sleep(0.1) # Subscribed and polling
+        newer = await _record_event()
+        self.assertEqual((await next_event).pk, newer.pk)
+        await self._close(events)
+
+        # Recorded while nobody listened: a later subscriber must not be sent it
+        await _record_event()
+        events = live.subscribe()
+        next_event = asyncio.ensure_future(self._next(events))
+        await asyncio.sleep(0.1)
+        latest = await _record_event()
+        self.assertEqual((await next_event).pk, latest.pk)
+        await self._close(events)
+
+    async def test_lagging_subscriber_catches_up_from_the_table(self):
+        with mock.patch.object(live, 'SUBSCRIBER_QUEUE_SIZE', 1), \
+                mock.patch.object(live, '_events_after', wraps=live._events_after) as events_after:
+            events = live.subscribe()
+            next_event = asyncio.ensure_future(self._next(events))
+            await asyncio.sleep(0.1)
+            recorded = await sync_to_async(lambda: [CycleEvent.objects.create(region=DEFAULT_REGION_KEY, timestamp=SLOT, payload={})
+                                                    for _ in range(4)])()
+            live.wake_hubs() # The hub reads all four at once; only the first fits the queue
+            received = [await next_event] + [await self._next(events) for _ in range(3)]
+            self.assertEqual([event.pk for event in received], [event.pk for event in recorded])
+            self.assertTrue(any(len(call.args) == 2 for call in events_after.call_args_list)) # Read from the table
+            await self._close(events)
+
+
+class RangeBoundTests(TestCase):
+    def test_dates_bound_whole_days(self):
+        self.assertEqual(parse_range_bound('2030-06-01', 'start'), datetime(2030, 6, 1))
+        self.assertEqual(parse_range_bound('2030-06-01', 'end', is_end=True), datetime(2030, 6, 2))
+        self.assertEqual(parse_range_bound('2030-06-01T10:15:00', 'end', is_end=True), SLOT)
+
+    def test_invalid_bound_names_its_parameter(self):
+        with self.assertRaises(ValidationError) as raised:
+            parse_range_bound('June', 'start')
+        self.assertIn('start', raised.exception.detail)
+
+
+class ExportCommandTests(TestCase):
+    def test_region_and_type_filters(self):
+        for region, layer in (('tamil_nadu', 'Weather radar'), ('tamil_nadu', 'Clouds'), ('tn_copy', 'Weather radar')):
+            CloudAnalysis.objects.create(city='Salem', values='', type=layer, timestamp=SLOT, region=region)
+        output = os.path.join(tempfile.mkdtemp(), 'export.ndjson')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+
+        call_command('export_cloud_analysis', output=output, region='tamil_nadu', type='Weather radar', stdout=StringIO())
+        with open(output) as exported:
+            rows = [json.loads(line) for line in exported]
+        self.assertEqual([(row['region'], row['type']) for row in rows], [('tamil_nadu', 'Weather radar')])
+
+
+class ImportBenchmarkTests(TestCase):
+    def test_startup_loads_no_heavy_stack(self):
+        out = StringIO()
+        call_command('import_benchmark', runs=1, strict=True, stdout=out)
+        self.assertIn("No heavy modules imported at startup.", out.getvalue())
+
+
+class MemoryWatchdogTests(TestCase):
+    def test_with_option_replaces_every_form(self):
+        argv = ['manage.py', 'cloud_analysis', '--cycles', '8', '--replay', '--cycles=5']
+        self.assertEqual(memwatch.with_option(argv, '--cycles', 3), ['manage.py', 'cloud_analysis', '--replay', '--cycles=3'])
+        self.assertEqual(memwatch.with_option(['manage.py'], '--start', '2030-06-01T10:15'), ['manage.py', '--start=2030-06-01T10:15'])
+
+    def test_restart_is_due_once_rss_passes_the_threshold(self):
+        log_path = os.path.join(_temp_dir(self), 'memory.log')
+        watchdog = memwatch.MemoryWatchdog(log_path=log_path, restart_rss_mb=500)
+
+        with mock.patch.object(memwatch, 'current_rss_mb', return_value=400.0):
+            with watchdog.stage('capture'):
+                pass
+            self.assertFalse(watchdog.end_cycle())
+        with mock.patch.object(memwatch, 'current_rss_mb', return_value=600.0):
+            self.assertTrue(watchdog.end_cycle())
+
+        with open(log_path) as log_file:
+            report = log_file.read()
+        self.assertIn("Memory after cycle 1", report)
+        self.assertIn("capture      RSS 400.0 MB (+0.0 MB)", report)
+        self.assertIn("above the 500 MB threshold", report)
+
+
+class ReplayTests(TestCase):
+    def _replay(self, **options):
+        err = StringIO()
+        call_command('cloud_analysis', replay=True, stdout=StringIO(), stderr=err, **options)
+        return err.getvalue()
+
+    @override_settings(REPLAY_SANDBOX=False)
+    def test_refuses_outside_a_sandbox(self):
+        self.assertIn("REPLAY_SANDBOX = True", self._replay(replay_from=_temp_dir(self)))
+
+    def test_refuses_media_root_as_the_archive(self):
+        media_root = _temp_dir(self)
+        with self.settings(REPLAY_SANDBOX=True, MEDIA_ROOT=media_root):
+            self.assertIn("must not be MEDIA_ROOT", self._replay(replay_from=media_root))
+            self.assertIn("needs --replay-from", self._replay())
+
+    def test_empty_archive_is_rejected(self):
+        with self.assertRaises(ValueError):
+            ReplayBackend(_temp_dir(self))
+
+    def test_simulated_clock_skips_sleeps_at_speed_zero(self):
+        clock = SimulatedClock(SLOT, speed=0)
+        clock.sleep(15 * 60)
+        self.assertGreaterEqual(clock.now(), SLOT + timedelta(minutes=15))
+        self.assertLess(clock.now(), SLOT + timedelta(minutes=16))
+
+
+class ZoneLayoutTests(TestCase):
+    def test_evaluate_matches_per_zone_loop(self):
+        rng = np.random.default_rng(48)
+        labels = rng.integers(0, 40, size=(60, 80)).astype(np.int32)
+        labels[labels == 7] = 0 # A zone with no pixels is not evaluated
+        classes = rng.integers(0, 8, size=labels.shape).astype(np.uint8)
+        classes[labels == 3] = 0 # A dry zone
+
+        layout = ZoneLayout(labels)
+        stats = layout.evaluate(classes)
+
+        expected_zones = sorted(set(np.unique(labels)) - {0})
+        self.assertEqual(list(layout.zone_indices), expected_zones)
+        for position, zone in enumerate(expected_zones):
+            zone_classes = classes[labels == zone]
+            mask = 0
+            for precip_class in np.unique(zone_classes[zone_classes > 0]):
+                mask |= 1 << (int(precip_class) - 1)
+            self.assertEqual(stats['max_class'][position], zone_classes.max())
+            self.assertEqual(stats['precip_mask'][position], mask)
+            self.assertEqual(mask_to_classes(int(stats['precip_mask'][position])),
+                             sorted(int(c) for c in set(zone_classes) if c))
+            self.assertEqual(stats['wet_permille'][position],
+                             round(np.count_nonzero(zone_classes) * 1000 / zone_classes.size))
+
+    def test_evaluate_rejects_other_shapes(self):
+        layout = ZoneLayout(np.ones((4, 5), dtype=np.int32))
+        with self.assertRaises(ValueError):
+            layout.evaluate(np.zeros((5, 4), dtype=np.uint8))
@@ -1,6 +1,12 @@
 from django.urls import path
-from .views import CloudAnalysisAPIView
+from .views import CloudAnalysisAPIView, DistrictRollupAPIView, PrecipQueryAPIView, automation_report, cloud_analysis_export, cycle_events, precip_cube_api
 
 urlpatterns = [
     path('api/cloud/', CloudAnalysisAPIView.as_view(), name='cloud-api'),
+    path('api/cloud/export/', cloud_analysis_export, name='cloud-export'),
+    path('api/cloud/rollups/', DistrictRollupAPIView.as_view(), name='cloud-rollups'),
+    path('api/cloud/cube/', precip_cube_api, name='cloud-cube'),
+    path('api/cloud/events/', cycle_events, name='cloud-events'),
+    path('api/cloud/query/', PrecipQueryAPIView.as_view(), name='cloud-query'),
+    path('automation-report/<str:frame_id>/', automation_report, name='automation-report'),
 ]
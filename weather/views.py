@@ -1,11 +1,310 @@
-from django.shortcuts import render
+import io
+import os
+
+import numpy as np
+from django.core.cache import cache
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import quote_etag
+from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import CloudAnalysis
-from .serializers import CloudAnalysisSerializer
+from rest_framework.exceptions import ValidationError
+from .automation_report import get_automation_report
+from .cache import data_version, params_digest, versioned_cache_key
+from .export import EXPORT_FORMATS, parquet_available, stream_export
+from . import cube
+from .live import parse_last_id, sse_stream
+from .frame_query import frame_at, frame_classes, query_boxes, query_points
+from .filters import ROLLUP_API_FIELDS, filter_cloud_analysis, filter_rollups, parse_range_bound, requested_fields
+from .catalogue import parse_frame_folder_name
+from .models import CloudAnalysis, DistrictRollup, Frame
+from .precipitation import LEGEND_LABELS
+from .regions import DEFAULT_REGION_KEY, get_region
+from .pagination import CloudAnalysisCursorPagination, DistrictRollupCursorPagination
+
+# Cached response pages are keyed by data version, so this only bounds memory, not staleness.
+CLOUD_API_CACHE_SECONDS = 60 * 60
+
 
 class CloudAnalysisAPIView(APIView):
+    """
+    Cursor-paginated, filterable CloudAnalysis feed.
+
+    Query params: region, type, city, start, end, class, min_class, has_precipitation (see
+    filter_cloud_analysis), fields (comma-separated subset of CLOUD_API_FIELDS),
+    page_size and cursor. Rows are read with .values() rather than a ModelSerializer,
+    and each page is cached and ETagged against the current data version.
+    """
+    pagination_class = CloudAnalysisCursorPagination
+
     def get(self, request):
-        data = CloudAnalysis.objects.all().order_by('-timestamp')
-        serializer = CloudAnalysisSerializer(data, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        version = data_version()
+        cache_key = versioned_cache_key('cloud-api', version, request.query_params)
+        etag = quote_etag(f"{version}-{params_digest(request.query_params)}")
+
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+
+        payload = cache.get(cache_key)
+        if payload is None:
+            fields = requested_fields(request.query_params)
+            queryset = filter_cloud_analysis(CloudAnalysis.objects.all(), request.query_params)
+            # Ordering fields are always selected so the cursor can be built from the rows.
+            queryset = queryset.values(*dict.fromkeys(fields + ('timestamp', 'id')))
+
+            paginator = self.pagination_class()
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            results = [{field: row[field] for field in fields} for row in page]
+            payload = {
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
+                'results': results,
+            }
+            cache.set(cache_key, payload, CLOUD_API_CACHE_SECONDS)
+
+        response = Response(payload)
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True) # Clients must revalidate; unchanged data costs a 304
+        return response
+
+
+class DistrictRollupAPIView(APIView):
+    """
+    Precomputed hourly / daily per-district aggregates (see weather.rollups).
+
+    Query params: granularity, region, city, start, end, min_class (see filter_rollups),
+    page_size and cursor. Answers summary questions without touching raw history.
+    """
+    pagination_class = DistrictRollupCursorPagination
+
+    def get(self, request):
+        queryset = filter_rollups(DistrictRollup.objects.all(), request.query_params)
+        queryset = queryset.values(*ROLLUP_API_FIELDS, 'id')
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(
+            [{field: row[field] for field in ROLLUP_API_FIELDS} for row in page]
+        )
+
+
+# --- Point / bounding-box queries against one frame (weather.frame_query) ---
+MAX_QUERY_POINTS = 10000
+MAX_QUERY_BOXES = 1000
+
+
+def _parse_coordinates(values, name, size, limit):
+    """
+    A list of `size`-tuples of floats from a JSON list of lists or from query strings of
+    comma-separated numbers, several tuples per string separated by ';'.
+    """
+    if isinstance(values, str):
+        values = [values]
+    if not isinstance(values, list):
+        raise ValidationError({name: "Expected a list."})
+    parsed = []
+    for value in values:
+        items = [item for item in value.split(';') if item.strip()] if isinstance(value, str) else [value]
+        for item in items:
+            try:
+                numbers = tuple(float(number) for number in (item.split(',') if isinstance(item, str) else item))
+            except (TypeError, ValueError):
+                numbers = ()
+            if len(numbers) != size or not all(np.isfinite(numbers)):
+                raise ValidationError({name: f"Expected {size} comma-separated numbers per entry, got {item!r}."})
+            parsed.append(numbers)
+    if len(parsed) > limit:
+        raise ValidationError({name: f"At most {limit} per request, got {len(parsed)}."})
+    return parsed
+
+
+class PrecipQueryAPIView(APIView):
+    """
+    Precipitation class at points, or the heaviest class inside boxes, at one capture time.
+
+    GET params: region, time (ISO date or datetime; the latest frame at or before it is
+    used, default the latest frame), lat + lon, points ("lat,lon;lat,lon...") and bbox
+    ("min_lon,min_lat,max_lon,max_lat", repeatable). POST takes the same as a JSON object,
+    with points as [[lat, lon], ...] and boxes as [[min_lon, min_lat, max_lon, max_lat], ...],
+    for batches too large for a URL.
+    """
+
+    def get(self, request):
+        params = request.query_params
+        points = _parse_coordinates(params.getlist('points'), 'points', 2, MAX_QUERY_POINTS)
+        if params.get('lat') or params.get('lon'):
+            points[:0] = _parse_coordinates(f"{params.get('lat', '')},{params.get('lon', '')}", 'lat', 2, 1)
+        boxes = _parse_coordinates(params.getlist('bbox'), 'bbox', 4, MAX_QUERY_BOXES)
+        return self._query(params.get('region'), params.get('time'), points, boxes)
+
+    def post(self, request):
+        if not isinstance(request.data, dict):
+            raise ValidationError({'detail': "Expected a JSON object."})
+        points = _parse_coordinates(request.data.get('points', []), 'points', 2, MAX_QUERY_POINTS)
+        boxes = _parse_coordinates(request.data.get('boxes', []), 'boxes', 4, MAX_QUERY_BOXES)
+        return self._query(request.data.get('region'), request.data.get('time'), points, boxes)
+
+    def _query(self, region_key, time_value, points, boxes):
+        if not points and not boxes:
+            raise ValidationError({'detail': "Give lat and lon, points or bbox / boxes."})
+        try:
+            region = get_region(region_key)
+        except KeyError:
+            raise ValidationError({'region': f"Unknown region '{region_key}'."})
+        at = parse_range_bound(str(time_value), 'time') if time_value else None
+
+        frame = frame_at(region, at)
+        if frame is None:
+            raise Http404("No frame captured at or before this time.")
+        classes = frame_classes(frame, region)
+        if classes is None:
+            raise Http404(f"Frame {frame.folder} has no class raster or cropped image.")
+
+        payload = {'region': region.key, 'frame': frame.folder, 'timestamp': frame.timestamp.isoformat()}
+        if points:
+            payload['points'] = query_points(region, classes, points)
+        if boxes:
+            payload['boxes'] = query_boxes(region, classes, boxes)
+        return Response(payload)
+
+
+async def cycle_events(request):
+    """
+    Server-Sent Events stream of finished cycles (weather.live): one 'cycle' event per
+    region and slot with its results, frame URL and changed districts, as they arrive.
+    Query params: region, last_id (resume after this event id; browsers' EventSource
+    sends it as Last-Event-ID on reconnect). Serve under ASGI (layer/asgi.py).
+    """
+    last_id = parse_last_id(request.headers.get('Last-Event-ID') or request.GET.get('last_id'))
+    response = StreamingHttpResponse(sse_stream(last_id, request.GET.get('region') or None), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Don't let nginx hold events back
+    return response
+
+
+def cloud_analysis_export(request):
+    """
+    Streams CloudAnalysis history as NDJSON (default), CSV or Parquet (?format=...),
+    with the same filters and ?fields=... as /api/cloud/. Memory use stays constant
+    regardless of the size of the export.
+    """
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'format': f"Expected one of {', '.join(EXPORT_FORMATS)}."}, status=400)
+    if export_format == 'parquet' and not parquet_available():
+        return JsonResponse({'format': "Parquet export requires pyarrow, which is not installed."}, status=501)
+
+    try:
+        fields = requested_fields(request.GET)
+        queryset = filter_cloud_analysis(CloudAnalysis.objects.all(), request.GET)
+    except ValidationError as e:
+        return JsonResponse(e.detail, status=400)
+
+    content_type, extension = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(stream_export(queryset, fields, export_format), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="cloud_analysis.{extension}"'
+    return response
+
+
+def automation_report(request, frame_id):
+    """
+    The xhtml2pdf automation report for one capture slot. Rendered on first request
+    (unless `manage.py build_automation_reports` already did) and kept next to the slot's images.
+    ?region= selects another region's slot (weather.regions key).
+    """
+    timestamp = parse_frame_folder_name(frame_id)
+    region_key = request.GET.get('region') or DEFAULT_REGION_KEY
+    frame = Frame.objects.filter(region=region_key, timestamp=timestamp).first() if timestamp else None
+    if frame is None:
+        raise Http404(f"Frame {frame_id} is not in the frame catalogue.")
+
+    try:
+        pdf_path = get_automation_report(frame)
+    except Exception as e:
+        print(f"Error generating automation report for {frame_id}: {e}")
+        return JsonResponse({'status': 'error', 'message': f'Failed to generate automation report: {e}'}, status=500)
+    return FileResponse(open(pdf_path, 'rb'), content_type='application/pdf', filename=os.path.basename(pdf_path))
+
+
+# --- Historical queries over the precipitation cube (weather.cube) ---
+CUBE_PIXEL_STATS = ('max', 'mean', 'duration')
+
+
+def _cube_png(stat, values, region):
+    """Renders a pixel statistic as a PNG: legend colours for 'max', greyscale otherwise."""
+    from PIL import Image
+
+    if stat == 'max':
+        palette = np.zeros((256, 4), dtype=np.uint8)
+        for precip_class, colour in enumerate(region.legend, start=1):
+            palette[precip_class] = (*colour, 255)
+        image = Image.fromarray(palette[values], 'RGBA')
+    else:
+        scale = len(LEGEND_LABELS) if stat == 'mean' else max(int(values.max()), 1)
+        image = Image.fromarray(np.clip(values * (255.0 / scale), 0, 255).astype(np.uint8), 'L')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def precip_cube_api(request):
+    """
+    Answers "where / how long did it rain between start and end?" from the memory-mapped
+    precipitation cube, without decoding any capture image.
+
+    Query params: start, end (ISO date or datetime, end exclusive; both required), region,
+    min_class (default 1) and stat:
+        districts (default)   JSON per-district max class, precipitation minutes and wet area
+        max | mean | duration per-pixel raster as PNG (format=png, default) or .npy (format=npy)
+    """
+    try:
+        start = parse_range_bound(request.GET.get('start', ''), 'start')
+        end = parse_range_bound(request.GET.get('end', ''), 'end', is_end=True)
+    except ValidationError as e:
+        return JsonResponse(e.detail, status=400)
+
+    region_key = request.GET.get('region') or DEFAULT_REGION_KEY
+    try:
+        region = get_region(region_key)
+    except KeyError:
+        return JsonResponse({'region': f"Unknown region '{region_key}'."}, status=400)
+
+    min_class = request.GET.get('min_class', '1')
+    if not min_class.isdigit() or not 1 <= int(min_class) <= len(LEGEND_LABELS):
+        return JsonResponse({'min_class': f"Expected an integer between 1 and {len(LEGEND_LABELS)}."}, status=400)
+    min_class = int(min_class)
+
+    stat = request.GET.get('stat', 'districts')
+    if stat == 'districts':
+        return JsonResponse({
+            'region': region.key,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'min_class': min_class,
+            'districts': cube.district_aggregates(start, end, region.key, min_class=min_class),
+        })
+    if stat not in CUBE_PIXEL_STATS:
+        return JsonResponse({'stat': f"Expected one of districts, {', '.join(CUBE_PIXEL_STATS)}."}, status=400)
+
+    if stat == 'max':
+        values = cube.max_class(start, end, region.key)
+    elif stat == 'mean':
+        values = cube.mean_class(start, end, region.key)
+    else:
+        values = cube.precip_minutes(start, end, region.key, min_class=min_class)
+    if values is None:
+        raise Http404("No captures in the precipitation cube for this range.")
+
+    if request.GET.get('format') == 'npy':
+        buffer = io.BytesIO()
+        np.save(buffer, values)
+        response = HttpResponse(buffer.getvalue(), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="precip_{stat}.npy"'
+    else:
+        response = HttpResponse(_cube_png(stat, values, region), content_type='image/png')
+    if stat == 'duration':
+        response['X-Max-Precip-Minutes'] = str(int(values.max()))
+    return response
@@ -0,0 +1,220 @@
+# weather/work_queue.py
+#
+# Database-backed queue of per-layer analysis jobs (weather.models.AnalysisJob). The capture
+# daemon enqueues one job per captured layer; `manage.py analysis_worker` processes lease
+# them with SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers, on any host that
+# shares MEDIA_ROOT and the database, poll the table without blocking each other.
+
+import os
+import socket
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import AnalysisJob, CloudAnalysis
+
+
+class LeaseLost(Exception):
+    """The job's lease expired and it was handed to another worker."""
+
+
+def lease_seconds():
+    return getattr(settings, 'ANALYSIS_LEASE_SECONDS', 120)
+
+
+def default_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_analysis(region_key, layer_keys, timestamp, folder):
+    """
+    Queues one job per layer for a captured slot. A slot captured again (e.g. after a
+    restart) re-queues its jobs from scratch instead of adding duplicates.
+
+    Args:
+        folder (str): Capture folder, relative to MEDIA_ROOT.
+
+    Returns:
+        list: The queued AnalysisJob rows.
+    """
+    now = timezone.now()
+    jobs = []
+    for layer_key in layer_keys:
+        job, _ = AnalysisJob.objects.update_or_create(
+            region=region_key, layer=layer_key, timestamp=timestamp,
+            defaults={
+                'folder': folder, 'status': AnalysisJob.STATUS_QUEUED, 'attempts': 0,
+                'max_attempts': getattr(settings, 'ANALYSIS_MAX_ATTEMPTS', 3), 'available_at': now,
+                'lease_expires_at': None, 'heartbeat_at': None, 'worker': '', 'error': '',
+                'started_at': None, 'finished_at': None,
+            }
+        )
+        jobs.append(job)
+    return jobs
+
+
+def _release(job, error, now):
+    """Queues `job` again after a backoff, or fails it once it has used all its attempts."""
+    job.error = error
+    job.worker = ''
+    job.lease_expires_at = None
+    if job.attempts >= job.max_attempts:
+        job.status = AnalysisJob.STATUS_FAILED
+        job.finished_at = now
+    else:
+        # Exponential backoff: 1x, 2x, 4x ... ANALYSIS_RETRY_SECONDS
+        job.status = AnalysisJob.STATUS_QUEUED
+        job.available_at = now + timedelta(seconds=getattr(settings, 'ANALYSIS_RETRY_SECONDS', 60) * 2 ** (job.attempts - 1))
+    job.save(update_fields=['status', 'error', 'worker', 'lease_expires_at', 'available_at', 'finished_at'])
+
+
+def expire_leases():
+    """Releases running jobs whose lease ran out (dead or stuck worker). Returns the count."""
+    now = timezone.now()
+    released = 0
+    with transaction.atomic():
+        expired = (AnalysisJob.objects.select_for_update(skip_locked=True)
+                   .filter(status=AnalysisJob.STATUS_RUNNING, lease_expires_at__lt=now))
+        for job in expired:
+            _release(job, f"Lease held by {job.worker} expired.", now)
+            released += 1
+    return released
+
+
+def claim_next_job(worker_name, regions=None, layers=None):
+    """
+    Atomically leases the oldest available job for `worker_name`, or returns None.
+    Each lease counts as an attempt, so a job that keeps killing its workers still fails.
+
+    Args:
+        regions (list): Only lease jobs of these region keys (default: any).
+        layers (list): Only lease jobs of these layer keys (default: any).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = AnalysisJob.objects.select_for_update(skip_locked=True).filter(
+            status=AnalysisJob.STATUS_QUEUED, available_at__lte=now
+        )
+        if regions:
+            jobs = jobs.filter(region__in=regions)
+        if layers:
+            jobs = jobs.filter(layer__in=layers)
+        job = jobs.order_by('available_at', 'id').first()
+        if job is None:
+            return None
+        job.status = AnalysisJob.STATUS_RUNNING
+        job.worker = worker_name
+        job.attempts += 1
+        job.started_at = job.heartbeat_at = now
+        job.lease_expires_at = now + timedelta(seconds=lease_seconds())
+        job.save(update_fields=['status', 'worker', 'attempts', 'started_at', 'heartbeat_at', 'lease_expires_at'])
+    return job
+
+
+def _holds_lease(job):
+    # The attempt number fences off this worker's own earlier, expired lease of the job
+    return AnalysisJob.objects.filter(pk=job.pk, status=AnalysisJob.STATUS_RUNNING, worker=job.worker,
+                                      attempts=job.attempts)
+
+
+def heartbeat(job):
+    """Extends the job's lease. Returns False if the lease was lost (expired and re-leased)."""
+    now = timezone.now()
+    return bool(_holds_lease(job).update(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=lease_seconds())))
+
+
+class Heartbeat:
+    """
+    Renews a job's lease from a background thread (every third of the lease) while the
+    worker analyses it. Use as a context manager around the job's work.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'heartbeat-{job.pk}', daemon=True)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(lease_seconds() / 3):
+                try:
+                    renewed = heartbeat(self.job)
+                except Exception as e:
+                    # A busy database delays a beat; the lease has two more before it runs out
+                    print(f"Heartbeat for analysis job {self.job.pk} failed: {e}")
+                    continue
+                if not renewed:
+                    self.lost = True
+                    return
+        finally:
+            connection.close() # This thread's own connection
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def complete_job(job):
+    """
+    Marks a leased job done. Call inside the transaction that saved its results, so a
+    worker whose lease was taken over rolls its results back instead of duplicating them.
+
+    Raises:
+        LeaseLost: If another worker holds the job now.
+    """
+    if not list(_holds_lease(job).select_for_update().values_list('pk', flat=True)):
+        raise LeaseLost(f"Analysis job {job.pk} is no longer leased by {job.worker}.")
+    now = timezone.now()
+    _holds_lease(job).update(status=AnalysisJob.STATUS_DONE, finished_at=now, lease_expires_at=None, error='')
+
+
+def fail_job(job, error):
+    """Releases a leased job after an error: back on the queue with backoff, or failed for good."""
+    with transaction.atomic():
+        current = _holds_lease(job).select_for_update().first()
+        if current is not None:
+            _release(current, error, timezone.now())
+
+
+def run_analysis_job(job, command):
+    """
+    Analyses one leased job: crops and classifies the layer, saves its CloudAnalysis rows
+    (replacing any from an earlier attempt) and, for radar, the rollups. All database
+    writes commit together with the job's completion; the radar frame, its masked images,
+    cube slice and zone stats are stored only after that commit.
+
+    Returns:
+        RegionCapture: The finished capture (its published_results() are ready to POST).
+    """
+    from .capture import RegionCapture
+    from .layers import get_layer
+    from .regions import get_region
+    from .rollups import rebuild_rollups, update_rollups
+
+    region = get_region(job.region)
+    layer = get_layer(job.layer)
+    capture = RegionCapture(region, command, [layer])
+    folder_path = os.path.join(settings.MEDIA_ROOT, job.folder)
+
+    with Heartbeat(job) as beat:
+        with transaction.atomic():
+            replaced, _ = CloudAnalysis.objects.filter(region=region.key, type=layer.name, timestamp=job.timestamp).delete()
+            capture.analyze([layer], folder_path, job.timestamp)
+            if layer.is_radar:
+                if replaced:
+                    # The slot was analysed before (re-queued by hand or recaptured): recount its day
+                    rebuild_rollups(job.timestamp.date(), job.timestamp.date(), region.key)
+                else:
+                    update_rollups(capture.analyses)
+            if beat.lost:
+                raise LeaseLost(f"Analysis job {job.pk} lost its lease while running.")
+            complete_job(job)
+    return capture
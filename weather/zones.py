@@ -0,0 +1,304 @@
+# weather/zones.py
+#
+# Configurable zone sets evaluated on every radar frame: the region's districts, finer
+# polygons (e.g. GADM level-3 taluks, or any uploaded GeoJSON / shapefile) or a regular
+# lat/lon grid. Each zone set is turned once per region and frame size into an integer
+# label raster; a frame is then evaluated for all of its zones in one vectorized pass
+# (a gather of the labelled pixels sorted by zone plus a few ufunc.reduceat calls), so
+# the cost grows with the frame's pixel count, not with the number of zones.
+#
+# Results are stored in ZoneStat, one small row per zone and frame with precipitation;
+# dry zones are not stored.
+
+import math
+import os
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import Zone, ZoneStat
+
+# Zone set kinds
+KIND_DISTRICTS = 'districts' # The region's own district boundaries (Region.shapefile_path)
+KIND_POLYGONS = 'polygons' # Any vector file geopandas reads: GADM level 3, uploaded GeoJSON, ...
+KIND_GRID = 'grid' # Regular lat/lon cells of `cell_degrees`, aligned to multiples of the cell size
+KINDS = (KIND_DISTRICTS, KIND_POLYGONS, KIND_GRID)
+
+# Class number -> precipitation bitmask bit (weather.precipitation.classes_to_mask); class 0 sets none
+_CLASS_BITS = np.array([0] + [1 << (precip_class - 1) for precip_class in range(1, 16)], dtype=np.uint16)
+
+
+class ZoneSet:
+    """
+    A named way of dividing regions into zones.
+
+    Args:
+        key (str): Identifier stored on Zone rows.
+        name (str): Display name.
+        kind (str): One of KINDS.
+        path (str): Polygons file (KIND_POLYGONS).
+        name_field (str): Attribute holding the zone name (KIND_POLYGONS).
+        parent_field (str): Attribute holding the enclosing area's name, e.g. 'NAME_2' (the
+            district) for taluks; zones are identified by (parent, name) (KIND_POLYGONS).
+        state_field (str): Attribute matched against Region.state_names; None keeps every
+            polygon intersecting the region's bounds (KIND_POLYGONS).
+        cell_degrees (float): Grid cell size (KIND_GRID).
+        clip_to_region (bool): Ignore grid pixels outside the region's districts (KIND_GRID).
+    """
+
+    def __init__(self, key, name, kind, path=None, name_field='name', parent_field=None, state_field=None,
+                 cell_degrees=None, clip_to_region=True):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown zone set kind {kind!r} for {key!r}; expected one of {', '.join(KINDS)}.")
+        if kind == KIND_POLYGONS and not path:
+            raise ValueError(f"Zone set {key!r} needs a polygons file (path).")
+        if kind == KIND_GRID and not (cell_degrees and cell_degrees > 0):
+            raise ValueError(f"Zone set {key!r} needs a positive cell_degrees.")
+        self.key = key
+        self.name = name
+        self.kind = kind
+        self.path = path
+        self.name_field = name_field
+        self.parent_field = parent_field
+        self.state_field = state_field
+        self.cell_degrees = cell_degrees
+        self.clip_to_region = clip_to_region
+
+    def __repr__(self):
+        return f"ZoneSet({self.key!r})"
+
+
+# --- Registry ---
+_BUILTIN_ZONE_SETS = {
+    'districts': dict(name='Districts', kind=KIND_DISTRICTS),
+    'grid_005': dict(name='0.05° grid', kind=KIND_GRID, cell_degrees=0.05),
+}
+
+
+@lru_cache(maxsize=1)
+def _registry():
+    """Built-in zone sets updated with settings.WEATHER_ZONE_SETS (zone set key -> ZoneSet keyword arguments)."""
+    definitions = {key: dict(options) for key, options in _BUILTIN_ZONE_SETS.items()}
+    for key, options in getattr(settings, 'WEATHER_ZONE_SETS', {}).items():
+        definitions.setdefault(key, {}).update(options)
+    return {key: ZoneSet(key, **options) for key, options in definitions.items()}
+
+
+def all_zone_sets():
+    return list(_registry().values())
+
+
+def get_zone_set(key):
+    """ZoneSet for `key`. Raises KeyError for unknown keys."""
+    return _registry()[key]
+
+
+def capture_zone_sets():
+    """Zone sets the capture daemon evaluates on every radar frame (settings.CAPTURE_ZONE_SETS)."""
+    return [get_zone_set(key) for key in getattr(settings, 'CAPTURE_ZONE_SETS', [])]
+
+
+# --- Zone definitions (per zone set and region, independent of the frame size) ---
+def _grid_extent(zone_set, region):
+    """(first global column, last global row, columns, rows) of the grid cells covering the region."""
+    cell = zone_set.cell_degrees
+    min_lon, min_lat, max_lon, max_lat = region.bounds
+    first_col = math.floor(min_lon / cell)
+    last_row = math.floor(max_lat / cell)
+    columns = math.floor(max_lon / cell) - first_col + 1
+    rows = last_row - math.floor(min_lat / cell) + 1
+    return first_col, last_row, columns, rows
+
+
+@lru_cache(maxsize=None)
+def _polygon_zones(zone_set_key, region_key):
+    """
+    (zones, geometries) of a polygon-based zone set in a region: zones is a list of
+    (name, parent, lat, lon) tuples sorted by (parent, name); geometries (EPSG:4326)
+    are aligned with it. Rows sharing a name (and parent) are merged into one zone.
+    """
+    import geopandas as gpd
+    from .regions import get_region
+
+    zone_set = get_zone_set(zone_set_key)
+    region = get_region(region_key)
+    if zone_set.kind == KIND_DISTRICTS:
+        gdf = region.load_districts()
+        if gdf is None:
+            return [], []
+        name_field, parent_field = region.district_field, None
+    else:
+        if not os.path.exists(zone_set.path):
+            raise FileNotFoundError(f"Polygons file for zone set {zone_set.key!r} not found at {zone_set.path}.")
+        # The bounds filter keeps large files (all of India's taluks) cheap to read; it assumes lon/lat coordinates
+        gdf = gpd.read_file(zone_set.path, bbox=region.bounds)
+        if gdf.crs is None:
+            gdf = gdf.set_crs("EPSG:4326")
+        if zone_set.state_field:
+            gdf = gdf[gdf[zone_set.state_field].astype(str).str.strip().str.lower().isin(region.state_names)]
+        gdf = gdf.to_crs("EPSG:4326")
+        name_field, parent_field = zone_set.name_field, zone_set.parent_field
+
+    gdf = gdf[gdf[name_field].notna() & gdf.geometry.notna()]
+    group_fields = [parent_field, name_field] if parent_field else [name_field]
+    merged = gdf[group_fields + ['geometry']].dissolve(by=group_fields).reset_index()
+    names = merged[name_field].astype(str)
+    parents = merged[parent_field].astype(str) if parent_field else [''] * len(merged)
+    points = merged.geometry.representative_point()
+
+    zones, geometries = [], []
+    for position in sorted(range(len(merged)), key=lambda i: (parents[i], names[i])):
+        zones.append((names[position], parents[position], points[position].y, points[position].x))
+        geometries.append(merged.geometry[position])
+    return zones, geometries
+
+
+def zone_definitions(zone_set, region):
+    """The zone set's zones in `region`, as (name, parent, lat, lon) tuples; a zone's index is its position + 1."""
+    if zone_set.kind != KIND_GRID:
+        return _polygon_zones(zone_set.key, region.key)[0]
+
+    cell = zone_set.cell_degrees
+    first_col, last_row, columns, rows = _grid_extent(zone_set, region)
+    zones = []
+    for row in range(rows):
+        lat = round((last_row - row + 0.5) * cell, 6)
+        for column in range(columns):
+            lon = round((first_col + column + 0.5) * cell, 6)
+            zones.append((f"{lat:.4f},{lon:.4f}", '', lat, lon))
+    return zones
+
+
+_zone_ids = {} # (zone set key, region key) -> {zone index: Zone pk}
+
+
+def zone_ids(zone_set, region):
+    """
+    {zone index: Zone pk} for the zone set in `region`, creating the Zone rows on first use
+    (or after the zone set's definition grew). Cached per process; a count query per call
+    catches rows whose creation was rolled back.
+    """
+    zones = Zone.objects.filter(zone_set=zone_set.key, region=region.key)
+    cache_key = (zone_set.key, region.key)
+    ids = _zone_ids.get(cache_key)
+    if ids is not None and zones.count() == len(ids):
+        return ids
+
+    ids = dict(zones.values_list('index', 'pk'))
+    definitions = zone_definitions(zone_set, region)
+    if len(ids) < len(definitions):
+        Zone.objects.bulk_create([
+            Zone(zone_set=zone_set.key, region=region.key, index=index, name=name, parent=parent, lat=lat, lon=lon)
+            for index, (name, parent, lat, lon) in enumerate(definitions, start=1) if index not in ids
+        ], batch_size=1000, ignore_conflicts=True)
+        ids = dict(zones.values_list('index', 'pk'))
+    _zone_ids[cache_key] = ids
+    return ids
+
+
+# --- Label rasters and vectorized evaluation (per zone set, region and frame size) ---
+def label_raster(zone_set, region, height, width):
+    """(height, width) int32 raster of zone indices (0: no zone) for a region's frames of this size."""
+    if zone_set.kind == KIND_GRID:
+        # Pixel centres -> global cell numbers; no geometry involved
+        cell = zone_set.cell_degrees
+        min_lon, min_lat, max_lon, max_lat = region.bounds
+        first_col, last_row, columns, _ = _grid_extent(zone_set, region)
+        lons = min_lon + (np.arange(width) + 0.5) * (max_lon - min_lon) / width
+        lats = max_lat - (np.arange(height) + 0.5) * (max_lat - min_lat) / height
+        cols = np.floor(lons / cell).astype(np.int32) - first_col
+        rows = last_row - np.floor(lats / cell).astype(np.int32)
+        labels = rows[:, None] * columns + cols[None, :] + 1
+        if zone_set.clip_to_region:
+            from .cube import district_masks
+
+            masks = district_masks(region.key, height, width)
+            if masks:
+                labels[~np.logical_or.reduce(list(masks.values()))] = 0
+        return labels.astype(np.int32)
+
+    from rasterio.features import rasterize
+
+    geometries = _polygon_zones(zone_set.key, region.key)[1]
+    if not geometries:
+        return np.zeros((height, width), dtype=np.int32)
+    # One call for every zone; where zones overlap the later one keeps the pixel
+    return rasterize(
+        zip(geometries, range(1, len(geometries) + 1)), out_shape=(height, width),
+        transform=region.transform(width, height), fill=0, dtype=np.int32
+    )
+
+
+class ZoneLayout:
+    """
+    The labelled pixels of one label raster, sorted by zone, so that evaluating a frame is
+    one gather plus one ufunc.reduceat per statistic for all zones at once. Zones too small
+    to own a pixel at this frame size are not evaluated.
+    """
+
+    def __init__(self, labels):
+        self.shape = labels.shape
+        flat = labels.ravel()
+        order = np.argsort(flat, kind='stable')
+        sorted_labels = flat[order]
+        labelled = np.searchsorted(sorted_labels, 1)
+        self.order = order[labelled:]
+        self.zone_indices, self.starts, self.pixel_counts = np.unique(
+            sorted_labels[labelled:], return_index=True, return_counts=True
+        )
+
+    def evaluate(self, classes):
+        """
+        Per-zone statistics of a (height, width) class raster, as arrays aligned with
+        zone_indices: max_class, precip_mask (weather.precipitation bitmask) and
+        wet_permille (thousandths of the zone's pixels with any precipitation).
+        """
+        if classes.shape != self.shape:
+            raise ValueError(f"Class raster of shape {classes.shape} does not match the zone layout's {self.shape}.")
+        if not len(self.order):
+            empty = np.zeros(0, dtype=np.int64)
+            return {'max_class': empty, 'precip_mask': empty, 'wet_permille': empty}
+        zone_classes = classes.ravel()[self.order]
+        wet_pixels = np.add.reduceat((zone_classes > 0).astype(np.int32), self.starts)
+        return {
+            'max_class': np.maximum.reduceat(zone_classes, self.starts),
+            'precip_mask': np.bitwise_or.reduceat(_CLASS_BITS[zone_classes], self.starts),
+            'wet_permille': np.rint(wet_pixels * 1000 / self.pixel_counts).astype(np.int64),
+        }
+
+
+@lru_cache(maxsize=None)
+def _zone_layout(zone_set_key, region_key, height, width):
+    from .regions import get_region
+
+    return ZoneLayout(label_raster(get_zone_set(zone_set_key), get_region(region_key), height, width))
+
+
+def zone_layout(zone_set, region, height, width):
+    """ZoneLayout of the zone set for a region's frames of this size (cached per process)."""
+    return _zone_layout(zone_set.key, region.key, height, width)
+
+
+def evaluate_frame(zone_set, region, timestamp, classes):
+    """
+    Evaluates every zone of the zone set on one class raster and stores a ZoneStat row for
+    each zone with precipitation, replacing the frame's earlier rows for the zone set.
+
+    Returns:
+        tuple: (zones evaluated, ZoneStat rows saved)
+    """
+    layout = zone_layout(zone_set, region, *classes.shape)
+    stats = layout.evaluate(classes)
+    ids = zone_ids(zone_set, region)
+    wet = np.flatnonzero(stats['max_class'] > 0)
+    rows = [
+        ZoneStat(zone_id=ids[int(layout.zone_indices[i])], timestamp=timestamp, max_class=int(stats['max_class'][i]),
+                 precip_mask=int(stats['precip_mask'][i]), wet_permille=int(stats['wet_permille'][i]))
+        for i in wet
+    ]
+    with transaction.atomic():
+        ZoneStat.objects.filter(zone__zone_set=zone_set.key, zone__region=region.key, timestamp=timestamp).delete()
+        ZoneStat.objects.bulk_create(rows, batch_size=1000)
+    return len(layout.zone_indices), len(rows)